@@ -0,0 +1,191 @@
+import hashlib
+import re
+import time
+import zlib
+from collections import OrderedDict
+from typing import Optional
+import numpy as np
+import orjson
+from app.core.config import settings
+from app.ai import prompt_builder
+from app.utils.metrics import register_metrics_source
+from app.utils.profiling import register_memory_holder
+
+# Answers are only reused for the same financial data, the same system prompt and the same model,
+# and only for questions that stand on their own.
+_NUM_PERMUTATIONS = 64
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = np.random.default_rng(20240601)
+_PERM_A = _rng.integers(1, _MERSENNE_PRIME, size=_NUM_PERMUTATIONS, dtype=np.uint64)
+_PERM_B = _rng.integers(0, _MERSENNE_PRIME, size=_NUM_PERMUTATIONS, dtype=np.uint64)
+
+_STOPWORDS = {
+    "a", "an", "the", "i", "me", "my", "mine", "we", "our", "you", "your", "can", "could", "would",
+    "should", "do", "does", "did", "is", "are", "am", "be", "to", "of", "for", "on", "in", "at",
+    "with", "and", "or", "please", "hi", "hello", "hey", "reho", "some", "any", "how", "what", "way",
+    "ways", "tell", "give", "help", "want", "like", "just", "get", "more", "much", "overall", "current",
+    "currently", "situation", "condition", "state",
+}
+_SUFFIXES = ("ational", "ation", "ings", "ing", "ial", "ies", "es", "ed", "ly", "s")
+# Words that point back at earlier turns; a question containing them depends on the conversation.
+_DEPENDENT_WORDS = {
+    "it", "that", "those", "them", "they", "these", "above", "previous", "earlier", "again", "else",
+    "instead", "also", "too", "why", "one", "ones", "same", "last",
+}
+_DEPENDENT_OPENERS = ("and ", "but ", "so ", "what about", "how about", "then ", "ok ", "okay ")
+
+_WORD_RE = re.compile(r"[a-z0-9£$%']+")
+# Amounts, with their currency and scale: "£5,000", "5k", "3.5%". Similar wording is not enough when these differ.
+_NUMBER_RE = re.compile(r"([£$€])?\s*(\d[\d,]*(?:\.\d+)?)\s*(k|m|bn|%)?(?![a-z])")
+
+_buckets: "OrderedDict[tuple, list]" = OrderedDict()
+_entry_count = 0
+_stats = {"lookups": 0, "exact_hits": 0, "similar_hits": 0, "misses": 0, "stores": 0, "evictions": 0, "skipped": 0}
+
+
+def normalise_question(text: str) -> str:
+    return " ".join(_WORD_RE.findall(text.lower()))
+
+
+def question_numbers(text: str) -> tuple:
+    return tuple(
+        f"{currency}{number.replace(',', '')}{scale}"
+        for currency, number, scale in _NUMBER_RE.findall(text.lower())
+    )
+
+
+def _prompt_version() -> str:
+    model = settings.LLM_ROUTES.get("chat", {}).get("model") or settings.LLM_STANDARD_MODEL
+    return hashlib.sha1(f"{prompt_builder.BASE_SYSTEM_PROMPT}|{model}".encode()).hexdigest()[:12]
+
+
+def summary_fingerprint(financial_summary: dict) -> str:
+    return hashlib.sha1(orjson.dumps(financial_summary, option=orjson.OPT_SORT_KEYS, default=str)).hexdigest()
+
+
+def _stem(word: str) -> str:
+    # British and American spellings, plus a crude suffix strip: "finances"/"financial" -> "financ".
+    word = word.replace("yz", "ys").replace("iz", "is")
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            word = word[:-len(suffix)]
+            break
+    return word[:-1] if word.endswith("e") and len(word) > 3 else word
+
+
+def _features(normalised: str) -> set:
+    words = [_stem(w) for w in normalised.split() if w not in _STOPWORDS]
+    features = set(words)
+    for word in words:
+        padded = f"#{word}#"
+        features.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return features
+
+
+def _signature(normalised: str) -> Optional[np.ndarray]:
+    features = _features(normalised)
+    if not features:
+        return None
+    hashes = np.fromiter((zlib.crc32(f.encode()) for f in features), dtype=np.uint64, count=len(features))
+    permuted = (hashes[:, None] * _PERM_A[None, :] + _PERM_B[None, :]) % np.uint64(_MERSENNE_PRIME)
+    return permuted.min(axis=0)
+
+
+def is_cacheable(user_message: str, first_turn: bool) -> bool:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return False
+    normalised = normalise_question(user_message)
+    if not normalised or len(normalised.split()) > settings.ANSWER_CACHE_MAX_QUESTION_WORDS:
+        return False
+    if first_turn:
+        return True
+    if normalised.startswith(_DEPENDENT_OPENERS):
+        return False
+    return not any(word in _DEPENDENT_WORDS for word in normalised.split())
+
+
+def _bucket_key(user_id: str, fingerprint: str) -> tuple:
+    # Users with identical summaries (e.g. no data yet) still get their own answers.
+    return user_id, fingerprint, _prompt_version()
+
+
+def lookup(user_id: str, fingerprint: str, user_message: str) -> Optional[str]:
+    _stats["lookups"] += 1
+    key = _bucket_key(user_id, fingerprint)
+    entries = _buckets.get(key)
+    if not entries:
+        _stats["misses"] += 1
+        return None
+    _buckets.move_to_end(key)
+
+    now = time.monotonic()
+    normalised = normalise_question(user_message)
+    numbers = question_numbers(user_message)
+    signature = None
+    best_answer, best_score = None, 0.0
+    for entry in entries:
+        if now - entry["stored_at"] > settings.ANSWER_CACHE_TTL_SECONDS or entry["numbers"] != numbers:
+            continue
+        if entry["question"] == normalised:
+            _stats["exact_hits"] += 1
+            return entry["answer"]
+        if entry["signature"] is None:
+            continue
+        if signature is None:
+            signature = _signature(normalised)
+            if signature is None:
+                break
+        score = float(np.mean(entry["signature"] == signature))
+        if score > best_score:
+            best_answer, best_score = entry["answer"], score
+
+    if best_answer is not None and best_score >= settings.ANSWER_CACHE_SIMILARITY:
+        _stats["similar_hits"] += 1
+        return best_answer
+    _stats["misses"] += 1
+    return None
+
+
+def store(user_id: str, fingerprint: str, user_message: str, answer: str):
+    global _entry_count
+    key = _bucket_key(user_id, fingerprint)
+    normalised = normalise_question(user_message)
+    now = time.monotonic()
+    entries = [
+        e for e in _buckets.pop(key, [])
+        if e["question"] != normalised and now - e["stored_at"] <= settings.ANSWER_CACHE_TTL_SECONDS
+    ]
+    entries.append({
+        "question": normalised,
+        "numbers": question_numbers(user_message),
+        "signature": _signature(normalised),
+        "answer": answer,
+        "stored_at": now,
+    })
+    entries = entries[-settings.ANSWER_CACHE_MAX_PER_SUMMARY:]
+    _buckets[key] = entries
+    _stats["stores"] += 1
+
+    _entry_count = sum(len(e) for e in _buckets.values())
+    while _entry_count > settings.ANSWER_CACHE_MAX_ENTRIES and len(_buckets) > 1:
+        _, evicted = _buckets.popitem(last=False)
+        _entry_count -= len(evicted)
+        _stats["evictions"] += len(evicted)
+
+
+def record_skipped():
+    _stats["skipped"] += 1
+
+
+def get_answer_cache_metrics() -> dict:
+    hits = _stats["exact_hits"] + _stats["similar_hits"]
+    return {
+        **_stats,
+        "hit_rate": round(hits / _stats["lookups"], 4) if _stats["lookups"] else 0.0,
+        "entries": _entry_count,
+        "summaries": len(_buckets),
+    }
+
+
+register_metrics_source("answer_cache", get_answer_cache_metrics)
+register_memory_holder("answer_cache", lambda: _buckets)
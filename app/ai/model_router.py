@@ -0,0 +1,161 @@
+import time
+from typing import Dict
+from app.core.config import settings
+from app.ai.openai_client import get_openai_client
+from app.utils.metrics import register_metrics_source
+from app.utils.tracing import llm_span, record_llm_usage
+from app.utils.usage_ledger import record_usage
+from loguru import logger
+
+# Light tasks (template echoes, one-line tips, titles) go to the cheaper, faster tier.
+# temperature/max_tokens of None leave the provider default in place.
+DEFAULT_ROUTES: Dict[str, dict] = {
+    "chat": {"tier": "standard", "temperature": 0.7, "max_tokens": 1200},
+    "expense_report": {"tier": "standard", "temperature": None, "max_tokens": 2000},
+    "budget_report": {"tier": "standard", "temperature": None, "max_tokens": 2000},
+    "debt_report": {"tier": "light", "temperature": 0.2, "max_tokens": 2000},
+    "calculator_tip": {"tier": "light", "temperature": 0.5, "max_tokens": 300},
+    "peer_comparison": {"tier": "light", "temperature": 0.3, "max_tokens": 500},
+    "chat_title": {"tier": "light", "temperature": 0.3, "max_tokens": 16},
+}
+
+_routes: Dict[str, dict] = {}
+_route_stats: Dict[str, dict] = {}
+
+
+def _tier_model(tier: str) -> str:
+    return settings.LLM_LIGHT_MODEL if tier == "light" else settings.LLM_STANDARD_MODEL
+
+
+def _build_routes() -> Dict[str, dict]:
+    for task in settings.LLM_ROUTES:
+        if task not in DEFAULT_ROUTES:
+            logger.warning(f"LLM_ROUTES has an override for unknown task '{task}'; ignoring it.")
+
+    routes = {}
+    for task, default in DEFAULT_ROUTES.items():
+        route = {**default, **settings.LLM_ROUTES.get(task, {})}
+        route["model"] = route.get("model") or _tier_model(route["tier"])
+        routes[task] = route
+    return routes
+
+
+def get_route(task: str) -> dict:
+    if not _routes:
+        _routes.update(_build_routes())
+    return _routes[task]
+
+
+def _request_options(route: dict) -> dict:
+    options = {"model": route["model"]}
+    if route.get("temperature") is not None:
+        options["temperature"] = route["temperature"]
+    if route.get("max_tokens"):
+        options["max_completion_tokens"] = route["max_tokens"]
+    return options
+
+
+def _stats_for(task: str) -> dict:
+    if task not in _route_stats:
+        _route_stats[task] = {
+            "calls": 0,
+            "errors": 0,
+            "total_latency_ms": 0.0,
+            "max_latency_ms": 0.0,
+            "input_tokens": 0,
+            "output_tokens": 0,
+            "truncated": 0,
+            "refusals": 0,
+            "empty": 0,
+        }
+    return _route_stats[task]
+
+
+def _record_call(task: str, started: float, response=None, error: Exception = None):
+    stats = _stats_for(task)
+    latency_ms = (time.perf_counter() - started) * 1000
+    stats["calls"] += 1
+    stats["total_latency_ms"] += latency_ms
+    stats["max_latency_ms"] = max(stats["max_latency_ms"], latency_ms)
+    usage = getattr(response, "usage", None)
+    record_usage(task, get_route(task)["model"], usage, latency_ms, error=error is not None)
+    if error is not None:
+        stats["errors"] += 1
+        # Structured-output parsing raises instead of returning a cut-off answer.
+        if type(error).__name__ == "LengthFinishReasonError":
+            stats["truncated"] += 1
+        return
+
+    if usage is not None:
+        stats["input_tokens"] += usage.prompt_tokens or 0
+        stats["output_tokens"] += usage.completion_tokens or 0
+
+    choice = response.choices[0] if response.choices else None
+    if choice is None:
+        stats["empty"] += 1
+        return
+    if choice.finish_reason == "length":
+        stats["truncated"] += 1
+        logger.warning(f"LLM route '{task}' hit its max_tokens cap ({get_route(task).get('max_tokens')}).")
+    if getattr(choice.message, "refusal", None):
+        stats["refusals"] += 1
+    elif not choice.message.content and getattr(choice.message, "parsed", None) is None:
+        stats["empty"] += 1
+
+
+async def chat_completion(task: str, messages: list, **extra):
+    route = get_route(task)
+    started = time.perf_counter()
+    try:
+        with llm_span(task, route["model"]) as span:
+            response = await get_openai_client().chat.completions.create(
+                messages=messages, **_request_options(route), **extra
+            )
+            record_llm_usage(span, response)
+    except Exception as e:
+        _record_call(task, started, error=e)
+        raise
+    _record_call(task, started, response)
+    return response
+
+
+async def parse_completion(task: str, messages: list, response_format):
+    route = get_route(task)
+    started = time.perf_counter()
+    try:
+        with llm_span(task, route["model"]) as span:
+            response = await get_openai_client().beta.chat.completions.parse(
+                messages=messages, response_format=response_format, **_request_options(route)
+            )
+            record_llm_usage(span, response)
+    except Exception as e:
+        _record_call(task, started, error=e)
+        raise
+    _record_call(task, started, response)
+    return response
+
+
+def batch_request_body(task: str, messages: list, response_format) -> dict:
+    # Same model and options as parse_completion, as the body of one line of a batch input file.
+    from openai.lib._parsing._completions import type_to_response_format_param
+    return {
+        "messages": messages,
+        "response_format": type_to_response_format_param(response_format),
+        **_request_options(get_route(task)),
+    }
+
+
+def get_route_metrics() -> dict:
+    metrics = {}
+    for task, route in (_routes or _build_routes()).items():
+        stats = dict(_stats_for(task))
+        stats["avg_latency_ms"] = round(stats["total_latency_ms"] / stats["calls"], 3) if stats["calls"] else 0.0
+        stats["total_latency_ms"] = round(stats["total_latency_ms"], 3)
+        stats["max_latency_ms"] = round(stats["max_latency_ms"], 3)
+        stats["error_rate"] = round(stats["errors"] / stats["calls"], 4) if stats["calls"] else 0.0
+        stats["truncation_rate"] = round(stats["truncated"] / stats["calls"], 4) if stats["calls"] else 0.0
+        metrics[task] = {"model": route["model"], "max_tokens": route.get("max_tokens"), **stats}
+    return metrics
+
+
+register_metrics_source("model_routes", get_route_metrics)
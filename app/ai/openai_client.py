@@ -0,0 +1,19 @@
+from app.core.config import settings
+
+_client = None
+
+
+def get_openai_client():
+    global _client
+    if _client is None:
+        # The openai package is heavy to import, so it is loaded on first use.
+        from openai import AsyncOpenAI
+        _client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL or None)
+    return _client
+
+
+async def close_openai_client():
+    global _client
+    if _client is not None:
+        await _client.close()
+        _client = None
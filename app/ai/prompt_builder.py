@@ -1,5 +1,6 @@
 import json
-from collections import Counter
+from app.utils.tracing import traced
+from app.utils.financial_snapshot import FinancialSnapshot, without_snapshot
 
 BASE_SYSTEM_PROMPT = """
 You are Reho, a friendly, knowledgeable, and encouraging AI financial assistant for a personal finance application. Your primary goal is to help users improve their financial health by providing clear, actionable, and personalized guidance. Always maintain a supportive, positive, and non-judgmental tone.
@@ -15,6 +16,7 @@ You are Reho, a friendly, knowledgeable, and encouraging AI financial assistant
 **CRITICAL REMINDER:** Every monetary value you mention MUST include the £ symbol. Check your entire response before sending to ensure compliance.
 """
 
+@traced("prompt.build")
 def build_contextual_system_prompt(financial_summary: dict) -> str:
     user_name = financial_summary.get('name', 'there')
     context_parts = [f"You are speaking with {user_name}. Always address them by their name in a friendly manner."]
@@ -28,13 +30,9 @@ def build_contextual_system_prompt(financial_summary: dict) -> str:
         )
         context_parts.append(f"- Incomes: {income_lines}")
 
-    expenses = financial_summary.get("expenses", [])
-    if expenses:
-        agg_exp = {}
-        for e in expenses:
-            cat = e.get("budgetCategory", "Others")
-            agg_exp[cat] = agg_exp.get(cat, 0) + float(e.get("amount", 0))
-        formatted_agg = ", ".join([f"{k}: £{v:.2f}" for k, v in agg_exp.items()])
+    if financial_summary.get("expenses"):
+        category_totals = FinancialSnapshot.of(financial_summary).budget_category_totals
+        formatted_agg = ", ".join([f"{k}: £{v:.2f}" for k, v in category_totals.items()])
         context_parts.append(f"- Monthly Expenses by Category: {formatted_agg}")
 
     if financial_summary.get("budgets"):
@@ -70,6 +68,7 @@ def build_contextual_system_prompt(financial_summary: dict) -> str:
     return f"{BASE_SYSTEM_PROMPT}\n\n--- User's Financial Context ---\n{context}"
 
 
+@traced("prompt.build")
 def build_title_generation_prompt(user_message: str) -> list:
     prompt = f"""
 Summarize the following user's first message into a short, 3-5 word title for a chat conversation.
@@ -89,9 +88,10 @@ Your response:
 """
     return [{"role": "user", "content": prompt}]
 
+@traced("prompt.build")
 def build_savings_tip_prompt(user_id: str, calculator_data: dict, financial_summary: dict) -> list:
     user_name = financial_summary.get('name', 'there')
-    summary_text = json.dumps(financial_summary, default=str)
+    summary_text = json.dumps(without_snapshot(financial_summary), default=str)
     has_debt = len(financial_summary.get("debts", [])) > 0
     amount        = float(calculator_data.get('amount', 0))
     frequency     = calculator_data.get('frequency', 'Monthly')
@@ -99,16 +99,10 @@ def build_savings_tip_prompt(user_id: str, calculator_data: dict, financial_summ
     inflation_rate = float(calculator_data.get('inflationRate', calculator_data.get('inflation_years', 0)))
     taxation_rate = calculator_data.get('taxationRate', calculator_data.get('taxation_rate', 'N/A'))
 
-    total_debt_monthly = sum(
-        float(d.get('monthlyPayment', 0)) for d in financial_summary.get('debts', [])
-    )
-    total_income = sum(
-        float(i.get('amount', 0)) for i in financial_summary.get('incomes', [])
-    )
-    total_expenses = sum(
-        float(e.get('amount', 0)) for e in financial_summary.get('expenses', [])
-    )
-    disposable_income = max(0, total_income - total_expenses - total_debt_monthly)
+    snapshot = FinancialSnapshot.of(financial_summary)
+    total_debt_monthly = snapshot.total_debt_payments
+    total_income = snapshot.total_income
+    disposable_income = snapshot.disposable_income
 
     if has_debt:
         paragraph_1 = f"Before focusing on savings, please consider you have a Capital Loss of £{total_debt_monthly:.2f} to interest payment for servicing your current debt."
@@ -180,54 +174,23 @@ Now generate the JSON response.
 """
     return [{"role": "user", "content": prompt}]
 
+@traced("prompt.build")
 def build_expense_optimization_prompt(financial_summary: dict) -> list:
     user_name = financial_summary.get('name', 'there')
-    expenses   = financial_summary.get('expenses', [])
-    summary_text = json.dumps(financial_summary, default=str)
-
-    subscription_keywords = [
-        'subscription', 'netflix', 'spotify', 'amazon prime', 'disney',
-        'apple', 'youtube', 'hulu', 'tv', 'streaming', 'prime video'
-    ]
-    subscription_total = sum(
-        float(e.get('amount', 0)) for e in expenses
-        if any(kw in str(e.get('name', '')).lower() or
-               kw in str(e.get('budgetCategory', '')).lower()
-               for kw in subscription_keywords)
-    )
-
-    category_name_counts: dict = {}
-    for e in expenses:
-        cat  = e.get('budgetCategory', 'Others')
-        name = str(e.get('name', '')).strip().lower()
-        if name:
-            category_name_counts.setdefault(cat, Counter())[name] += 1
-
-    duplicate_lines = []
-    for cat, counts in category_name_counts.items():
-        for name, cnt in counts.items():
-            if cnt > 1:
-                duplicate_lines.append(f"  - '{name.title()}' appears {cnt} times in '{cat}'")
-
-    duplicate_count   = sum(
-        1 for counts in category_name_counts.values()
-        for cnt in counts.values() if cnt > 1
-    )
-    duplicate_summary = "\n".join(duplicate_lines) if duplicate_lines else "  - No duplicate expenses detected."
-
-    total_income = sum(float(i.get('amount', 0)) for i in financial_summary.get('incomes', []))
-    discretionary_keywords = [
-        'entertainment', 'shopping', 'dining', 'eating out', 'hobby',
-        'leisure', 'clothing', 'travel', 'discretionary', 'wants'
-    ]
-    discretionary_total = sum(
-        float(e.get('amount', 0)) for e in expenses
-        if any(kw in str(e.get('budgetCategory', '')).lower() or
-               kw in str(e.get('name', '')).lower()
-               for kw in discretionary_keywords)
-    )
+    summary_text = json.dumps(without_snapshot(financial_summary), default=str)
+
+    snapshot = FinancialSnapshot.of(financial_summary)
+    subscription_total = snapshot.subscription_total
+    duplicate_count   = len(snapshot.duplicate_expenses)
+    duplicate_summary = "\n".join(
+        f"  - '{name.title()}' appears {count} times in '{category}'"
+        for category, name, count in snapshot.duplicate_expenses
+    ) or "  - No duplicate expenses detected."
+
+    total_income        = snapshot.total_income
+    discretionary_total = snapshot.discretionary_spend
     discretionary_pct = (discretionary_total / total_income * 100) if total_income > 0 else 0.0
-    total_expense     = sum(float(e.get('amount', 0)) for e in expenses)
+    total_expense     = snapshot.total_expenses
 
     prompt = f"""
 You are an expert financial analyst named Reho. Analyse the expense data for {user_name} and produce a structured optimisation report.
@@ -290,6 +253,7 @@ Now generate the JSON response.
 """
     return [{"role": "user", "content": prompt}]
 
+@traced("prompt.build")
 def build_budget_optimization_prompt(analysis_data: dict) -> list:
     summary_text = json.dumps(analysis_data.get('financial_summary', {}), default=str)
 
@@ -347,52 +311,64 @@ Now analyse the user's data and provide your complete JSON response.
 """
     return [{"role": "user", "content": prompt}]
 
-def build_debt_optimization_prompt(financial_summary: dict) -> list:
-    debts = financial_summary.get('debts', [])
+@traced("prompt.build")
+def build_debt_optimization_prompt(financial_summary: dict, payoff_plan: dict = None) -> list:
     smallest_debt_name   = "your smallest debt"
     smallest_debt_amount = 0
     highest_rate_name    = "your highest interest debt"
     highest_rate_amount  = 0
     consolidation_str    = "existing"
 
-    if debts:
-        active_debts = [d for d in debts if float(d.get('amount', 0)) > 0]
-        if active_debts:
-            smallest = min(active_debts, key=lambda d: float(d.get('amount', 0)))
-            smallest_debt_name   = smallest.get('name', 'Smallest Debt')
-            smallest_debt_amount = float(smallest.get('amount', 0))
-
-            highest = max(active_debts, key=lambda d: float(d.get('interestRate', 0)))
-            highest_rate_name   = highest.get('name', 'Highest Rate Debt')
-            highest_rate_amount = float(highest.get('amount', 0))
-
-            debt_names = [d.get('name', 'debt') for d in active_debts]
-            if len(debt_names) > 2:
-                consolidation_str = ", ".join(debt_names[:-1]) + ", and " + debt_names[-1]
-            elif len(debt_names) == 2:
-                consolidation_str = " and ".join(debt_names)
-            else:
-                consolidation_str = debt_names[0]
-
-    total_income       = sum(i.get('amount', 0) for i in financial_summary.get('incomes', []))
-    total_expenses     = sum(e.get('amount', 0) for e in financial_summary.get('expenses', []))
-    total_debt_payments = sum(d.get('monthlyPayment', 0) for d in financial_summary.get('debts', []))
-    disposable_income  = max(0, total_income - total_expenses - total_debt_payments)
+    snapshot = FinancialSnapshot.of(financial_summary)
+    if snapshot.active_debt_names:
+        smallest_debt_name   = snapshot.smallest_debt["name"]
+        smallest_debt_amount = snapshot.smallest_debt["amount"]
+        highest_rate_name    = snapshot.highest_rate_debt["name"]
+        highest_rate_amount  = snapshot.highest_rate_debt["amount"]
+
+        debt_names = snapshot.active_debt_names
+        if len(debt_names) > 2:
+            consolidation_str = ", ".join(debt_names[:-1]) + ", and " + debt_names[-1]
+        elif len(debt_names) == 2:
+            consolidation_str = " and ".join(debt_names)
+        else:
+            consolidation_str = debt_names[0]
+
+    disposable_income  = snapshot.disposable_income
+
+    avalanche_projection = ""
+    snowball_projection  = ""
+    savings_sentence     = ""
+    if payoff_plan:
+        avalanche = payoff_plan.get("reportProjections", {}).get("avalanche")
+        snowball  = payoff_plan.get("reportProjections", {}).get("snowball")
+        if avalanche and avalanche.get("target"):
+            highest_rate_name   = avalanche["target"]["name"]
+            highest_rate_amount = avalanche["target"]["amount"]
+        if snowball and snowball.get("target"):
+            smallest_debt_name   = snowball["target"]["name"]
+            smallest_debt_amount = snowball["target"]["amount"]
+        if avalanche and avalanche.get("monthsToFreedom") is not None:
+            avalanche_projection = f"\\n- With an extra £{avalanche['extraPayment']:.0f} a month you would be debt-free by {avalanche['debtFreeDate']} ({avalanche['monthsToFreedom']} months) with a total Capital Loss of £{avalanche['totalInterest']:.0f}."
+            if avalanche.get("interestSaved"):
+                savings_sentence = f" Paying an extra £{avalanche['extraPayment']:.0f} a month with the Avalanche method saves you £{avalanche['interestSaved']:.0f} in Capital Loss compared with paying only the minimums."
+        if snowball and snowball.get("monthsToFreedom") is not None:
+            snowball_projection = f"\\n- With an extra £{snowball['extraPayment']:.0f} a month you would be debt-free by {snowball['debtFreeDate']} ({snowball['monthsToFreedom']} months) with a total Capital Loss of £{snowball['totalInterest']:.0f}."
 
     prompt = f"""
 You are a strict JSON formatter. Output EXACTLY the following JSON object with these exact values filled in. Do not add any extra text, keys, or explanation outside the JSON object.
 
 {{
-    "summary": "You have £{disposable_income:.2f} in your disposable 'What's left'. Using some of this amount to pay off debt can save you interest and clear debt earlier. Consider allocating a portion of your disposable income to accelerate your debt repayment, which will help in reducing the overall interest paid over time.",
+    "summary": "You have £{disposable_income:.2f} in your disposable 'What's left'. Using some of this amount to pay off debt can save you interest and clear debt earlier. Consider allocating a portion of your disposable income to accelerate your debt repayment, which will help in reducing the overall interest paid over time.{savings_sentence}",
     "insights": [
         {{
             "insight": "Debt Avalanche Method",
-            "suggestion": "What is it?\\n- Pay minimums on all debts.\\n- Target {highest_rate_name} (£{highest_rate_amount:.0f}).\\n- Why? Paying the highest interest rate debt first saves more money long-term as it decreases the interest accrued on this larger balance.",
+            "suggestion": "What is it?\\n- Pay minimums on all debts.\\n- Target {highest_rate_name} (£{highest_rate_amount:.0f}).\\n- Why? Paying the highest interest rate debt first saves more money long-term as it decreases the interest accrued on this larger balance.{avalanche_projection}",
             "category": "Strategy"
         }},
         {{
             "insight": "Debt Snowball Method",
-            "suggestion": "What is it?\\n- Pay minimums on all debts.\\n- Target {smallest_debt_name} (£{smallest_debt_amount:.0f}).\\n- Why? Paying the smallest balance first gives you a quick psychological win and boosts motivation to continue tackling larger debts.",
+            "suggestion": "What is it?\\n- Pay minimums on all debts.\\n- Target {smallest_debt_name} (£{smallest_debt_amount:.0f}).\\n- Why? Paying the smallest balance first gives you a quick psychological win and boosts motivation to continue tackling larger debts.{snowball_projection}",
             "category": "Strategy"
         }},
         {{
@@ -405,8 +381,9 @@ You are a strict JSON formatter. Output EXACTLY the following JSON object with t
 """
     return [{"role": "user", "content": prompt}]
 
+@traced("prompt.build")
 def build_anomaly_detection_prompt(financial_summary: dict) -> list:
-    summary_text = json.dumps(financial_summary, default=str)
+    summary_text = json.dumps(without_snapshot(financial_summary), default=str)
 
     prompt = f"""
 You are a financial risk assessment AI. Your only task is to analyse the following user financial summary and determine if there are any significant "red flags" or anomalies that might indicate financial distress.
@@ -442,9 +419,10 @@ Now, analyse the user's data and provide your JSON response.
 """
     return [{"role": "user", "content": prompt}]
 
+@traced("prompt.build")
 def build_peer_comparison_prompt(financial_summary: dict) -> list:
     user_name    = financial_summary.get('name', 'there')
-    summary_text = json.dumps(financial_summary, default=str)
+    summary_text = json.dumps(without_snapshot(financial_summary), default=str)
 
     prompt = f"""
 You are an expert financial analyst. Your task is to generate a single, plausible Peer Comparison statement for a user named {user_name} based on their financial summary.
@@ -468,13 +446,14 @@ Now, generate the JSON response.
     return [{"role": "user", "content": prompt}]
 
 
+@traced("prompt.build")
 def build_loan_tip_prompt(user_id: str, calculator_data: dict, financial_summary: dict) -> list:
     user_name              = financial_summary.get('name', 'there')
-    total_income           = sum(i.get('amount', 0) for i in financial_summary.get('incomes', []))
-    total_expenses         = sum(e.get('amount', 0) for e in financial_summary.get('expenses', []))
-    current_debt_payments  = sum(d.get('monthlyPayment', 0) for d in financial_summary.get('debts', []))
-    current_debts_total    = sum(d.get('amount', 0) for d in financial_summary.get('debts', []))
-    disposable_income      = max(0, total_income - total_expenses - current_debt_payments)
+    snapshot               = FinancialSnapshot.of(financial_summary)
+    total_income           = snapshot.total_income
+    current_debt_payments  = snapshot.total_debt_payments
+    current_debts_total    = snapshot.total_debt
+    disposable_income      = snapshot.disposable_income
     new_principal    = float(calculator_data.get('principal', 0))
     annual_interest  = float(calculator_data.get('annualInterestRate', 0))
     years            = float(calculator_data.get('loanTermYears', 1))
@@ -530,9 +509,10 @@ Now, generate the JSON response.
 """
     return [{"role": "user", "content": prompt}]
 
+@traced("prompt.build")
 def build_inflation_tip_prompt(user_id: str, calculator_data: dict, financial_summary: dict) -> list:
     user_name = financial_summary.get('name', 'there')
-    summary_text = json.dumps(financial_summary, default=str)
+    summary_text = json.dumps(without_snapshot(financial_summary), default=str)
     initial_amount   = float(calculator_data.get('initialAmount', 1000))
     annual_inflation = float(calculator_data.get('annualInflationRate', 3.0))
     years            = int(calculator_data.get('yearsToProject', 10))
@@ -596,6 +576,7 @@ Now generate the JSON response.
 """
     return [{"role": "user", "content": prompt}]
 
+@traced("prompt.build")
 def build_historical_tip_prompt(user_id: str, calculator_data: dict, financial_summary: dict) -> list:
     user_name = financial_summary.get('name', 'there')
     from_year = calculator_data.get('fromYear', '1970')
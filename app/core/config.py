@@ -1,3 +1,4 @@
+from typing import Any, Dict
 from pydantic_settings import BaseSettings
 from pydantic import field_validator
 
@@ -5,14 +6,142 @@ class Settings(BaseSettings):
     DATABASE_URL: str
     MONGO_DB_NAME: str = "finance-management"
     OPENAI_API_KEY: str
+    # Empty uses the provider default; point at tools/openai_stub.py to exercise batch runs offline.
+    OPENAI_BASE_URL: str = ""
     JWT_SECRET: str
     JWT_ALGORITHM: str = "HS256"
     API_BASE_URL: str
+    # Shared secret for the /schedule endpoints called by cron; empty disables them.
+    SCHEDULER_API_KEY: str = ""
 
     ALLOWED_HOST_ORIGINS: str = "http://localhost:3000,http://127.0.0.1:3000"
 
     REDIS_URL: str = "redis://redis:6379/0"
 
+    LLM_STANDARD_MODEL: str = "gpt-4o"
+    LLM_LIGHT_MODEL: str = "gpt-4o-mini"
+    # JSON overrides per task, e.g. {"debt_report": {"tier": "standard"}, "chat": {"max_tokens": 800}}.
+    LLM_ROUTES: Dict[str, Dict[str, Any]] = {}
+    # USD per million tokens by model, e.g. {"gpt-4o-mini": {"input": 0.15, "cached_input": 0.075, "output": 0.6}}.
+    # Models without a price are counted in tokens only.
+    LLM_PRICING: Dict[str, Dict[str, float]] = {}
+    # Token usage is summed per worker, flushed to Redis and rolled up into Mongo (llm_usage_daily).
+    LLM_USAGE_FLUSH_SECONDS: float = 10.0
+    LLM_USAGE_ROLLUP_SECONDS: float = 300.0
+
+    MONGO_MIN_POOL_SIZE: int = 5
+    MONGO_MAX_POOL_SIZE: int = 50
+    MONGO_MAX_IDLE_TIME_MS: int = 300000
+    MONGO_CONNECT_TIMEOUT_MS: int = 5000
+    MONGO_SERVER_SELECTION_TIMEOUT_MS: int = 10000
+    MONGO_WAIT_QUEUE_TIMEOUT_MS: int = 5000
+    # Summary, calculator and history reads tolerate slightly stale data, so they go to secondaries.
+    MONGO_ANALYTICS_READ_PREFERENCE: str = "secondaryPreferred"
+    MONGO_ANALYTICS_MAX_STALENESS_SECONDS: int = 90
+
+    REDIS_MAX_CONNECTIONS: int = 50
+    REDIS_POOL_TIMEOUT_SECONDS: float = 5.0
+    REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS: float = 5.0
+    REDIS_SOCKET_TIMEOUT_SECONDS: float = 5.0
+
+    POOL_WAIT_WARN_MS: float = 100.0
+    REDIS_WARM_CONNECTIONS: int = 5
+
+    CACHE_CODEC: str = "orjson"
+    CACHE_COMPRESSION_THRESHOLD_BYTES: int = 4096
+    CACHE_COMPRESSION_LEVEL: int = 3
+    # Per-worker tier in front of the Redis caches. Invalidations are broadcast to every worker;
+    # the TTL bounds staleness when a broadcast is missed or the data changes outside this service.
+    CACHE_L1_TTL_SECONDS: float = 30.0
+    CACHE_L1_MAX_ENTRIES: int = 5000
+    CACHE_L1_MAX_BYTES: int = 32 * 1024 * 1024
+    SUMMARY_CACHE_TTL_SECONDS: int = 300
+    REPORT_CACHE_TTL_SECONDS: int = 3600
+    TIPS_CACHE_TTL_SECONDS: int = 3600
+
+    STARTUP_TIME_BUDGET_SECONDS: float = 10.0
+    STARTUP_RETRY_MAX_SECONDS: float = 10.0
+    READINESS_CHECK_TIMEOUT_SECONDS: float = 2.0
+    READINESS_CACHE_SECONDS: float = 2.0
+
+    # Tips not ready within this budget are returned as pending and finish in the background.
+    CALCULATOR_TIPS_BUDGET_SECONDS: float = 6.0
+
+    # Per-worker cache of chat answers to stand-alone questions, keyed by financial summary.
+    ANSWER_CACHE_ENABLED: bool = True
+    ANSWER_CACHE_SIMILARITY: float = 0.75
+    ANSWER_CACHE_TTL_SECONDS: float = 1800.0
+    ANSWER_CACHE_MAX_ENTRIES: int = 2000
+    ANSWER_CACHE_MAX_PER_SUMMARY: int = 20
+    ANSWER_CACHE_MAX_QUESTION_WORDS: int = 25
+
+    # Conversations idle this long are compacted into one compressed bundle in chat_history_archive.
+    CHAT_ARCHIVE_IDLE_DAYS: int = 30
+    CHAT_ARCHIVE_BATCH_SIZE: int = 500
+
+    # History pages are keyset-paginated; exports stream NDJSON from a cursor in batches of this size.
+    CHAT_HISTORY_PAGE_MAX: int = 100
+    CHAT_EXPORT_BATCH_SIZE: int = 200
+
+    # Global alerts feed. New alerts are also appended to a capped Redis stream pushed to consoles over SSE.
+    ADMIN_ALERT_PAGE_MAX: int = 200
+    ADMIN_ALERT_STREAM_MAXLEN: int = 10000
+    ADMIN_ALERT_REPLAY_MAX: int = 1000
+    ADMIN_ALERT_SUBSCRIBER_BUFFER: int = 500
+    ADMIN_ALERT_KEEPALIVE_SECONDS: float = 15.0
+
+    # Bulk report and tip regeneration through the provider's batch API instead of real-time calls.
+    BATCH_COMPLETION_WINDOW: str = "24h"
+    BATCH_POLL_SECONDS: float = 60.0
+    BATCH_MAX_REQUESTS_PER_FILE: int = 50000
+    BATCH_USER_CONCURRENCY: int = 10
+
+    # Presence is tracked in Redis so the per-user cap holds across every worker.
+    PRESENCE_HEARTBEAT_SECONDS: float = 15.0
+    PRESENCE_TTL_SECONDS: float = 45.0
+    WS_MAX_CONNECTIONS_PER_USER: int = 3
+    WS_MAX_CONNECTIONS_PER_WORKER: int = 500
+
+    # Load shedding thresholds; 0 disables a check.
+    LOOP_LAG_SAMPLE_SECONDS: float = 0.5
+    # A watchdog thread pings the loop; a ping unanswered for this long logs the blocking stack. 0 disables it.
+    SLOW_CALLBACK_THRESHOLD_MS: float = 100.0
+    LOOP_WATCHDOG_INTERVAL_SECONDS: float = 0.1
+    SLOW_CALLBACK_STACK_LIMIT: int = 30
+    SHED_LOOP_LAG_MS: float = 250.0
+    SHED_MAX_LLM_IN_FLIGHT: int = 64
+    SHED_RETRY_AFTER_SECONDS: int = 5
+
+    # Per-user sliding windows in Redis, e.g. {"calculator_tips": {"limit": 10, "window_seconds": 60}}.
+    RATE_LIMIT_ENABLED: bool = True
+    RATE_LIMITS: Dict[str, Dict[str, float]] = {}
+
+    # On SIGTERM a worker lets running chat turns finish for up to this long before shutting down;
+    # 0 disables the drain. Clients are told to reconnect after a random delay within the range.
+    DRAIN_TIMEOUT_SECONDS: float = 20.0
+    DRAIN_RECONNECT_MIN_SECONDS: float = 1.0
+    DRAIN_RECONNECT_MAX_SECONDS: float = 10.0
+
+    # "sentry" ships spans to SENTRY_DSN (Sentry or a local Relay); "file" appends JSON lines locally.
+    TRACING_EXPORTER: str = "none"
+    SENTRY_DSN: str = ""
+    TRACING_SAMPLE_RATE: float = 1.0
+    TRACING_FILE_PATH: str = "logs/traces.jsonl"
+    TRACING_ENVIRONMENT: str = "production"
+
+    # Admin-only profiling: per-request sampling (X-Profile header or ?profile=1), time-boxed worker
+    # sampling and tracemalloc snapshots. Off by default; when off none of it is installed.
+    PROFILING_ENABLED: bool = False
+    PROFILING_INTERVAL_MS: float = 5.0
+    PROFILING_MAX_SECONDS: float = 60.0
+
+    # Sampled capture of REST calls and chat sessions to JSONL for tools/replay.py. Ids are replaced
+    # by keyed pseudonyms and free text by same-length filler before anything is written.
+    TRAFFIC_CAPTURE_ENABLED: bool = False
+    TRAFFIC_CAPTURE_SAMPLE_RATE: float = 0.01
+    TRAFFIC_CAPTURE_PATH: str = "logs/traffic.jsonl"
+    TRAFFIC_CAPTURE_MAX_BUFFER: int = 10000
+
     @field_validator("DATABASE_URL")
     @classmethod
     def validate_database_url(cls, v: str) -> str:
@@ -34,6 +163,82 @@ class Settings(BaseSettings):
             raise ValueError("JWT_SECRET must be at least 16 characters long")
         return v
 
+    @field_validator("MONGO_ANALYTICS_READ_PREFERENCE")
+    @classmethod
+    def validate_read_preference(cls, v: str) -> str:
+        allowed = ("primary", "primaryPreferred", "secondary", "secondaryPreferred", "nearest")
+        if v not in allowed:
+            raise ValueError(f"MONGO_ANALYTICS_READ_PREFERENCE must be one of {', '.join(allowed)}")
+        return v
+
+    @field_validator("CACHE_CODEC")
+    @classmethod
+    def validate_cache_codec(cls, v: str) -> str:
+        if v not in ("msgpack", "orjson"):
+            raise ValueError("CACHE_CODEC must be 'msgpack' or 'orjson'")
+        return v
+
+    @field_validator("MONGO_ANALYTICS_MAX_STALENESS_SECONDS")
+    @classmethod
+    def validate_max_staleness(cls, v: int) -> int:
+        # MongoDB rejects maxStalenessSeconds below 90; -1 disables the bound.
+        if v != -1 and v < 90:
+            raise ValueError("MONGO_ANALYTICS_MAX_STALENESS_SECONDS must be -1 or at least 90")
+        return v
+
+    @field_validator("LLM_ROUTES")
+    @classmethod
+    def validate_llm_routes(cls, v: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        allowed = {"tier", "model", "temperature", "max_tokens"}
+        for task, route in v.items():
+            unknown = set(route) - allowed
+            if unknown:
+                raise ValueError(f"LLM_ROUTES['{task}'] has unknown keys: {', '.join(sorted(unknown))}")
+            if route.get("tier", "standard") not in ("standard", "light"):
+                raise ValueError(f"LLM_ROUTES['{task}'] tier must be 'standard' or 'light'")
+        return v
+
+    @field_validator("RATE_LIMITS")
+    @classmethod
+    def validate_rate_limits(cls, v: Dict[str, Dict[str, float]]) -> Dict[str, Dict[str, float]]:
+        for name, rule in v.items():
+            unknown = set(rule) - {"limit", "window_seconds"}
+            if unknown:
+                raise ValueError(f"RATE_LIMITS['{name}'] has unknown keys: {', '.join(sorted(unknown))}")
+            if rule.get("window_seconds", 1) <= 0:
+                raise ValueError(f"RATE_LIMITS['{name}'] needs a positive window_seconds")
+        return v
+
+    @field_validator("TRACING_EXPORTER")
+    @classmethod
+    def validate_tracing_exporter(cls, v: str) -> str:
+        if v not in ("none", "sentry", "file"):
+            raise ValueError("TRACING_EXPORTER must be 'none', 'sentry' or 'file'")
+        return v
+
+    @field_validator("SENTRY_DSN")
+    @classmethod
+    def validate_sentry_dsn(cls, v: str, info) -> str:
+        if info.data.get("TRACING_EXPORTER") == "sentry" and not v:
+            raise ValueError("SENTRY_DSN is required when TRACING_EXPORTER is 'sentry'")
+        return v
+
+    @field_validator("PRESENCE_TTL_SECONDS")
+    @classmethod
+    def validate_presence_ttl(cls, v: float, info) -> float:
+        heartbeat = info.data.get("PRESENCE_HEARTBEAT_SECONDS")
+        if heartbeat is not None and v <= heartbeat:
+            raise ValueError("PRESENCE_TTL_SECONDS must be longer than PRESENCE_HEARTBEAT_SECONDS")
+        return v
+
+    @field_validator("DRAIN_RECONNECT_MAX_SECONDS")
+    @classmethod
+    def validate_drain_reconnect(cls, v: float, info) -> float:
+        minimum = info.data.get("DRAIN_RECONNECT_MIN_SECONDS")
+        if minimum is not None and v < minimum:
+            raise ValueError("DRAIN_RECONNECT_MAX_SECONDS must not be below DRAIN_RECONNECT_MIN_SECONDS")
+        return v
+
     @property
     def allow_origins_list(self) -> list[str]:
         return [origin.strip() for origin in self.ALLOWED_HOST_ORIGINS.split(",")]
@@ -1,9 +1,128 @@
+import asyncio
+import time
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
 from app.core.config import settings
+from app.utils.pool_metrics import MongoPoolListener, TimedBlockingConnectionPool
 import redis.asyncio as redis
+from loguru import logger
 
-client = AsyncIOMotorClient(settings.DATABASE_URL)
+_READ_PREFERENCES = {
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
 
-db = client[settings.MONGO_DB_NAME]
+_clients: dict = {}
 
-redis_client = redis.from_url(settings.REDIS_URL, decode_responses=True)
\ No newline at end of file
+
+def _analytics_read_preference():
+    mode = settings.MONGO_ANALYTICS_READ_PREFERENCE
+    if mode == "primary":
+        return Primary()
+    return _READ_PREFERENCES[mode](max_staleness=settings.MONGO_ANALYTICS_MAX_STALENESS_SECONDS)
+
+
+def init_clients():
+    if _clients:
+        return
+
+    mongo_client = AsyncIOMotorClient(
+        settings.DATABASE_URL,
+        minPoolSize=settings.MONGO_MIN_POOL_SIZE,
+        maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+        maxIdleTimeMS=settings.MONGO_MAX_IDLE_TIME_MS,
+        connectTimeoutMS=settings.MONGO_CONNECT_TIMEOUT_MS,
+        serverSelectionTimeoutMS=settings.MONGO_SERVER_SELECTION_TIMEOUT_MS,
+        waitQueueTimeoutMS=settings.MONGO_WAIT_QUEUE_TIMEOUT_MS,
+        event_listeners=[MongoPoolListener()],
+    )
+
+    def _redis_pool(decode_responses: bool):
+        return TimedBlockingConnectionPool.from_url(
+            settings.REDIS_URL,
+            max_connections=settings.REDIS_MAX_CONNECTIONS,
+            timeout=settings.REDIS_POOL_TIMEOUT_SECONDS,
+            socket_connect_timeout=settings.REDIS_SOCKET_CONNECT_TIMEOUT_SECONDS,
+            socket_timeout=settings.REDIS_SOCKET_TIMEOUT_SECONDS,
+            decode_responses=decode_responses,
+        )
+
+    _clients.update({
+        "client": mongo_client,
+        # Writes and read-your-own-write lookups stay on the primary.
+        "db": mongo_client[settings.MONGO_DB_NAME],
+        # Summary, calculator and history reads are routed to secondaries with bounded staleness.
+        "analytics_db": mongo_client.get_database(settings.MONGO_DB_NAME, read_preference=_analytics_read_preference()),
+        "redis_client": redis.Redis(connection_pool=_redis_pool(decode_responses=True)),
+        # Cache values are binary (see app.utils.codec), so they get their own undecoded pool.
+        "redis_cache": redis.Redis(connection_pool=_redis_pool(decode_responses=False)),
+    })
+
+
+def _get(name: str):
+    if not _clients:
+        init_clients()
+    return _clients[name]
+
+
+class _LazyHandle:
+    # Stands in for a client until first use so importing this module never opens connections.
+    def __init__(self, name: str):
+        self._name = name
+
+    def __getattr__(self, attr):
+        return getattr(_get(self._name), attr)
+
+    def __getitem__(self, key):
+        return _get(self._name)[key]
+
+
+client = _LazyHandle("client")
+db = _LazyHandle("db")
+analytics_db = _LazyHandle("analytics_db")
+redis_client = _LazyHandle("redis_client")
+redis_cache = _LazyHandle("redis_cache")
+
+
+async def ping_dependencies(timeout: float) -> dict:
+    async def _check(name, coro):
+        start_time = time.perf_counter()
+        try:
+            await asyncio.wait_for(coro, timeout=timeout)
+            return name, {"ok": True, "latency_ms": round((time.perf_counter() - start_time) * 1000, 2)}
+        except Exception as e:
+            return name, {"ok": False, "error": str(e) or e.__class__.__name__}
+
+    results = await asyncio.gather(
+        _check("mongo", _get("db").command("ping")),
+        _check("redis", _get("redis_client").ping()),
+    )
+    return dict(results)
+
+
+async def warm_up_pools():
+    mongo_db = _get("db")
+    analytics = _get("analytics_db")
+    redis_conn = _get("redis_client")
+
+    # Concurrent pings force each pool to open several sockets instead of one.
+    mongo_pings = [mongo_db.command("ping") for _ in range(max(1, settings.MONGO_MIN_POOL_SIZE))]
+    mongo_pings.append(analytics.command("ping", read_preference=analytics.read_preference))
+    redis_pings = [
+        conn.ping()
+        for conn in (redis_conn, _get("redis_cache"))
+        for _ in range(max(1, settings.REDIS_WARM_CONNECTIONS))
+    ]
+    await asyncio.gather(*mongo_pings, *redis_pings)
+
+
+async def close_clients():
+    if not _clients:
+        return
+    _clients["client"].close()
+    await _clients["redis_client"].aclose()
+    await _clients["redis_cache"].aclose()
+    _clients.clear()
+    logger.info("Database connections closed.")
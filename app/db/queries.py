@@ -1,23 +1,16 @@
 import asyncio
-from datetime import datetime, date, timezone
-import json
-from bson import ObjectId
-from .client import db, redis_client
+from datetime import datetime, timezone
+from bson import ObjectId, Binary
+from pymongo import ASCENDING, DESCENDING, IndexModel, UpdateOne
+from .client import db, analytics_db
+from app.core.config import settings
+from app.utils.codec import to_jsonable, encode_cache_value, decode_cache_value
+from app.utils.financial_snapshot import attach_snapshot
+from app.utils.tiered_cache import TieredCache
+from app.utils import alert_stream
+from app.utils.tracing import traced
 from loguru import logger
 
-def _serialize_mongo_doc(obj):
-    if obj is None:
-        return None
-    if isinstance(obj, list):
-        return [_serialize_mongo_doc(item) for item in obj]
-    if isinstance(obj, dict):
-        return {k: _serialize_mongo_doc(v) for k, v in obj.items()}
-    if isinstance(obj, ObjectId):
-        return str(obj)
-    if isinstance(obj, (datetime, date)):
-        return obj.isoformat()
-    return obj
-
 def calculate_implied_interest_rate(debt_doc):
     amount = float(debt_doc.get("amount") or 0)
     int_rep = float(debt_doc.get("interestRepayment") or 0)
@@ -31,13 +24,22 @@ def _safe_result(result, single: bool = False):
         return None if single else []
     return result
 
+
+summary_cache = TieredCache("user_summary", settings.SUMMARY_CACHE_TTL_SECONDS)
+report_cache = TieredCache("optimization_report", settings.REPORT_CACHE_TTL_SECONDS)
+tips_cache = TieredCache("calculator_tips", settings.TIPS_CACHE_TTL_SECONDS)
+
+@traced("db.financial_summary")
 async def get_user_financial_summary(user_id: str, skip_cache: bool = False, time_frame: str = 'all_time') -> dict:
-    cache_key = f"user_summary:{user_id}:{time_frame}"
+    cache_key = f"{user_id}:{time_frame}"
+    if skip_cache:
+        summary = await _build_user_financial_summary(user_id, time_frame)
+        await summary_cache.set(cache_key, summary)
+        return summary
+    return await summary_cache.get_or_load(cache_key, lambda: _build_user_financial_summary(user_id, time_frame))
 
-    if not skip_cache:
-        cached_summary = await redis_client.get(cache_key)
-        if cached_summary:
-            return json.loads(cached_summary)
+
+async def _build_user_financial_summary(user_id: str, time_frame: str) -> dict:
 
     try:
         object_id = ObjectId(user_id)
@@ -45,7 +47,7 @@ async def get_user_financial_summary(user_id: str, skip_cache: bool = False, tim
         raise ValueError(f"Invalid user_id format provided: {user_id}")
 
     # Get user first to check for partner link
-    user = await db.users.find_one({"_id": object_id})
+    user = await analytics_db.users.find_one({"_id": object_id})
     partner_id = user.get("partnerId") if user else None
     
     general_query = {"userId": object_id, "isDeleted": False}
@@ -73,7 +75,7 @@ async def get_user_financial_summary(user_id: str, skip_cache: bool = False, tim
         budget_query["createdAt"] = {"$gte": start_of_month, "$lt": end_of_month}
 
     # 4. Partner Data Inclusion (Node.js rule: include partner's household budgets)
-    budget_tasks = [db.budgets.find(budget_query).to_list(length=None)]
+    budget_tasks = [analytics_db.budgets.find(budget_query).to_list(length=None)]
     if partner_id:
         partner_budget_query = {
             "userId": ObjectId(partner_id),
@@ -81,18 +83,18 @@ async def get_user_financial_summary(user_id: str, skip_cache: bool = False, tim
             "type": "household",
             "createdAt": budget_query.get("createdAt", {"$exists": True})
         }
-        budget_tasks.append(db.budgets.find(partner_budget_query).to_list(length=None))
+        budget_tasks.append(analytics_db.budgets.find(partner_budget_query).to_list(length=None))
 
     # 5. Saving Goal Filtering (Node.js rule: isCompleted: false and completeDate > now)
     saving_goal_query = dict(general_query)
     saving_goal_query["isCompleted"] = False
     saving_goal_query["completeDate"] = {"$gt": now}
 
-    income_task = db.incomes.find(income_query).to_list(length=None)
-    expense_task = db.expenses.find(expense_query).to_list(length=None)
-    debt_task = db.debts.find(general_query).to_list(length=None)
-    saving_goal_task = db.savinggoals.find(saving_goal_query).to_list(length=None)
-    subscription_task = db.subscriptions.find_one({"userId": object_id, "status": "active"})
+    income_task = analytics_db.incomes.find(income_query).to_list(length=None)
+    expense_task = analytics_db.expenses.find(expense_query).to_list(length=None)
+    debt_task = analytics_db.debts.find(general_query).to_list(length=None)
+    saving_goal_task = analytics_db.savinggoals.find(saving_goal_query).to_list(length=None)
+    subscription_task = analytics_db.subscriptions.find_one({"userId": object_id, "status": "active"})
 
     results = await asyncio.gather(
         income_task, expense_task, asyncio.gather(*budget_tasks),
@@ -138,16 +140,19 @@ async def get_user_financial_summary(user_id: str, skip_cache: bool = False, tim
             else:
                 rate = float(d.get("interestRate") or d.get("userInterestRate") or 0)
             
+            annual_rate = calculate_implied_interest_rate(d) or float(d.get("interestRate") or d.get("userInterestRate") or 0)
+
             processed_debts.append({
                 "name": d.get("name"),
                 "amount": float(d.get("amount", 0)),
                 "monthlyPayment": float(d.get("monthlyPayment", 0)),
                 "interestRate": round(rate, 2),
+                "annualRate": annual_rate,
                 "completionRatio": float(d.get("completionRatio", 0))
             })
 
+        # Keep every debt: the payoff simulator needs the full portfolio, not just the top few.
         processed_debts.sort(key=lambda x: x["interestRate"], reverse=True)
-        processed_debts = processed_debts[:3]
 
     summary = {
         "name": user.get("name", "there") if user else "there",
@@ -165,15 +170,15 @@ async def get_user_financial_summary(user_id: str, skip_cache: bool = False, tim
         "subscription_status": subscription.get("status", "none") if subscription else "none"
     }
 
-    serialized_summary = _serialize_mongo_doc(summary)
-    await redis_client.set(cache_key, json.dumps(serialized_summary), ex=300)
+    # The derived figures are computed here once and cached with the summary.
+    return attach_snapshot(to_jsonable(summary))
 
-    return serialized_summary
 
-
-async def save_chat_message(user_id: str, conversation_id: str, role: str, message: str):
+async def save_chat_message(user_id: str, conversation_id: str, role: str, message: str, message_id: str = None):
     try:
         await db.chat_history.insert_one({
+            # Callers that already told the client the message id pass it in.
+            "_id": ObjectId(message_id) if message_id else ObjectId(),
             "userId": ObjectId(user_id),
             "conversation_id": conversation_id,
             "role": role,
@@ -184,10 +189,31 @@ async def save_chat_message(user_id: str, conversation_id: str, role: str, messa
         logger.error(f"Failed to save chat message for user {user_id}: {e}")
 
 
-async def get_conversation_history(conversation_id: str, limit: int = 20) -> list:
+async def save_conversation_title(user_id: str, conversation_id: str, title: str):
+    now = datetime.now(timezone.utc)
+    try:
+        await db.chat_conversations.update_one(
+            {"conversation_id": conversation_id},
+            {
+                "$setOnInsert": {"userId": ObjectId(user_id), "title": title, "createdAt": now},
+                "$set": {"updatedAt": now},
+            },
+            upsert=True,
+        )
+    except Exception as e:
+        logger.error(f"Failed to save title for conversation {conversation_id}: {e}")
+
+
+async def get_conversation_history(conversation_id: str, limit: int = 20, with_ids: bool = False) -> list:
+    # Read on the primary: a client reconnecting right after a turn must see it, and delta sync
+    # looks up its lastMessageId here.
     cursor = db.chat_history.find({"conversation_id": conversation_id}).sort("timestamp", -1).limit(limit)
     docs = await cursor.to_list(length=limit)
     docs.reverse()
+    if len(docs) < limit:
+        # Older turns of a reopened conversation live in its archive bundle.
+        archived = await get_archived_messages(conversation_id)
+        docs = archived[-(limit - len(docs)):] + docs if archived else docs
     history = []
     for document in docs:
         role = document["role"]
@@ -196,25 +222,203 @@ async def get_conversation_history(conversation_id: str, limit: int = 20) -> lis
         elif role not in ("user", "assistant", "system"):
             logger.warning(f"Unknown role '{role}' in conversation history, skipping message.")
             continue
-        history.append({"role": role, "content": document["message"]})
+        entry = {"role": role, "content": document["message"]}
+        if with_ids:
+            # Archived messages carry their original id as "id".
+            entry["id"] = document.get("id") or str(document["_id"])
+        history.append(entry)
     return history
 
 
+async def get_archived_messages(conversation_id: str) -> list:
+    bundle = await db.chat_history_archive.find_one({"conversation_id": conversation_id})
+    if not bundle:
+        return []
+    return decode_cache_value(bytes(bundle["payload"]))
+
+
+async def get_archived_messages_for_user(conversation_id: str, user_id: str | None) -> list:
+    query = {"conversation_id": conversation_id}
+    if user_id is not None:
+        query["userId"] = ObjectId(user_id)
+    bundle = await analytics_db.chat_history_archive.find_one(query)
+    if not bundle:
+        return []
+    return decode_cache_value(bytes(bundle["payload"]))
+
+
+def _history_query(conversation_id: str, user_id: str | None, key: tuple | None, newer: bool) -> dict:
+    query = {"conversation_id": conversation_id}
+    if user_id is not None:
+        query["userId"] = ObjectId(user_id)
+    if key is not None:
+        # Keyset on (timestamp, _id): stable while new messages arrive, and no skip() over earlier pages.
+        timestamp, message_id = key
+        op = "$gt" if newer else "$lt"
+        query["$or"] = [
+            {"timestamp": {op: timestamp}},
+            {"timestamp": timestamp, "_id": {op: ObjectId(message_id)}},
+        ]
+    return query
+
+
+async def get_conversation_messages_before(conversation_id: str, user_id: str | None, before: tuple | None, limit: int) -> list:
+    cursor = (
+        analytics_db.chat_history.find(_history_query(conversation_id, user_id, before, newer=False))
+        .sort([("timestamp", DESCENDING), ("_id", DESCENDING)])
+        .limit(limit)
+    )
+    return await cursor.to_list(length=limit)
+
+
+async def iter_conversation_messages(conversation_id: str, user_id: str | None, after: tuple | None, batch_size: int):
+    cursor = (
+        analytics_db.chat_history.find(_history_query(conversation_id, user_id, after, newer=True))
+        .sort([("timestamp", ASCENDING), ("_id", ASCENDING)])
+        .batch_size(batch_size)
+    )
+    async for document in cursor:
+        yield document
+
+
+async def find_idle_conversation_ids(cutoff: datetime, limit: int) -> list:
+    # Idle means the newest message is older than the cutoff, so active conversations with old
+    # messages never take up the batch.
+    pipeline = [
+        {"$group": {"_id": "$conversation_id", "last": {"$max": "$timestamp"}}},
+        {"$match": {"last": {"$lt": cutoff}}},
+        {"$limit": limit},
+    ]
+    return [doc["_id"] async for doc in db.chat_history.aggregate(pipeline)]
+
+
+async def get_conversation_messages(conversation_id: str) -> list:
+    cursor = db.chat_history.find({"conversation_id": conversation_id}).sort("timestamp", 1)
+    return await cursor.to_list(length=None)
+
+
+async def save_archive_bundle(conversation_id: str, user_id, messages: list) -> dict:
+    payload = encode_cache_value(messages, compression_threshold=0)
+    bundle = {
+        "conversation_id": conversation_id,
+        "userId": user_id,
+        "messageCount": len(messages),
+        "firstTimestamp": messages[0]["timestamp"],
+        "lastTimestamp": messages[-1]["timestamp"],
+        "payload": Binary(payload),
+        "storedBytes": len(payload),
+        "archivedAt": datetime.now(timezone.utc),
+    }
+    await db.chat_history_archive.replace_one({"conversation_id": conversation_id}, bundle, upsert=True)
+    return bundle
+
+
+async def delete_chat_messages(message_ids: list) -> int:
+    result = await db.chat_history.delete_many({"_id": {"$in": message_ids}})
+    return result.deleted_count
+
+
+async def get_collection_storage_stats(collection_name: str) -> dict:
+    try:
+        stats = await db[collection_name].aggregate([{"$collStats": {"storageStats": {}}}]).to_list(length=1)
+    except Exception as e:
+        logger.warning(f"Could not read storage stats for {collection_name}: {e}")
+        return {}
+    storage = stats[0]["storageStats"] if stats else {}
+    return {
+        "count": storage.get("count", 0),
+        "dataBytes": storage.get("size", 0),
+        "storageBytes": storage.get("storageSize", 0),
+        "freeStorageBytes": storage.get("freeStorageSize", 0),
+        "indexBytes": storage.get("totalIndexSize", 0),
+        # What has to stay in the WiredTiger cache for the collection to be served from memory.
+        "workingSetBytes": storage.get("size", 0) + storage.get("totalIndexSize", 0),
+    }
+
+
+async def ensure_indexes():
+    await db.chat_history.create_indexes([
+        IndexModel([("conversation_id", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("timestamp", ASCENDING)]),
+    ])
+    await db.chat_history_archive.create_indexes([
+        IndexModel([("conversation_id", ASCENDING)], unique=True),
+        IndexModel([("userId", ASCENDING), ("lastTimestamp", DESCENDING)]),
+    ])
+    await db.chat_conversations.create_indexes([
+        IndexModel([("conversation_id", ASCENDING)], unique=True),
+    ])
+    await db.admin_alerts.create_indexes([
+        IndexModel([("createdAt", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("category", ASCENDING), ("createdAt", DESCENDING), ("_id", DESCENDING)]),
+        IndexModel([("userId", ASCENDING), ("createdAt", DESCENDING)]),
+    ])
+    await db.calculator_tips.create_indexes([IndexModel([("userId", ASCENDING)])])
+    await db.llm_usage_daily.create_indexes([
+        IndexModel([("day", DESCENDING), ("feature", ASCENDING)]),
+        IndexModel([("userId", ASCENDING), ("day", DESCENDING)]),
+    ])
+    for collection, _ in _CALCULATOR_INPUTS.values():
+        await db[collection].create_indexes([IndexModel([("userId", ASCENDING), ("_id", DESCENDING)])])
+
+
 async def get_all_active_users_cursor():
-    cursor = db.users.find({"isDeleted": False})
+    cursor = analytics_db.users.find({"isDeleted": False})
     async for user in cursor:
         yield user
 
 
-async def save_optimization_report(user_id: str, report_type: str, report_data: dict):
-    await db.optimization_reports.update_one(
+async def create_batch_run(run: dict):
+    await db.batch_runs.insert_one({**run, "createdAt": datetime.now(timezone.utc)})
+
+
+async def update_batch_run(run_id: str, fields: dict):
+    await db.batch_runs.update_one(
+        {"_id": run_id},
+        {"$set": {**fields, "updatedAt": datetime.now(timezone.utc)}}
+    )
+
+
+async def get_batch_run(run_id: str) -> dict | None:
+    return to_jsonable(await db.batch_runs.find_one({"_id": run_id}))
+
+
+async def get_active_user_ids_cursor():
+    cursor = analytics_db.users.find({"isDeleted": False}, {"_id": 1})
+    async for user in cursor:
+        yield str(user["_id"])
+
+
+def _optimization_report_update(user_id: str, report_type: str, report_data: dict) -> tuple:
+    return (
         {"userId": ObjectId(user_id), "reportType": report_type},
         {"$set": {"reportData": report_data, "createdAt": datetime.now(timezone.utc)}},
-        upsert=True
     )
 
 
+async def save_optimization_report(user_id: str, report_type: str, report_data: dict):
+    await db.optimization_reports.update_one(*_optimization_report_update(user_id, report_type, report_data), upsert=True)
+    await report_cache.invalidate(f"{user_id}:{report_type}")
+
+
+async def save_optimization_reports_bulk(reports: list) -> int:
+    # reports: (user_id, report_type, report_data) tuples, written in one unordered bulk.
+    if not reports:
+        return 0
+    result = await db.optimization_reports.bulk_write(
+        [UpdateOne(*_optimization_report_update(*report), upsert=True) for report in reports], ordered=False
+    )
+    await report_cache.invalidate(*{f"{user_id}:{report_type}" for user_id, report_type, _ in reports})
+    return result.upserted_count + result.modified_count
+
+
 async def get_latest_optimization_report(user_id: str, report_type: str) -> dict | None:
+    return await report_cache.get_or_load(
+        f"{user_id}:{report_type}", lambda: _load_latest_optimization_report(user_id, report_type)
+    )
+
+
+async def _load_latest_optimization_report(user_id: str, report_type: str) -> dict | None:
     report = await db.optimization_reports.find_one(
         {"userId": ObjectId(user_id), "reportType": report_type},
         sort=[("createdAt", -1)]
@@ -222,66 +426,216 @@ async def get_latest_optimization_report(user_id: str, report_type: str) -> dict
     return report.get("reportData") if report else None
 
 
+def _alert_view(document: dict) -> dict:
+    alert = to_jsonable(document)
+    alert["id"] = alert.pop("_id")
+    return alert
+
+
 async def save_admin_alert(user_id: str, user_email: str, alert_message: str, category: str):
-    await db.admin_alerts.insert_one({
+    document = {
         "userId": ObjectId(user_id), "userEmail": user_email,
         "alertMessage": alert_message, "category": category,
         "createdAt": datetime.now(timezone.utc)
-    })
+    }
+    await db.admin_alerts.insert_one(document)
+    await alert_stream.append(_alert_view(document))
+
+
+async def get_admin_alerts_page(categories: list | None, since: datetime | None, until: datetime | None,
+                                before: tuple | None, limit: int) -> list:
+    query = {}
+    if categories:
+        query["category"] = {"$in": categories}
+    created = {}
+    if since is not None:
+        created["$gte"] = since
+    if until is not None:
+        created["$lt"] = until
+    if created:
+        query["createdAt"] = created
+    if before is not None:
+        created_at, alert_id = before
+        query["$or"] = [
+            {"createdAt": {"$lt": created_at}},
+            {"createdAt": created_at, "_id": {"$lt": ObjectId(alert_id)}},
+        ]
+    cursor = db.admin_alerts.find(query).sort([("createdAt", DESCENDING), ("_id", DESCENDING)]).limit(limit)
+    return [_alert_view(document) for document in await cursor.to_list(length=limit)]
 
 
 async def get_latest_admin_alerts_for_user(user_id: str, limit: int = 5) -> list:
     try:
         cursor = db.admin_alerts.find({"userId": ObjectId(user_id)}).sort("createdAt", -1).limit(limit)
         alerts = await cursor.to_list(length=limit)
-        return _serialize_mongo_doc(alerts)
+        return to_jsonable(alerts)
     except Exception:
         return []
 
 
-async def save_calculator_tips(user_id: str, tips_data: dict):
-    await db.calculator_tips.update_one(
+USAGE_COUNTERS = ("calls", "errors", "promptTokens", "cachedTokens", "completionTokens", "totalTokens", "latencyMs", "costMicros")
+
+
+async def save_usage_rollup(rows: list) -> int:
+    # rows: {"day", "userId", "feature", "model", "counters"}; one document per (day, user, feature, model).
+    if not rows:
+        return 0
+    now = datetime.now(timezone.utc)
+    operations = [
+        UpdateOne(
+            {"_id": f"{row['day']}|{row['userId'] or '-'}|{row['feature']}|{row['model']}"},
+            {
+                "$setOnInsert": {"day": row["day"], "userId": row["userId"], "feature": row["feature"], "model": row["model"]},
+                "$inc": row["counters"],
+                "$set": {"updatedAt": now},
+            },
+            upsert=True,
+        )
+        for row in rows
+    ]
+    result = await db.llm_usage_daily.bulk_write(operations, ordered=False)
+    return result.upserted_count + result.modified_count
+
+
+async def get_usage_totals(group_by: list, since: str, until: str, user_id: str | None = None,
+                           feature: str | None = None, sort_by: str | None = None, limit: int | None = None) -> list:
+    # since/until are inclusive YYYY-MM-DD days.
+    match = {"day": {"$gte": since, "$lte": until}}
+    if user_id is not None:
+        match["userId"] = user_id
+    if feature is not None:
+        match["feature"] = feature
+    pipeline = [
+        {"$match": match},
+        {"$group": {
+            "_id": {field: f"${field}" for field in group_by},
+            **{name: {"$sum": f"${name}"} for name in USAGE_COUNTERS},
+        }},
+    ]
+    if sort_by:
+        pipeline.append({"$sort": {sort_by: -1}})
+    if limit:
+        pipeline.append({"$limit": limit})
+    totals = []
+    async for row in analytics_db.llm_usage_daily.aggregate(pipeline):
+        totals.append({**row.pop("_id"), **row})
+    return totals
+
+
+def _calculator_tips_update(user_id: str, tips_data: dict, merge: bool) -> tuple:
+    if merge:
+        # Only the given tips are replaced, so tips finishing at different times don't overwrite each other.
+        update = {f"tipsData.{key}": tip for key, tip in tips_data.items()}
+    else:
+        update = {"tipsData": tips_data}
+    return (
         {"userId": ObjectId(user_id)},
-        {"$set": {"tipsData": tips_data, "createdAt": datetime.now(timezone.utc)}},
-        upsert=True
+        {"$set": {**update, "createdAt": datetime.now(timezone.utc)}},
+    )
+
+
+async def save_calculator_tips(user_id: str, tips_data: dict, merge: bool = False):
+    await db.calculator_tips.update_one(*_calculator_tips_update(user_id, tips_data, merge), upsert=True)
+    await tips_cache.invalidate(user_id)
+
+
+async def save_calculator_tips_bulk(tips_by_user: dict, merge: bool = True) -> int:
+    if not tips_by_user:
+        return 0
+    result = await db.calculator_tips.bulk_write(
+        [UpdateOne(*_calculator_tips_update(user_id, tips, merge), upsert=True) for user_id, tips in tips_by_user.items()],
+        ordered=False
     )
+    await tips_cache.invalidate(*tips_by_user)
+    return result.upserted_count + result.modified_count
 
 
 async def get_latest_calculator_tips(user_id: str) -> dict | None:
+    return await tips_cache.get_or_load(user_id, lambda: _load_latest_calculator_tips(user_id))
+
+
+async def _load_latest_calculator_tips(user_id: str) -> dict | None:
+    # Read from the primary: a tip saved a moment ago must not be cached as missing from a lagging secondary.
     tips = await db.calculator_tips.find_one({"userId": ObjectId(user_id)})
     return tips.get("tipsData") if tips else None
 
 
+# Only the fields the tip prompt builders read are fetched.
+_CALCULATOR_INPUTS = {
+    "savings": ("savingcalculations", [
+        "amount", "frequency", "returnRate", "return_rate", "inflationRate", "inflation_years",
+        "taxationRate", "taxation_rate",
+    ]),
+    "loan": ("loanrepaymentcalculations", ["principal", "annualInterestRate", "loanTermYears"]),
+    "futureValue": ("inflationcalculations", ["initialAmount", "annualInflationRate", "yearsToProject", "years"]),
+    "historical": ("inflationapicalculations", [
+        "fromYear", "toYear", "amount", "equivalentAmountInToYear", "purchasingPowerLost",
+    ]),
+}
+
+
+def _latest_input_pipeline(user_oid: ObjectId, kind: str, fields: list) -> list:
+    return [
+        {"$match": {"userId": user_oid}},
+        {"$sort": {"_id": -1}},
+        {"$limit": 1},
+        {"$project": {"kind": {"$literal": kind}, **{field: 1 for field in fields}}},
+    ]
+
+
+async def get_calculator_state(user_id: str) -> dict:
+    # Stored tips and the latest input of each calculator in one round trip. On the primary, like
+    # _load_latest_calculator_tips: a tip or input saved a moment ago must be seen by the next poll.
+    user_oid = ObjectId(user_id)
+    pipeline = [
+        {"$match": {"userId": user_oid}},
+        {"$limit": 1},
+        {"$project": {"_id": 0, "kind": {"$literal": "tips"}, "tipsData": 1}},
+    ]
+    for kind, (collection, fields) in _CALCULATOR_INPUTS.items():
+        pipeline.append({"$unionWith": {"coll": collection, "pipeline": _latest_input_pipeline(user_oid, kind, fields)}})
+
+    docs = await db.calculator_tips.aggregate(pipeline).to_list(length=len(_CALCULATOR_INPUTS) + 1)
+    state = {"tips": None, **{kind: None for kind in _CALCULATOR_INPUTS}}
+    for doc in to_jsonable(docs):
+        kind = doc.pop("kind")
+        state[kind] = doc.get("tipsData") if kind == "tips" else doc
+
+    if state["futureValue"] and "years" in state["futureValue"]:
+        state["futureValue"]["yearsToProject"] = state["futureValue"]["years"]
+    return state
+
+
 async def get_latest_savings_input(user_id: str) -> dict | None:
-    doc = await db.savingcalculations.find_one(
+    doc = await analytics_db.savingcalculations.find_one(
         {"userId": ObjectId(user_id)},
         sort=[("_id", -1)]
     )
-    return _serialize_mongo_doc(doc)
+    return to_jsonable(doc)
 
 
 async def get_latest_loan_input(user_id: str) -> dict | None:
-    doc = await db.loanrepaymentcalculations.find_one(
+    doc = await analytics_db.loanrepaymentcalculations.find_one(
         {"userId": ObjectId(user_id)},
         sort=[("_id", -1)]
     )
-    return _serialize_mongo_doc(doc)
+    return to_jsonable(doc)
 
 
 async def get_latest_future_value_input(user_id: str) -> dict | None:
-    doc = await db.inflationcalculations.find_one(
+    doc = await analytics_db.inflationcalculations.find_one(
         {"userId": ObjectId(user_id)},
         sort=[("_id", -1)]
     )
-    clean = _serialize_mongo_doc(doc)
+    clean = to_jsonable(doc)
     if clean and "years" in clean:
         clean["yearsToProject"] = clean["years"]
     return clean
 
 
 async def get_latest_historical_input(user_id: str) -> dict | None:
-    doc = await db.inflationapicalculations.find_one(
+    doc = await analytics_db.inflationapicalculations.find_one(
         {"userId": ObjectId(user_id)},
         sort=[("_id", -1)]
     )
-    return _serialize_mongo_doc(doc)
\ No newline at end of file
+    return to_jsonable(doc)
\ No newline at end of file
@@ -1,25 +1,95 @@
+import time
+
+_IMPORT_STARTED = time.perf_counter()
+
+import asyncio
 from contextlib import asynccontextmanager
-from fastapi import FastAPI
+from fastapi import FastAPI, status
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
 from app.core.config import settings
 from app.utils.logging import setup_logging
+from app.utils.tracing import init_tracing
 from app.utils.metrics import track_request_metrics
-from app.db.client import client, redis_client
+from app.utils import readiness, presence, background, user_events, drain, tiered_cache, alert_stream, usage_ledger, traffic_capture
+from app.utils.loop_monitor import start_loop_monitor, stop_loop_monitor, TaskLabelMiddleware
+from app.utils.profiling import RequestProfilerMiddleware
+from app.utils.traffic_capture import TrafficCaptureMiddleware
+from app.db import client as db_client
+from app.ai.openai_client import get_openai_client, close_openai_client
 from loguru import logger
 
-from app.routers import chat, admin, calculator, feedback
+from app.db import queries as db_queries
+from app.routers import chat, admin, calculator, feedback, schedule
 
 setup_logging()
+init_tracing()
+
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
+
+
+async def _warm_up_until_ready(process_started: float):
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            await db_client.warm_up_pools()
+            break
+        except Exception as e:
+            readiness.mark_not_ready(f"warm-up failed: {e}")
+            delay = min(settings.STARTUP_RETRY_MAX_SECONDS, 0.5 * (2 ** attempt))
+            logger.warning(f"Connection warm-up attempt {attempt} failed: {e}. Retrying in {delay}s.")
+            await asyncio.sleep(delay)
+
+    try:
+        await db_queries.ensure_indexes()
+    except Exception as e:
+        logger.error(f"Failed to ensure MongoDB indexes: {e}")
+
+    startup_seconds = time.perf_counter() - process_started
+    readiness.mark_ready(startup_seconds)
+    logger.info(f"Ready to serve traffic. Startup took {startup_seconds:.3f}s (imports {_IMPORT_SECONDS:.3f}s).")
+    if startup_seconds > settings.STARTUP_TIME_BUDGET_SECONDS:
+        logger.warning(
+            f"Startup exceeded its {settings.STARTUP_TIME_BUDGET_SECONDS:.1f}s budget by "
+            f"{startup_seconds - settings.STARTUP_TIME_BUDGET_SECONDS:.3f}s."
+        )
+
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     logger.info("Starting up Reho AI Finance API...")
+    db_client.init_clients()
+    get_openai_client()
+    warm_up_task = asyncio.create_task(_warm_up_until_ready(_IMPORT_STARTED))
+    start_loop_monitor()
+    presence.start_presence_heartbeat()
+    user_events.start_user_events()
+    tiered_cache.start_invalidation_listener()
+    usage_ledger.start_usage_ledger()
+    traffic_capture.start_traffic_capture()
+    drain.install_signal_handler()
     yield
     logger.info("Shutting down... Closing database connections.")
-    client.close()
-    await redis_client.aclose()
+    readiness.mark_not_ready("shutting down")
+    warm_up_task.cancel()
+    await stop_loop_monitor()
+    await presence.stop_presence_heartbeat()
+    await user_events.stop_user_events()
+    await tiered_cache.stop_invalidation_listener()
+    await alert_stream.stop_alert_stream()
+    await background.drain(timeout=5.0)
+    await usage_ledger.stop_usage_ledger()
+    await traffic_capture.stop_traffic_capture()
+    await close_openai_client()
+    await db_client.close_clients()
+
+app = FastAPI(title="Reho AI Finance API", lifespan=lifespan, default_response_class=ORJSONResponse)
 
-app = FastAPI(title="Reho AI Finance API", lifespan=lifespan)
+# Added first so they sit innermost, in the same task as the route they observe.
+app.add_middleware(TaskLabelMiddleware)
+if settings.PROFILING_ENABLED:
+    app.add_middleware(RequestProfilerMiddleware)
 
 app.add_middleware(
     CORSMiddleware,
@@ -31,11 +101,33 @@ app.add_middleware(
 
 app.middleware("http")(track_request_metrics)
 
+# Added last so it sits outermost and captured timings include every other middleware.
+if settings.TRAFFIC_CAPTURE_ENABLED:
+    app.add_middleware(TrafficCaptureMiddleware)
+
 app.include_router(chat.router)
 app.include_router(admin.router)
 app.include_router(calculator.router)
 app.include_router(feedback.router)
+app.include_router(schedule.router)
 
 @app.get("/health")
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+
+@app.get("/ready")
+async def readiness_check():
+    state = readiness.get_state()
+    if not state["ready"]:
+        phase = "draining" if drain.is_draining() else "starting"
+        return ORJSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": phase, **state})
+
+    checks = readiness.cached_check(settings.READINESS_CACHE_SECONDS)
+    if checks is None:
+        checks = await db_client.ping_dependencies(settings.READINESS_CHECK_TIMEOUT_SECONDS)
+        readiness.store_check(checks)
+
+    if not all(check["ok"] for check in checks.values()):
+        return ORJSONResponse(status_code=status.HTTP_503_SERVICE_UNAVAILABLE, content={"status": "degraded", "checks": checks, **state})
+    return {"status": "ready", "checks": checks, **state}
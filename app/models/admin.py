@@ -19,6 +19,18 @@ class AdminAlert(BaseModel):
 
 class AdminAlertResponse(BaseModel):
     alerts: List[AdminAlert]
+
+class AdminAlertFeedItem(AdminAlert):
+    id: str
+
+class AdminAlertPage(BaseModel):
+    alerts: List[AdminAlertFeedItem]
+    next_cursor: Optional[str] = Field(None, alias="nextCursor", description="Pass as `cursor` to fetch older alerts; null on the last page.")
+
+    class Config:
+        populate_by_name = True
+        by_alias = True
+
 class SpendingHeatmapItem(BaseModel):
     category: str
     spending_level: str = Field(..., alias="spendingLevel", description="High, Medium, or Low")
@@ -31,6 +43,9 @@ class InstallmentLoanInfo(BaseModel):
     missed_installments: int = Field(..., alias="missedInstallments", description="Count of missed payments.")
     next_due_date: str = Field(..., alias="nextDueDate", description="Date of the next nearest payment.")
     status: str = Field(..., description="Overall risk status: Low Risk, Medium Risk, or High Risk.")
+    projected_debt_free_date: Optional[str] = Field(None, alias="projectedDebtFreeDate", description="Debt-free month under the recommended strategy.")
+    recommended_strategy: Optional[str] = Field(None, alias="recommendedStrategy", description="avalanche, snowball or custom.")
+    interest_saved: Optional[float] = Field(None, alias="interestSaved", description="Interest saved by the recommended strategy versus minimum payments only.")
     
     class Config:
         populate_by_name = True
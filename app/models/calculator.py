@@ -1,3 +1,4 @@
+from typing import List
 from pydantic import BaseModel, Field
 
 class SavingsCalculatorRequest(BaseModel):
@@ -15,6 +16,8 @@ class CalculatorTipsResponse(BaseModel):
     loan_tip: str = Field(..., alias="loanTip", description="Tip for Finance Calculator (Loan Repayment).")
     future_value_tip: str = Field(..., alias="futureValueTip", description="Tip for Inflation Calculator (Future Value).")
     historical_tip: str = Field(..., alias="historicalTip", description="Tip for Inflation Calculator (Historical Value).")
+    pending: bool = Field(False, description="True when some tips are still being generated.")
+    pending_tips: List[str] = Field(default_factory=list, alias="pendingTips", description="Tips still being generated; poll again shortly.")
 
     class Config:
         populate_by_name = True
\ No newline at end of file
@@ -0,0 +1,17 @@
+from datetime import datetime
+from typing import List, Optional
+from pydantic import BaseModel, Field
+
+class ChatHistoryMessage(BaseModel):
+    id: str
+    role: str
+    content: str
+    timestamp: datetime
+
+class ChatHistoryPage(BaseModel):
+    messages: List[ChatHistoryMessage]
+    next_cursor: Optional[str] = Field(None, alias="nextCursor", description="Pass as `cursor` to fetch older messages; null on the last page.")
+
+    class Config:
+        populate_by_name = True
+        by_alias = True
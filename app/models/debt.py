@@ -0,0 +1,42 @@
+from pydantic import BaseModel, Field
+from typing import Dict, List, Optional
+
+class DebtPayoffRequest(BaseModel):
+    extra_payments: List[float] = Field(default_factory=lambda: [0.0], alias="extraPayments", min_length=1, max_length=50, description="Extra monthly amounts to simulate on top of the minimum payments.")
+    custom_allocation: Optional[Dict[str, float]] = Field(None, alias="customAllocation", description="Relative weight per debt name for the custom strategy.")
+
+    class Config:
+        populate_by_name = True
+
+class DebtPayoffTarget(BaseModel):
+    name: str
+    amount: float
+
+class DebtPayoffMilestone(BaseModel):
+    name: str
+    months: Optional[int] = None
+    payoff_date: Optional[str] = Field(None, alias="payoffDate")
+
+    class Config:
+        populate_by_name = True
+
+class DebtPayoffProjection(BaseModel):
+    extra_payment: float = Field(..., alias="extraPayment")
+    months_to_freedom: Optional[int] = Field(None, alias="monthsToFreedom", description="None when the debts are not cleared within the simulation horizon.")
+    debt_free_date: Optional[str] = Field(None, alias="debtFreeDate")
+    total_interest: float = Field(..., alias="totalInterest")
+    interest_saved: Optional[float] = Field(None, alias="interestSaved", description="Interest saved versus paying only the minimums.")
+    target: Optional[DebtPayoffTarget] = None
+    payoff_order: List[DebtPayoffMilestone] = Field(..., alias="payoffOrder")
+
+    class Config:
+        populate_by_name = True
+
+class DebtPayoffPlan(BaseModel):
+    debt_count: int = Field(..., alias="debtCount")
+    monthly_minimums: float = Field(..., alias="monthlyMinimums")
+    baseline: DebtPayoffProjection
+    strategies: Dict[str, List[DebtPayoffProjection]]
+
+    class Config:
+        populate_by_name = True
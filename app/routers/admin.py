@@ -1,7 +1,19 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import os
+from datetime import datetime
+from typing import List, Optional
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, status
+from fastapi.responses import PlainTextResponse, StreamingResponse
 from app.utils.security import require_admin_user
+from app.utils.admission import require_capacity
 from app.services import admin_service
-from app.models.admin import AdminUserAIDashboard 
+from app.core.config import settings
+from app.models.admin import AdminUserAIDashboard, AdminAlertPage
+from app.utils.metrics import get_metrics_snapshot
+from app.utils.presence import get_presence_summary
+from app.utils import profiling, alert_stream, drain
+from app.utils.loop_monitor import get_recent_stalls
+from app.services import chat_history_service
 from loguru import logger
 
 router = APIRouter(
@@ -10,7 +22,7 @@ router = APIRouter(
     dependencies=[Depends(require_admin_user)] 
 )
 
-@router.get("/user-dashboard/{user_id}", response_model=AdminUserAIDashboard)
+@router.get("/user-dashboard/{user_id}", response_model=AdminUserAIDashboard, dependencies=[Depends(require_capacity)])
 async def get_single_user_admin_data(user_id: str):
     try:
         dashboard_data = await admin_service.get_single_user_admin_dashboard(user_id)
@@ -25,4 +37,133 @@ async def get_single_user_admin_data(user_id: str):
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
             detail="Failed to compile the user's AI dashboard data."
-        )
\ No newline at end of file
+        )
+
+
+@router.get("/metrics")
+async def get_service_metrics():
+    snapshot = get_metrics_snapshot()
+    try:
+        snapshot["cluster_presence"] = await get_presence_summary()
+    except Exception as e:
+        logger.error(f"Failed to read cluster presence: {e}")
+        snapshot["cluster_presence"] = None
+    return snapshot
+
+
+
+@router.get("/alerts", response_model=AdminAlertPage)
+async def get_alerts_feed(
+    category: Optional[List[str]] = Query(None),
+    since: Optional[datetime] = Query(None),
+    until: Optional[datetime] = Query(None),
+    limit: int = Query(50, ge=1, le=settings.ADMIN_ALERT_PAGE_MAX),
+    cursor: Optional[str] = Query(None),
+):
+    try:
+        return await admin_service.get_alerts_feed(category, since, until, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+async def _alert_events(categories: Optional[List[str]], last_event_id: Optional[str]):
+    yield b"retry: 5000\n\n"
+    async for item in alert_stream.follow(last_event_id, settings.ADMIN_ALERT_KEEPALIVE_SECONDS):
+        if drain.is_draining():
+            return
+        if item is None:
+            yield b": keepalive\n\n"
+            continue
+        entry_id, alert = item
+        if categories and alert.get("category") not in categories:
+            continue
+        yield b"id: " + entry_id.encode() + b"\nevent: alert\ndata: " + orjson.dumps(alert) + b"\n\n"
+
+
+@router.get("/alerts/stream")
+async def stream_alerts(
+    category: Optional[List[str]] = Query(None),
+    last_event_id: Optional[str] = Header(None),
+    last_event_id_param: Optional[str] = Query(None, alias="lastEventId"),
+):
+    # Server-sent events. Browsers resend Last-Event-ID on reconnect; lastEventId is for clients that can't set it.
+    last_event_id = last_event_id or last_event_id_param
+    if last_event_id and not alert_stream.is_entry_id(last_event_id):
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid Last-Event-ID.")
+    return StreamingResponse(
+        _alert_events(category, last_event_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/conversations/{conversation_id}/export")
+async def export_conversation(conversation_id: str):
+    # Support access: any user's conversation, in the same format users get from /chat.
+    return StreamingResponse(
+        chat_history_service.export_conversation(conversation_id, None),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="conversation-{conversation_id}.ndjson"'},
+    )
+
+
+_USAGE_DAY = r"^\d{4}-\d{2}-\d{2}$"
+_USAGE_SORT_METRICS = r"^(totalTokens|promptTokens|completionTokens|cachedTokens|costMicros|calls)$"
+
+
+@router.get("/usage/features")
+async def get_usage_by_feature(
+    since: Optional[str] = Query(None, pattern=_USAGE_DAY),
+    until: Optional[str] = Query(None, pattern=_USAGE_DAY),
+):
+    return await admin_service.get_usage_by_feature(since, until)
+
+
+@router.get("/usage/users/{user_id}")
+async def get_usage_for_user(
+    user_id: str,
+    since: Optional[str] = Query(None, pattern=_USAGE_DAY),
+    until: Optional[str] = Query(None, pattern=_USAGE_DAY),
+):
+    return await admin_service.get_usage_for_user(user_id, since, until)
+
+
+@router.get("/usage/top-users")
+async def get_top_usage_users(
+    since: Optional[str] = Query(None, pattern=_USAGE_DAY),
+    until: Optional[str] = Query(None, pattern=_USAGE_DAY),
+    limit: int = Query(20, ge=1, le=500),
+    feature: Optional[str] = Query(None),
+    metric: str = Query("totalTokens", pattern=_USAGE_SORT_METRICS),
+):
+    return await admin_service.get_top_usage_users(since, until, limit, feature, metric)
+
+
+@router.get("/event-loop/stalls")
+async def get_event_loop_stalls():
+    return {"pid": os.getpid(), "stalls": get_recent_stalls()}
+
+
+@router.post("/profiling/cpu", response_class=PlainTextResponse, dependencies=[Depends(profiling.require_profiling_enabled)])
+async def profile_worker_cpu(
+    seconds: float = Query(10.0, gt=0),
+    interval_ms: float = Query(None, gt=0, alias="intervalMs"),
+    all_threads: bool = Query(False, alias="allThreads"),
+):
+    sampler = await profiling.profile_worker(seconds, interval_ms, all_threads)
+    return PlainTextResponse(sampler.folded(), headers=sampler.headers())
+
+
+@router.post("/profiling/memory/start", dependencies=[Depends(profiling.require_profiling_enabled)])
+async def start_memory_tracing(frames: int = Query(10, ge=1, le=50)):
+    return profiling.start_memory_tracing(frames)
+
+
+@router.post("/profiling/memory/stop", dependencies=[Depends(profiling.require_profiling_enabled)])
+async def stop_memory_tracing():
+    return profiling.stop_memory_tracing()
+
+
+@router.get("/profiling/memory", dependencies=[Depends(profiling.require_profiling_enabled)])
+async def get_memory_report(top: int = Query(25, ge=1, le=200)):
+    return profiling.memory_report(top)
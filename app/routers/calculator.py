@@ -1,6 +1,9 @@
-import asyncio
+import time
 from fastapi import APIRouter, Depends
+from app.core.config import settings
 from app.utils.security import get_user_id_from_token
+from app.utils.admission import require_capacity
+from app.utils.rate_limit import rate_limit
 from app.db import queries as db_queries
 from app.models.calculator import CalculatorTipsResponse
 from app.services import feedback_service
@@ -8,71 +11,63 @@ from loguru import logger
 
 router = APIRouter(prefix="/calculator", tags=["Financial Calculator"])
 
-async def get_precalculated_calculator_tips(user_id: str) -> dict:
-    tips_data = await db_queries.get_latest_calculator_tips(user_id)
-    if not tips_data:
-        tips_data = {
-            "savingsTip": "Tip will be available after the midnight analysis.",
-            "loanTip": "Tip will be available after the midnight analysis.",
-            "futureValueTip": "Tip will be available after the midnight analysis.",
-            "historicalTip": "Tip will be available after the midnight analysis."
-        }
+def _tips_with_defaults(stored_tips: dict | None) -> dict:
+    tips_data = {
+        "savingsTip": "Tip will be available after the midnight analysis.",
+        "loanTip": "Tip will be available after the midnight analysis.",
+        "futureValueTip": "Tip will be available after the midnight analysis.",
+        "historicalTip": "Tip will be available after the midnight analysis."
+    }
+    # Tips generated on demand are saved one at a time, so a stored document may be partial.
+    tips_data.update(stored_tips or {})
     return tips_data
 
-@router.get("/tips", response_model=CalculatorTipsResponse)
+@router.get("/tips", response_model=CalculatorTipsResponse, dependencies=[Depends(rate_limit("calculator_tips")), Depends(require_capacity)])
 async def get_scheduled_calculator_tips(
     user_id: str = Depends(get_user_id_from_token) 
 ):
-    cached_tips = await get_precalculated_calculator_tips(user_id)
-    
-    results = await asyncio.gather(
-        db_queries.get_latest_savings_input(user_id),
-        db_queries.get_latest_loan_input(user_id),
-        db_queries.get_latest_future_value_input(user_id),
-        db_queries.get_latest_historical_input(user_id)
-    )
-    latest_savings, latest_loan, latest_future, latest_hist = results
+    request_started = time.perf_counter()
+    calculator_state = await db_queries.get_calculator_state(user_id)
+    cached_tips = _tips_with_defaults(calculator_state["tips"])
+
+    latest_savings = calculator_state["savings"]
+    latest_loan = calculator_state["loan"]
+    latest_future = calculator_state["futureValue"]
+    latest_hist = calculator_state["historical"]
     
-    ai_tasks = []
-    task_map = {}
+    tip_requests = {}
 
     
     if latest_savings:
         if "will be available" in cached_tips["savingsTip"] or "Please run" in cached_tips["savingsTip"] or "{" in cached_tips["savingsTip"]:
-            t = feedback_service.generate_instant_tip_from_db(user_id, 'savings', latest_savings)
-            ai_tasks.append(t)
-            task_map[len(ai_tasks)-1] = "savingsTip"
+            tip_requests["savingsTip"] = ('savings', latest_savings)
     else:
         cached_tips["savingsTip"] = "Please run a Savings calculation to receive a personalized tip."
         
     if latest_loan:
         if "will be available" in cached_tips["loanTip"] or "Please run" in cached_tips["loanTip"]:
-            t = feedback_service.generate_instant_tip_from_db(user_id, 'loan', latest_loan)
-            ai_tasks.append(t)
-            task_map[len(ai_tasks)-1] = "loanTip"
+            tip_requests["loanTip"] = ('loan', latest_loan)
     else:
         cached_tips["loanTip"] = "Please run a Loan calculation to receive a personalized tip."
 
     if latest_future:
         if "will be available" in cached_tips["futureValueTip"] or "Please run" in cached_tips["futureValueTip"]:
-            t = feedback_service.generate_instant_tip_from_db(user_id, 'inflation_future', latest_future)
-            ai_tasks.append(t)
-            task_map[len(ai_tasks)-1] = "futureValueTip"
+            tip_requests["futureValueTip"] = ('inflation_future', latest_future)
     else:
         cached_tips["futureValueTip"] = "Please run a Future Value calculation to receive a personalized tip."
         
     if latest_hist:
         if "will be available" in cached_tips["historicalTip"] or "Please run" in cached_tips["historicalTip"]:
-            t = feedback_service.generate_instant_tip_from_db(user_id, 'historical', latest_hist)
-            ai_tasks.append(t)
-            task_map[len(ai_tasks)-1] = "historicalTip"
+            tip_requests["historicalTip"] = ('historical', latest_hist)
     else:
         cached_tips["historicalTip"] = "Please run a Historical Inflation calculation to receive a personalized tip."
 
-    if ai_tasks:
-        ai_results = await asyncio.gather(*ai_tasks)
-        for i, tip_text in enumerate(ai_results):
-            key = task_map[i]
-            cached_tips[key] = tip_text
+    pending_tips = []
+    if tip_requests:
+        remaining = settings.CALCULATOR_TIPS_BUDGET_SECONDS - (time.perf_counter() - request_started)
+        ready_tips, pending_tips = await feedback_service.generate_tips_within_budget(user_id, tip_requests, remaining)
+        cached_tips.update(ready_tips)
+        for key in pending_tips:
+            cached_tips[key] = feedback_service.TIP_PENDING_MESSAGE
 
-    return CalculatorTipsResponse(**cached_tips)
\ No newline at end of file
+    return CalculatorTipsResponse(**cached_tips, pending=bool(pending_tips), pendingTips=pending_tips)
\ No newline at end of file
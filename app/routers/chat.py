@@ -1,125 +1,374 @@
 import asyncio
 import json
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect, status
-from app.utils.security import verify_token_ws
+import time
+from typing import Optional
+from bson import ObjectId
+from fastapi import APIRouter, Depends, HTTPException, Query, WebSocket, WebSocketDisconnect, status
+from fastapi.responses import StreamingResponse
+from app.core.config import settings
+from app.utils.security import verify_token_ws, get_user_id_from_token
 from app.db import queries as db_queries
+from app.models.chat import ChatHistoryPage
+from app.services import chat_history_service
 from app.ai import prompt_builder
-from openai import AsyncOpenAI
-from app.core.config import settings
+from app.ai import model_router, answer_cache
 from loguru import logger
 from app.utils.retry import retry_openai
-from app.utils.metrics import track_openai_metrics, add_active_user, remove_active_user
+from app.utils.metrics import (
+    track_openai_metrics, add_active_user, remove_active_user, record_generation_cancelled, record_chat_first_frame,
+)
+from app.utils import admission, presence, user_events, rate_limit
+from app.utils.tracing import chat_turn_transaction
+from app.utils import background, drain, profiling, chat_protocol
+from app.utils.chat_protocol import ChatSocket
+from app.utils.loop_monitor import label_current_task
+from app.utils.usage_ledger import attribute_usage
 
 router = APIRouter(prefix="/chat", tags=["Chat"])
 
-aclient = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
-
 MAX_HISTORY_CONTEXT = 15
 
+profiling.register_memory_holder("chat_messages_for_api", lambda: [s.messages_for_api for s in drain.active_sessions()])
+
 @retry_openai(max_retries=3)
 @track_openai_metrics()
 async def get_openai_full_response(messages_for_api: list):
-    response = await aclient.chat.completions.create(
-        model="gpt-4o",
-        messages=messages_for_api,
-        temperature=0.7
-    )
+    response = await model_router.chat_completion("chat", messages_for_api)
     return response.choices[0].message.content
 
 
+@track_openai_metrics()
+async def generate_conversation_title(user_id: str, conversation_id: str, first_message: str):
+    try:
+        response = await model_router.chat_completion(
+            "chat_title", prompt_builder.build_title_generation_prompt(first_message)
+        )
+        title = (response.choices[0].message.content or "").strip().strip('"').strip()[:80]
+        if title:
+            await db_queries.save_conversation_title(user_id, conversation_id, title)
+    except Exception as e:
+        logger.warning(f"Failed to generate a title for conversation {conversation_id}: {e}")
+
+
+def _parse_client_frame(raw_data) -> tuple:
+    # Text frames arrive as str; msgpack frames are already decoded.
+    if not isinstance(raw_data, str):
+        user_data = raw_data
+    else:
+        try:
+            user_data = json.loads(raw_data)
+        except json.JSONDecodeError:
+            logger.warning(f"Received non-JSON message from client: {raw_data}")
+            return "message", raw_data.strip()
+
+    if not isinstance(user_data, dict):
+        return "message", str(user_data).strip()
+    if user_data.get("type") == "cancel":
+        return "cancel", None
+    return "message", str(user_data.get("message", "")).strip()
+
+
+class ChatSession:
+    # One connection = a reader loop plus at most one generation task. A disconnect, an explicit
+    # cancel frame or a newer question cancels the running generation, including its retries.
+
+    def __init__(self, websocket: ChatSocket, user_id: str, conversation_id: str, messages_for_api: list,
+                 summary_fingerprint: str = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.conversation_id = conversation_id
+        self.messages_for_api = messages_for_api
+        self.summary_fingerprint = summary_fingerprint
+        self.generation_task = None
+        self.delivering = False
+
+    async def run(self):
+        try:
+            while True:
+                raw_data = await self.websocket.receive()
+                kind, user_message = _parse_client_frame(raw_data)
+
+                if kind == "cancel":
+                    if await self.cancel_generation("client_cancel"):
+                        await self.websocket.send_json({"type": "status", "data": "cancelled"})
+                    continue
+
+                if not user_message:
+                    continue
+
+                if drain.is_draining():
+                    await self.websocket.send_json(drain.reconnect_frame())
+                    continue
+
+                retry_after = await rate_limit.check("chat_message", self.user_id)
+                if retry_after:
+                    await self.websocket.send_json(rate_limit.rate_limited_frame(retry_after))
+                    continue
+
+                if await self.cancel_generation("superseded"):
+                    await self.websocket.send_json({"type": "status", "data": "cancelled"})
+
+                overloaded = admission.overload_reason()
+                if overloaded:
+                    admission.record_shed("chat_message", overloaded)
+                    await self.websocket.send_json(admission.busy_frame())
+                    continue
+
+                self.generation_task = asyncio.create_task(self._run_turn(user_message))
+        finally:
+            await self.cancel_generation("disconnect")
+
+    async def cancel_generation(self, reason: str) -> bool:
+        task = self.generation_task
+        self.generation_task = None
+        if task is None or task.done():
+            return False
+        if self.delivering:
+            # The answer already exists; let it reach the client and the database.
+            await asyncio.gather(task, return_exceptions=True)
+            return False
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        record_generation_cancelled(reason)
+        logger.info(f"Cancelled in-flight generation for {self.user_id} ({reason}).")
+        return True
+
+    async def drain(self, timeout: float) -> str:
+        # Let the running turn finish (its reply and saves included), then send the client away.
+        outcome = "idle"
+        task = self.generation_task
+        if task is not None and not task.done():
+            done, _ = await asyncio.wait({task}, timeout=timeout)
+            if done:
+                outcome = "finished"
+            elif await self.cancel_generation("shutdown"):
+                outcome = "cancelled"
+        try:
+            await self.websocket.send_json(drain.reconnect_frame())
+            await self.websocket.close(code=status.WS_1012_SERVICE_RESTART)
+        except Exception as e:
+            logger.debug(f"Could not send reconnect to {self.user_id}: {e}")
+        return outcome
+
+    def _context_window(self) -> list:
+        if len(self.messages_for_api) > MAX_HISTORY_CONTEXT + 1:
+            return [self.messages_for_api[0]] + self.messages_for_api[-MAX_HISTORY_CONTEXT:]
+        return self.messages_for_api
+
+    async def _run_turn(self, user_message: str):
+        label_current_task(f"chat turn {self.conversation_id}")
+        with chat_turn_transaction(self.conversation_id) as transaction, attribute_usage(user_id=self.user_id):
+            try:
+                await self._answer(user_message)
+            except asyncio.CancelledError:
+                transaction.set_tag("chat.outcome", "cancelled")
+                raise
+
+    async def _answer(self, user_message: str):
+        try:
+            await db_queries.save_chat_message(self.user_id, self.conversation_id, "user", user_message)
+            first_turn = not any(m["role"] == "user" for m in self.messages_for_api)
+            if first_turn:
+                background.spawn(
+                    generate_conversation_title(self.user_id, self.conversation_id, user_message),
+                    name=f"chat-title-{self.conversation_id}",
+                )
+            self.messages_for_api.append({"role": "user", "content": user_message})
+
+            cacheable = bool(self.summary_fingerprint) and answer_cache.is_cacheable(user_message, first_turn)
+            full_reply = answer_cache.lookup(self.user_id, self.summary_fingerprint, user_message) if cacheable else None
+            if full_reply is None:
+                full_reply = await get_openai_full_response(self._context_window())
+                if cacheable:
+                    answer_cache.store(self.user_id, self.summary_fingerprint, user_message, full_reply)
+                else:
+                    answer_cache.record_skipped()
+
+            self.delivering = True
+            await self._deliver_reply(full_reply)
+
+        except asyncio.CancelledError:
+            raise
+        except Exception as inner_e:
+            logger.error(f"Error processing user message for {self.user_id}: {inner_e}")
+            try:
+                await self.websocket.send_json({
+                    "type": "error",
+                    "data": "Sorry, I encountered an error processing your request. Please try again."
+                })
+            except Exception:
+                pass
+        finally:
+            self.delivering = False
+
+    async def _deliver_reply(self, full_reply: str):
+        self.messages_for_api.append({"role": "assistant", "content": full_reply})
+        if len(self.messages_for_api) > MAX_HISTORY_CONTEXT + 1:
+            self.messages_for_api[:] = [self.messages_for_api[0]] + self.messages_for_api[-MAX_HISTORY_CONTEXT:]
+
+        reply_id = str(ObjectId())
+        try:
+            await self.websocket.send_json(chat_protocol.reply_frame(full_reply, reply_id, self.websocket.binary))
+            await self.websocket.send_json({"type": "status", "data": "done"})
+        finally:
+            await db_queries.save_chat_message(self.user_id, self.conversation_id, "assistant", full_reply, message_id=reply_id)
+
+
+async def _prefetch_user_caches(user_id: str):
+    # Speculative: tips and reports are usually opened next, and these reads leave them in this
+    # worker's cache. Failures only mean a cold read later.
+    await asyncio.gather(
+        db_queries.get_latest_calculator_tips(user_id),
+        *(db_queries.get_latest_optimization_report(user_id, report_type) for report_type in ("expense", "budget", "debt")),
+        return_exceptions=True,
+    )
+
+
+def _discard(*tasks: asyncio.Task):
+    for task in tasks:
+        if not task.done():
+            task.cancel()
+        elif not task.cancelled():
+            task.exception()
+
+
 @router.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    await websocket.accept()
+    connected_at = time.perf_counter()
+    binary, subprotocol = chat_protocol.negotiate(websocket)
+    await websocket.accept(subprotocol=subprotocol)
+    socket = ChatSocket(websocket, binary)
+
+    if drain.is_draining():
+        await socket.send_json(drain.reconnect_frame())
+        await socket.close(code=status.WS_1012_SERVICE_RESTART)
+        return
 
     token = websocket.query_params.get("token")
     user_id = None
 
     try:
         user_id = verify_token_ws(token)
-        add_active_user(user_id)
     except ValueError as e:
         logger.error(f"WebSocket Authentication failed: {e}")
-        await websocket.send_json({"error": f"Authentication failed: {e}"})
-        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        await socket.send_json({"error": f"Authentication failed: {e}"})
+        await socket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    rejection = admission.websocket_rejection()
+    if rejection:
+        admission.record_shed("websocket", rejection)
+        await socket.send_json(admission.busy_frame())
+        await socket.close(code=status.WS_1013_TRY_AGAIN_LATER)
         return
 
     conversation_id = websocket.query_params.get("conversation_id", f"default_{user_id}")
+    # Both reads are independent of each other and of the presence check, so they start right away.
+    summary_task = asyncio.create_task(db_queries.get_user_financial_summary(user_id, skip_cache=True))
+    history_task = asyncio.create_task(db_queries.get_conversation_history(conversation_id, with_ids=True))
+    last_message_id = websocket.query_params.get("lastMessageId")
 
     try:
-        financial_summary = await db_queries.get_user_financial_summary(user_id, skip_cache=True)
+        connection_id = await presence.register_connection(user_id)
+    except BaseException:
+        _discard(summary_task, history_task)
+        raise
+    if connection_id is None:
+        _discard(summary_task, history_task)
+        await socket.send_json({
+            "type": "error",
+            "data": "You have too many chat windows open. Close one and try again."
+        })
+        await socket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+    add_active_user(user_id)
 
-        initial_history = await db_queries.get_conversation_history(conversation_id)
+    try:
+        # History goes out as soon as it's read; the summary is only needed for the prompt.
+        initial_history = await history_task
 
         if initial_history:
-            await websocket.send_json({"type": "initial_history", "data": initial_history})
+            await socket.send_json(chat_protocol.history_frame(initial_history, binary, last_message_id))
+            record_chat_first_frame("history", connected_at)
+            financial_summary = await summary_task
         else:
+            financial_summary = await summary_task
             user_name = financial_summary.get('name', 'there')
             welcome_message = (
                 f"Hello {user_name}! I'm Reho, your personal AI financial assistant. "
                 f"I see you're new here! You can start by asking me to analyse your financial "
                 f"condition or ask for tips to save money. How can I help you today? 😊"
             )
-            await websocket.send_json({"type": "full_response", "data": welcome_message})
-            await db_queries.save_chat_message(user_id, conversation_id, "assistant", welcome_message)
+            welcome_id = str(ObjectId())
+            await socket.send_json(chat_protocol.reply_frame(welcome_message, welcome_id, binary))
+            record_chat_first_frame("welcome", connected_at)
+            # Timestamped when the task starts, which is before this socket can receive a message.
+            background.spawn(
+                db_queries.save_chat_message(user_id, conversation_id, "assistant", welcome_message, message_id=welcome_id),
+                name=f"chat-welcome-{conversation_id}",
+            )
             initial_history = [{"role": "assistant", "content": welcome_message}]
 
-        personalized_system_prompt = prompt_builder.build_contextual_system_prompt(financial_summary)
-
-        messages_for_api = [{"role": "system", "content": personalized_system_prompt}, *initial_history]
-
-        while True:
-            raw_data = await websocket.receive_text()
-
-            try:
-                try:
-                    user_data = json.loads(raw_data)
-                    user_message = user_data.get("message", "").strip()
-                except json.JSONDecodeError:
-                    logger.warning(f"Received non-JSON message from client: {raw_data}")
-                    user_message = raw_data.strip()
-
-                if not user_message:
-                    continue
-
-                await db_queries.save_chat_message(user_id, conversation_id, "user", user_message)
-
-                messages_for_api.append({"role": "user", "content": user_message})
-
-                if len(messages_for_api) > MAX_HISTORY_CONTEXT + 1:
-                    context_window = [messages_for_api[0]] + messages_for_api[-MAX_HISTORY_CONTEXT:]
-                else:
-                    context_window = messages_for_api
-
-                full_reply = await get_openai_full_response(context_window)
+        background.spawn(_prefetch_user_caches(user_id), name=f"chat-prefetch-{user_id}", wait_on_shutdown=False)
 
-                await websocket.send_json({"type": "full_response", "data": full_reply})
-                await websocket.send_json({"type": "status", "data": "done"})
-
-                await db_queries.save_chat_message(user_id, conversation_id, "assistant", full_reply)
-
-                messages_for_api.append({"role": "assistant", "content": full_reply})
+        personalized_system_prompt = prompt_builder.build_contextual_system_prompt(financial_summary)
 
-                if len(messages_for_api) > MAX_HISTORY_CONTEXT + 1:
-                    messages_for_api = [messages_for_api[0]] + messages_for_api[-MAX_HISTORY_CONTEXT:]
+        messages_for_api = [
+            {"role": "system", "content": personalized_system_prompt},
+            *({"role": m["role"], "content": m["content"]} for m in initial_history),
+        ]
 
-            except Exception as inner_e:
-                logger.error(f"Error processing user message for {user_id}: {inner_e}")
-                await websocket.send_json({
-                    "type": "error",
-                    "data": "Sorry, I encountered an error processing your request. Please try again."
-                })
+        session = ChatSession(
+            socket, user_id, conversation_id, messages_for_api,
+            summary_fingerprint=answer_cache.summary_fingerprint(financial_summary),
+        )
+        # Late calculator tips and other per-user events are forwarded to the open socket.
+        unsubscribe_events = user_events.subscribe(user_id, socket.send_json)
+        drain.register_session(session)
+        try:
+            await session.run()
+        finally:
+            drain.unregister_session(session)
+            unsubscribe_events()
 
     except WebSocketDisconnect:
         logger.info(f"Client disconnected: {user_id}")
-        if user_id:
-            remove_active_user(user_id)
 
     except Exception as e:
         logger.exception(f"Unexpected WebSocket error for user {user_id}: {e}")
-        if user_id:
-            remove_active_user(user_id)
         try:
-            await websocket.send_json({"error": "An unexpected error occurred."})
+            await socket.send_json({"error": "An unexpected error occurred."})
         except Exception:
             pass
-        await websocket.close(code=status.WS_1011_INTERNAL_ERROR)
\ No newline at end of file
+        await socket.close(code=status.WS_1011_INTERNAL_ERROR)
+
+    finally:
+        _discard(summary_task, history_task)
+        await presence.release_connection(connection_id)
+        if not presence.has_local_connection(user_id):
+            remove_active_user(user_id)
+
+
+@router.get("/conversations/{conversation_id}/messages", response_model=ChatHistoryPage)
+async def get_conversation_messages(
+    conversation_id: str,
+    limit: int = Query(50, ge=1, le=settings.CHAT_HISTORY_PAGE_MAX),
+    cursor: Optional[str] = Query(None),
+    user_id: str = Depends(get_user_id_from_token),
+):
+    try:
+        return await chat_history_service.get_history_page(conversation_id, user_id, limit, cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
+
+
+@router.get("/conversations/{conversation_id}/export")
+async def export_conversation(conversation_id: str, user_id: str = Depends(get_user_id_from_token)):
+    return StreamingResponse(
+        chat_history_service.export_conversation(conversation_id, user_id),
+        media_type="application/x-ndjson",
+        headers={"Content-Disposition": f'attachment; filename="conversation-{conversation_id}.ndjson"'},
+    )
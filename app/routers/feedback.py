@@ -1,21 +1,29 @@
 from fastapi import APIRouter, Depends
 from app.utils.security import get_user_id_from_token
+from app.utils.admission import require_capacity
+from app.utils.rate_limit import rate_limit
 from app.services import feedback_service
 from app.models.feedback import OptimizationResponse
+from app.models.debt import DebtPayoffRequest, DebtPayoffPlan
 
 router = APIRouter(prefix="/feedback", tags=["AI Optimization Feedback"])
 
-@router.get("/optimize-expenses", response_model=OptimizationResponse)
+@router.get("/optimize-expenses", response_model=OptimizationResponse, dependencies=[Depends(rate_limit("optimize_expenses")), Depends(require_capacity)])
 async def get_expense_optimization(user_id: str = Depends(get_user_id_from_token)):
     report = await feedback_service.get_expense_optimization_feedback(user_id) 
     return report
 
-@router.get("/optimize-budget", response_model=OptimizationResponse)
+@router.get("/optimize-budget", response_model=OptimizationResponse, dependencies=[Depends(rate_limit("optimize_budget")), Depends(require_capacity)])
 async def get_budget_optimization(user_id: str = Depends(get_user_id_from_token)):
     report = await feedback_service.get_budget_optimization_feedback(user_id)
     return report
 
-@router.get("/optimize-debt", response_model=OptimizationResponse)
+@router.get("/optimize-debt", response_model=OptimizationResponse, dependencies=[Depends(rate_limit("optimize_debt")), Depends(require_capacity)])
 async def get_debt_optimization(user_id: str = Depends(get_user_id_from_token)):
     report = await feedback_service.get_debt_optimization_feedback(user_id)
-    return report
\ No newline at end of file
+    return report
+
+@router.post("/debt-payoff-plan", response_model=DebtPayoffPlan, dependencies=[Depends(rate_limit("debt_payoff_plan"))])
+async def get_debt_payoff_plan(request: DebtPayoffRequest, user_id: str = Depends(get_user_id_from_token)):
+    plan = await feedback_service.get_debt_payoff_plan(user_id, request)
+    return plan
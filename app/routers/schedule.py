@@ -0,0 +1,48 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from app.utils.security import verify_scheduler_key
+from app.db import queries as db_queries
+from app.services import chat_archive_service, batch_service
+
+router = APIRouter(
+    prefix="/schedule",
+    tags=["Scheduled Jobs"],
+    dependencies=[Depends(verify_scheduler_key)]
+)
+
+@router.post("/archive-chat-history")
+async def archive_chat_history(
+    idle_days: Optional[int] = Query(None, ge=1, alias="idleDays"),
+    batch_size: Optional[int] = Query(None, ge=1, le=10000, alias="batchSize"),
+    dry_run: bool = Query(False, alias="dryRun"),
+):
+    return await chat_archive_service.archive_idle_conversations(idle_days, batch_size, dry_run)
+
+
+@router.post("/batch-runs", status_code=status.HTTP_202_ACCEPTED)
+async def start_batch_run(
+    reports: bool = Query(True),
+    tips: bool = Query(True),
+    limit: Optional[int] = Query(None, ge=1),
+):
+    if not reports and not tips:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Nothing to generate")
+    return await batch_service.start_batch_run(reports, tips, limit)
+
+
+@router.get("/batch-runs/{run_id}")
+async def get_batch_run(run_id: str):
+    run = await db_queries.get_batch_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch run not found")
+    return run
+
+
+@router.post("/batch-runs/{run_id}/poll")
+async def poll_batch_run(run_id: str, watch: bool = Query(False)):
+    run = await batch_service.poll_batch_run(run_id)
+    if run is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Batch run not found")
+    if watch and run["status"] == "submitted":
+        batch_service.watch_batch_run(run_id)
+    return run
@@ -2,16 +2,18 @@ import asyncio
 import json
 from app.db import queries as db_queries
 from app.ai import prompt_builder
+from app.ai import model_router
+from app.services import debt_simulator
 from app.models.admin import AdminUserAIDashboard, SpendingHeatmapItem, InstallmentLoanInfo, PeerComparison
 from app.models.feedback import OptimizationInsight
-from openai import AsyncOpenAI
-from app.core.config import settings
 from loguru import logger
 from app.utils.retry import retry_openai
 from app.utils.metrics import track_openai_metrics
-from typing import List, Dict
-
-aclient = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+from app.utils.usage_ledger import attribute_usage
+from app.utils.cursor import encode_cursor, decode_cursor
+from app.utils.financial_snapshot import FinancialSnapshot
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional
 
 
 @retry_openai(max_retries=3)
@@ -19,10 +21,8 @@ aclient = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 async def _run_peer_comparison_ai(financial_summary: dict) -> PeerComparison:
     try:
         comparison_prompt = prompt_builder.build_peer_comparison_prompt(financial_summary)
-        response = await aclient.chat.completions.create(
-            model="gpt-4o",
-            messages=comparison_prompt,
-            response_format={"type": "json_object"}
+        response = await model_router.chat_completion(
+            "peer_comparison", comparison_prompt, response_format={"type": "json_object"}
         )
         data = json.loads(response.choices[0].message.content)
         return PeerComparison(**data)
@@ -31,15 +31,6 @@ async def _run_peer_comparison_ai(financial_summary: dict) -> PeerComparison:
         return PeerComparison(comparison="Peer comparison data is temporarily unavailable.")
 
 
-def _calculate_category_spend(expenses: List[Dict]) -> Dict[str, float]:
-    category_totals = {}
-    for expense in expenses:
-        name = expense.get('budgetCategory') or expense.get('name') or 'Others'
-        amount = float(expense.get('amount') or 0)
-        category_totals[name] = category_totals.get(name, 0.0) + amount
-    return category_totals
-
-
 async def get_single_user_admin_dashboard(user_id: str) -> AdminUserAIDashboard:
     alerts_task = asyncio.create_task(db_queries.get_latest_admin_alerts_for_user(user_id))
     expense_task = asyncio.create_task(db_queries.get_latest_optimization_report(user_id, "expense"))
@@ -49,7 +40,9 @@ async def get_single_user_admin_dashboard(user_id: str) -> AdminUserAIDashboard:
 
     financial_summary = await summary_task
 
-    peer_task = asyncio.create_task(_run_peer_comparison_ai(financial_summary))
+    # The peer comparison is billed to the user whose dashboard it is.
+    with attribute_usage(user_id=user_id):
+        peer_task = asyncio.create_task(_run_peer_comparison_ai(financial_summary))
 
     results = await asyncio.gather(alerts_task, expense_task, budget_task, debt_task, peer_task)
 
@@ -64,25 +57,26 @@ async def get_single_user_admin_dashboard(user_id: str) -> AdminUserAIDashboard:
                 except Exception as e:
                     logger.error(f"Error validating insight data: {e}")
 
-    total_income = sum(i.get("amount", 0) for i in financial_summary.get("incomes", []))
-    total_payments = sum(d.get("monthlyPayment", 0) for d in financial_summary.get("debts", []))
+    snapshot = FinancialSnapshot.of(financial_summary)
 
     missed_count = 0  # TODO:
-    if total_income > 0 and total_payments > 0 and (total_payments / total_income) > 0.40:
-        overall_status = "High Risk"
-    elif total_payments > 0:
-        overall_status = "Medium Risk"
-    else:
-        overall_status = "Low Risk"
+    overall_status = snapshot.debt_risk
+
+    payoff_plan = debt_simulator.build_payoff_plan_for_summary(financial_summary, snapshot=snapshot)
+    strategy = debt_simulator.recommended_strategy(payoff_plan)
+    projection = payoff_plan["reportProjections"].get(strategy) if strategy else None
 
     installment_loan_info = InstallmentLoanInfo(
         missed_installments=missed_count,
         next_due_date="N/A",
-        status=overall_status
+        status=overall_status,
+        projected_debt_free_date=projection["debtFreeDate"] if projection else None,
+        recommended_strategy=strategy,
+        interest_saved=projection["interestSaved"] if projection else None
     )
 
-    category_totals = _calculate_category_spend(financial_summary.get("expenses", []))
-    total_expense = sum(category_totals.values())
+    category_totals = snapshot.category_totals
+    total_expense = snapshot.total_expenses
 
     spending_heatmap_data = []
 
@@ -116,4 +110,53 @@ async def get_single_user_admin_dashboard(user_id: str) -> AdminUserAIDashboard:
         ai_tips=all_ai_tips,
         debt_statuses=installment_loan_info,
         peer_comparison=peer_comparison
-    )
\ No newline at end of file
+    )
+
+
+async def get_alerts_feed(categories: Optional[List[str]], since: Optional[datetime], until: Optional[datetime],
+                          limit: int, cursor: Optional[str] = None) -> dict:
+    before = decode_cursor(cursor) if cursor else None
+    alerts = await db_queries.get_admin_alerts_page(categories, since, until, before, limit + 1)
+    has_more = len(alerts) > limit
+    alerts = alerts[:limit]
+    return {
+        "alerts": alerts,
+        "nextCursor": encode_cursor(alerts[-1]["createdAt"], alerts[-1]["id"]) if has_more else None,
+    }
+
+
+def _usage_window(since: Optional[str], until: Optional[str]) -> tuple:
+    today = datetime.now(timezone.utc).date()
+    until = until or today.isoformat()
+    since = since or (today - timedelta(days=29)).isoformat()
+    return since, until
+
+
+def _with_usage_ratios(row: dict) -> dict:
+    row["avgLatencyMs"] = round(row["latencyMs"] / row["calls"], 1) if row["calls"] else 0.0
+    row["costUsd"] = round(row.pop("costMicros") / 1_000_000, 6)
+    return row
+
+
+async def get_usage_by_feature(since: Optional[str], until: Optional[str]) -> dict:
+    since, until = _usage_window(since, until)
+    rows = await db_queries.get_usage_totals(["feature", "model"], since, until, sort_by="totalTokens")
+    return {"since": since, "until": until, "features": [_with_usage_ratios(row) for row in rows]}
+
+
+async def get_usage_for_user(user_id: str, since: Optional[str], until: Optional[str]) -> dict:
+    since, until = _usage_window(since, until)
+    rows = await db_queries.get_usage_totals(["feature", "model"], since, until, user_id=user_id, sort_by="totalTokens")
+    totals = {name: sum(row[name] for row in rows) for name in db_queries.USAGE_COUNTERS}
+    return {
+        "userId": user_id, "since": since, "until": until,
+        "totals": _with_usage_ratios(totals),
+        "features": [_with_usage_ratios(row) for row in rows],
+    }
+
+
+async def get_top_usage_users(since: Optional[str], until: Optional[str], limit: int,
+                              feature: Optional[str] = None, metric: str = "totalTokens") -> dict:
+    since, until = _usage_window(since, until)
+    rows = await db_queries.get_usage_totals(["userId"], since, until, feature=feature, sort_by=metric, limit=limit)
+    return {"since": since, "until": until, "feature": feature, "users": [_with_usage_ratios(row) for row in rows]}
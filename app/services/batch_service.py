@@ -0,0 +1,325 @@
+import asyncio
+import os
+import tempfile
+import uuid
+from datetime import datetime, timezone
+from typing import Dict, Optional
+import orjson
+from app.core.config import settings
+from app.ai import model_router
+from app.ai.openai_client import get_openai_client
+from app.db import queries as db_queries
+from app.models.feedback import OptimizationResponse
+from app.services.feedback_service import TipResponse, TIP_PROMPT_BUILDERS, build_report_prompt
+from app.utils import background
+from app.utils.usage_ledger import record_usage
+from loguru import logger
+
+REPORT_TYPES = ("expense", "budget", "debt")
+# Calculator state kind -> (stored tip key, tip prompt type), as served by /calculator/tips.
+CALCULATOR_TIPS = {
+    "savings": ("savingsTip", "savings"),
+    "loan": ("loanTip", "loan"),
+    "futureValue": ("futureValueTip", "inflation_future"),
+    "historical": ("historicalTip", "historical"),
+}
+
+_BATCH_ENDPOINT = "/v1/chat/completions"
+# The provider rejects input files over 200 MB.
+_MAX_FILE_BYTES = 190 * 1024 * 1024
+_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+_WRITE_CHUNK = 500
+
+_run_locks: Dict[str, asyncio.Lock] = {}
+_watchers: Dict[str, asyncio.Task] = {}
+
+
+def _new_counts() -> dict:
+    return {
+        "users": 0,
+        "usersFailed": 0,
+        "requests": 0,
+        "reportsSaved": 0,
+        "tipsSaved": 0,
+        "resultsFailed": 0,
+        "promptTokens": 0,
+        "completionTokens": 0,
+    }
+
+
+def _request_line(custom_id: str, task: str, messages: list, response_format) -> bytes:
+    line = {
+        "custom_id": custom_id,
+        "method": "POST",
+        "url": _BATCH_ENDPOINT,
+        "body": model_router.batch_request_body(task, messages, response_format),
+    }
+    return orjson.dumps(line, default=str) + b"\n"
+
+
+async def _user_request_lines(user_id: str, include_reports: bool, include_tips: bool) -> list:
+    financial_summary = await db_queries.get_user_financial_summary(user_id, skip_cache=True, time_frame='current_month')
+    lines = []
+    if include_reports:
+        for report_type in REPORT_TYPES:
+            prompt = build_report_prompt(report_type, financial_summary)
+            if prompt is not None:
+                lines.append(_request_line(f"report:{report_type}:{user_id}", f"{report_type}_report", prompt, OptimizationResponse))
+    if include_tips:
+        calculator_state = await db_queries.get_calculator_state(user_id)
+        for kind, (tip_key, tip_type) in CALCULATOR_TIPS.items():
+            if calculator_state[kind]:
+                prompt = TIP_PROMPT_BUILDERS[tip_type](user_id, calculator_state[kind], financial_summary)
+                lines.append(_request_line(f"tip:{tip_key}:{user_id}", "calculator_tip", prompt, TipResponse))
+    return lines
+
+
+async def _write_input_files(directory: str, include_reports: bool, include_tips: bool, limit: Optional[int], counts: dict) -> list:
+    files = []
+    handle = None
+
+    def rotate():
+        nonlocal handle
+        if handle is not None:
+            handle.close()
+        path = os.path.join(directory, f"input-{len(files)}.jsonl")
+        handle = open(path, "wb")
+        files.append({"path": path, "requests": 0, "bytes": 0})
+
+    async def flush(user_ids: list):
+        results = await asyncio.gather(
+            *(_user_request_lines(user_id, include_reports, include_tips) for user_id in user_ids),
+            return_exceptions=True
+        )
+        for user_id, lines in zip(user_ids, results):
+            if isinstance(lines, Exception):
+                counts["usersFailed"] += 1
+                logger.error(f"Skipping user {user_id} in batch run: {lines}")
+                continue
+            counts["users"] += 1
+            for line in lines:
+                current = files[-1] if files else None
+                if (current is None or current["requests"] >= settings.BATCH_MAX_REQUESTS_PER_FILE
+                        or current["bytes"] + len(line) > _MAX_FILE_BYTES):
+                    rotate()
+                    current = files[-1]
+                handle.write(line)
+                current["requests"] += 1
+                current["bytes"] += len(line)
+                counts["requests"] += 1
+
+    pending = []
+    try:
+        async for user_id in db_queries.get_active_user_ids_cursor():
+            pending.append(user_id)
+            if len(pending) >= settings.BATCH_USER_CONCURRENCY:
+                await flush(pending)
+                pending = []
+            if limit and counts["users"] + counts["usersFailed"] + len(pending) >= limit:
+                break
+        if pending:
+            await flush(pending)
+    finally:
+        if handle is not None:
+            handle.close()
+    return files
+
+
+async def _submit_file(run_id: str, part: int, input_file: dict) -> dict:
+    client = get_openai_client()
+    with open(input_file["path"], "rb") as fh:
+        uploaded = await client.files.create(file=fh, purpose="batch")
+    batch = await client.batches.create(
+        input_file_id=uploaded.id,
+        endpoint=_BATCH_ENDPOINT,
+        completion_window=settings.BATCH_COMPLETION_WINDOW,
+        metadata={"run_id": run_id, "part": str(part)},
+    )
+    logger.info(f"Batch run {run_id}: submitted part {part} as {batch.id} ({input_file['requests']} requests).")
+    return {
+        "batchId": batch.id,
+        "inputFileId": uploaded.id,
+        "requests": input_file["requests"],
+        "status": batch.status,
+        "ingested": False,
+    }
+
+
+async def _prepare_and_submit(run_id: str, include_reports: bool, include_tips: bool, limit: Optional[int]):
+    counts = _new_counts()
+    batches = []
+    try:
+        with tempfile.TemporaryDirectory(prefix=f"batch-{run_id}-") as directory:
+            input_files = await _write_input_files(directory, include_reports, include_tips, limit, counts)
+            for part, input_file in enumerate(input_files):
+                batches.append(await _submit_file(run_id, part, input_file))
+    except asyncio.CancelledError:
+        # Shutdown mid-preparation: parts already submitted are still polled, the rest is dropped.
+        await db_queries.update_batch_run(
+            run_id, {"status": "submitted" if batches else "interrupted", "interrupted": True, "batches": batches, "counts": counts}
+        )
+        raise
+    except Exception as e:
+        logger.exception(f"Batch run {run_id} failed before submission: {e}")
+        await db_queries.update_batch_run(
+            run_id, {"status": "submitted" if batches else "failed", "error": str(e), "batches": batches, "counts": counts}
+        )
+        if batches:
+            await _watch(run_id)
+        return
+
+    if not batches:
+        await db_queries.update_batch_run(run_id, {"status": "completed", "batches": [], "counts": counts})
+        return
+    await db_queries.update_batch_run(run_id, {"status": "submitted", "batches": batches, "counts": counts})
+    await _watch(run_id)
+
+
+def _parse_result(result: dict):
+    kind, name, user_id = result["custom_id"].split(":", 2)
+    response = result.get("response") or {}
+    if result.get("error") or response.get("status_code") != 200:
+        raise ValueError(f"request failed: {result.get('error') or response.get('status_code')}")
+
+    choice = response["body"]["choices"][0]
+    message = choice["message"]
+    if choice.get("finish_reason") == "length":
+        raise ValueError("output hit max_completion_tokens")
+    if message.get("refusal"):
+        raise ValueError("model refused")
+
+    if kind == "report":
+        value = OptimizationResponse.model_validate_json(message["content"]).model_dump()
+    else:
+        value = TipResponse.model_validate_json(message["content"]).tip
+    return kind, name, user_id, value, response["body"].get("usage") or {}
+
+
+def _record_result_usage(kind: str, name: str, user_id: str, usage: dict):
+    # Batch results are billed at the batch rate and have no per-call latency, so they get their own feature.
+    if kind == "report":
+        task, feature = f"{name}_report", f"{name}_report:batch"
+    else:
+        tip_type = next((t for key, t in CALCULATOR_TIPS.values() if key == name), name)
+        task, feature = "calculator_tip", f"calculator_tip:{tip_type}:batch"
+    record_usage(task, model_router.get_route(task)["model"], usage, user_id=user_id, feature=feature, batch=True)
+
+
+async def _save_results(reports: list, tips: dict, counts: dict):
+    counts["reportsSaved"] += len(reports)
+    counts["tipsSaved"] += sum(len(t) for t in tips.values())
+    await db_queries.save_optimization_reports_bulk(reports)
+    await db_queries.save_calculator_tips_bulk(tips, merge=True)
+
+
+async def _ingest_output(file_id: str, counts: dict):
+    reports, tips, buffered = [], {}, 0
+    async with get_openai_client().files.with_streaming_response.content(file_id) as response:
+        async for line in response.iter_lines():
+            if not line.strip():
+                continue
+            result = orjson.loads(line)
+            try:
+                kind, name, user_id, value, usage = _parse_result(result)
+            except Exception as e:
+                counts["resultsFailed"] += 1
+                logger.warning(f"Discarding batch result {result.get('custom_id')}: {e}")
+                continue
+
+            counts["promptTokens"] += usage.get("prompt_tokens") or 0
+            counts["completionTokens"] += usage.get("completion_tokens") or 0
+            _record_result_usage(kind, name, user_id, usage)
+            if kind == "report":
+                reports.append((user_id, name, value))
+            else:
+                tips.setdefault(user_id, {})[name] = value
+            buffered += 1
+            if buffered >= _WRITE_CHUNK:
+                await _save_results(reports, tips, counts)
+                reports, tips, buffered = [], {}, 0
+    await _save_results(reports, tips, counts)
+
+
+async def _count_errors(file_id: str) -> int:
+    errors = 0
+    async with get_openai_client().files.with_streaming_response.content(file_id) as response:
+        async for line in response.iter_lines():
+            if line.strip():
+                errors += 1
+    return errors
+
+
+async def poll_batch_run(run_id: str) -> Optional[dict]:
+    async with _run_locks.setdefault(run_id, asyncio.Lock()):
+        run = await db_queries.get_batch_run(run_id)
+        if not run or run["status"] != "submitted":
+            return run
+
+        client = get_openai_client()
+        counts = run["counts"]
+        for batch in run["batches"]:
+            if batch["ingested"]:
+                continue
+            remote = await client.batches.retrieve(batch["batchId"])
+            batch["status"] = remote.status
+            if remote.request_counts is not None:
+                batch["requestCounts"] = remote.request_counts.model_dump()
+            if remote.status not in _TERMINAL_STATUSES:
+                continue
+
+            if remote.output_file_id:
+                await _ingest_output(remote.output_file_id, counts)
+            if remote.error_file_id:
+                counts["resultsFailed"] += await _count_errors(remote.error_file_id)
+            batch["ingested"] = True
+            logger.info(f"Batch run {run_id}: ingested {batch['batchId']} ({remote.status}).")
+            # Saved per batch so a restart never ingests the same output twice.
+            await db_queries.update_batch_run(run_id, {"batches": run["batches"], "counts": counts})
+
+        fields = {"batches": run["batches"], "counts": counts}
+        if all(batch["ingested"] for batch in run["batches"]):
+            fields["status"] = "completed"
+            fields["completedAt"] = datetime.now(timezone.utc)
+            logger.info(
+                f"Batch run {run_id} completed: {counts['reportsSaved']} reports and {counts['tipsSaved']} tips saved, "
+                f"{counts['resultsFailed']} failed."
+            )
+        await db_queries.update_batch_run(run_id, fields)
+    return await db_queries.get_batch_run(run_id)
+
+
+async def _watch(run_id: str):
+    while True:
+        try:
+            run = await poll_batch_run(run_id)
+            if not run or run["status"] != "submitted":
+                return
+        except Exception as e:
+            logger.warning(f"Polling batch run {run_id} failed: {e}")
+        await asyncio.sleep(settings.BATCH_POLL_SECONDS)
+
+
+def watch_batch_run(run_id: str):
+    # Picks a run back up after a restart; the worker that submitted it watches it until then.
+    task = _watchers.get(run_id)
+    if task is None or task.done():
+        _watchers[run_id] = background.spawn(_watch(run_id), name=f"batch-watch-{run_id}", wait_on_shutdown=False)
+
+
+async def start_batch_run(include_reports: bool = True, include_tips: bool = True, limit: Optional[int] = None) -> dict:
+    run_id = f"{datetime.now(timezone.utc):%Y%m%d%H%M%S}-{uuid.uuid4().hex[:6]}"
+    await db_queries.create_batch_run({
+        "_id": run_id,
+        "status": "preparing",
+        "includeReports": include_reports,
+        "includeTips": include_tips,
+        "limit": limit,
+        "batches": [],
+        "counts": _new_counts(),
+    })
+    _watchers[run_id] = background.spawn(
+        _prepare_and_submit(run_id, include_reports, include_tips, limit), name=f"batch-run-{run_id}",
+        wait_on_shutdown=False,
+    )
+    logger.info(f"Started batch run {run_id} (reports: {include_reports}, tips: {include_tips}, limit: {limit}).")
+    return await db_queries.get_batch_run(run_id)
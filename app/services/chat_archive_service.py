@@ -0,0 +1,104 @@
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+from app.core.config import settings
+from app.db import queries as db_queries
+from loguru import logger
+
+HOT_COLLECTION = "chat_history"
+ARCHIVE_COLLECTION = "chat_history_archive"
+
+
+def _compact_message(document: dict) -> dict:
+    return {
+        "id": str(document["_id"]),
+        "role": document["role"],
+        "message": document["message"],
+        "timestamp": document["timestamp"],
+    }
+
+
+def _restore_timestamp(message: dict) -> dict:
+    # Bundles store timestamps as ISO strings; bring them back so old and new turns sort together.
+    if isinstance(message.get("timestamp"), str):
+        message["timestamp"] = datetime.fromisoformat(message["timestamp"])
+    return message
+
+
+async def _storage_snapshot() -> dict:
+    return {
+        "hot": await db_queries.get_collection_storage_stats(HOT_COLLECTION),
+        "archive": await db_queries.get_collection_storage_stats(ARCHIVE_COLLECTION),
+    }
+
+
+async def _archive_conversation(conversation_id: str, dry_run: bool) -> Optional[dict]:
+    documents = await db_queries.get_conversation_messages(conversation_id)
+    if not documents:
+        return None
+
+    messages = {m["id"]: _restore_timestamp(m) for m in await db_queries.get_archived_messages(conversation_id)}
+    # A conversation reopened after an earlier run is merged into its existing bundle; ids make a
+    # retry after a failed delete idempotent.
+    for document in documents:
+        messages[str(document["_id"])] = _compact_message(document)
+    ordered = sorted(messages.values(), key=lambda m: m["timestamp"])
+
+    raw_bytes = sum(len(d["message"]) for d in documents)
+    if dry_run:
+        return {"messages": len(documents), "raw_bytes": raw_bytes, "stored_bytes": 0}
+
+    bundle = await db_queries.save_archive_bundle(conversation_id, documents[0].get("userId"), ordered)
+    deleted = await db_queries.delete_chat_messages([d["_id"] for d in documents])
+    return {"messages": deleted, "raw_bytes": raw_bytes, "stored_bytes": bundle["storedBytes"]}
+
+
+async def archive_idle_conversations(
+    idle_days: Optional[int] = None,
+    batch_size: Optional[int] = None,
+    dry_run: bool = False,
+) -> dict:
+    idle_days = idle_days or settings.CHAT_ARCHIVE_IDLE_DAYS
+    batch_size = batch_size or settings.CHAT_ARCHIVE_BATCH_SIZE
+    started = time.perf_counter()
+    cutoff = datetime.now(timezone.utc) - timedelta(days=idle_days)
+
+    before = await _storage_snapshot()
+    conversation_ids = await db_queries.find_idle_conversation_ids(cutoff, batch_size)
+    logger.info(f"Archiving {len(conversation_ids)} conversations idle since {cutoff.date()} (dry run: {dry_run}).")
+
+    archived = failed = messages = raw_bytes = stored_bytes = 0
+    for conversation_id in conversation_ids:
+        try:
+            result = await _archive_conversation(conversation_id, dry_run)
+        except Exception as e:
+            failed += 1
+            logger.error(f"Failed to archive conversation {conversation_id}: {e}")
+            continue
+        if result:
+            archived += 1
+            messages += result["messages"]
+            raw_bytes += result["raw_bytes"]
+            stored_bytes += result["stored_bytes"]
+
+    after = await _storage_snapshot()
+    report = {
+        "dryRun": dry_run,
+        "idleDays": idle_days,
+        "cutoff": cutoff.isoformat(),
+        "conversationsArchived": archived,
+        "conversationsFailed": failed,
+        "messagesArchived": messages,
+        "messageBytes": raw_bytes,
+        "bundleBytes": stored_bytes,
+        "compressionRatio": round(raw_bytes / stored_bytes, 2) if stored_bytes else None,
+        "moreRemaining": len(conversation_ids) == batch_size,
+        "before": before,
+        "after": after,
+        "durationSeconds": round(time.perf_counter() - started, 3),
+    }
+    logger.info(
+        f"Chat archive run finished: {archived} conversations, {messages} messages. Hot working set "
+        f"{before['hot'].get('workingSetBytes', 0)} -> {after['hot'].get('workingSetBytes', 0)} bytes."
+    )
+    return report
@@ -0,0 +1,80 @@
+from typing import AsyncIterator, Optional
+from app.core.config import settings
+from app.db import queries as db_queries
+from app.utils.codec import dumps
+from app.utils.cursor import as_utc, encode_cursor, decode_cursor
+
+# Pages go backwards from the newest message; a cursor is the (timestamp, id) of the oldest message
+# already returned. Turns compacted by the archive job are older than every live one, so both
+# pagination and export read the live collection and the archive bundle as one ordered sequence.
+
+
+def _message(message_id: str, role: str, content: str, timestamp) -> dict:
+    return {
+        "id": message_id,
+        "role": "assistant" if role == "bot" else role,
+        "content": content,
+        "timestamp": as_utc(timestamp),
+    }
+
+
+def _from_document(document: dict) -> dict:
+    return _message(str(document["_id"]), document["role"], document["message"], document["timestamp"])
+
+
+def _from_archive(message: dict) -> dict:
+    return _message(message["id"], message["role"], message["message"], message["timestamp"])
+
+
+def _key(message: dict) -> tuple:
+    return message["timestamp"], message["id"]
+
+
+async def _archived(conversation_id: str, user_id: Optional[str]) -> list:
+    messages = await db_queries.get_archived_messages_for_user(conversation_id, user_id)
+    return sorted((_from_archive(m) for m in messages), key=_key)
+
+
+async def get_history_page(conversation_id: str, user_id: Optional[str], limit: int, cursor: Optional[str] = None) -> dict:
+    before = decode_cursor(cursor) if cursor else None
+    # One extra row tells whether another page exists without a count query.
+    documents = await db_queries.get_conversation_messages_before(conversation_id, user_id, before, limit + 1)
+    messages = [_from_document(d) for d in documents]
+
+    if len(messages) <= limit:
+        boundary = _key(messages[-1]) if messages else before
+        older = [m for m in await _archived(conversation_id, user_id) if boundary is None or _key(m) < boundary]
+        messages += older[::-1][:limit + 1 - len(messages)]
+
+    has_more = len(messages) > limit
+    messages = messages[:limit]
+    return {
+        "messages": messages[::-1],
+        "nextCursor": encode_cursor(*_key(messages[-1])) if has_more else None,
+    }
+
+
+def _ndjson(message: dict) -> bytes:
+    return dumps(message) + b"\n"
+
+
+async def export_conversation(conversation_id: str, user_id: Optional[str]) -> AsyncIterator[bytes]:
+    # Oldest first. Live messages are read through a cursor with a fixed batch size and written out
+    # one batch at a time, so memory does not grow with the length of the conversation.
+    batch_size = settings.CHAT_EXPORT_BATCH_SIZE
+    last = None
+    archived = await _archived(conversation_id, user_id)
+    for start in range(0, len(archived), batch_size):
+        yield b"".join(_ndjson(m) for m in archived[start:start + batch_size])
+    if archived:
+        last = _key(archived[-1])
+    del archived
+
+    chunk = []
+    async for document in db_queries.iter_conversation_messages(conversation_id, user_id, last, batch_size):
+        chunk.append(_ndjson(_from_document(document)))
+        if len(chunk) >= batch_size:
+            yield b"".join(chunk)
+            chunk = []
+    if chunk:
+        yield b"".join(chunk)
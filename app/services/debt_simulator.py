@@ -0,0 +1,249 @@
+from datetime import date
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from app.utils.financial_snapshot import FinancialSnapshot
+
+STRATEGIES = ("avalanche", "snowball", "custom")
+
+MAX_SIMULATION_MONTHS = 600
+DEFAULT_EXTRA_SHARES = (0.0, 0.25, 0.5, 1.0)
+REPORT_EXTRA_SHARE = 0.5
+
+_PAID_OFF_EPSILON = 0.005
+
+
+def _add_months(start: date, months: int) -> date:
+    month_index = start.month - 1 + months
+    return date(start.year + month_index // 12, month_index % 12 + 1, 1)
+
+
+def _format_month(start: date, months: Optional[int]) -> Optional[str]:
+    if months is None:
+        return None
+    return _add_months(start, months).strftime("%B %Y")
+
+
+def _debt_arrays(debts: List[Dict]):
+    balances = np.array([float(d.get("amount") or 0) for d in debts], dtype=np.float64)
+    annual_rates = np.array(
+        [float(d.get("annualRate", d.get("interestRate")) or 0) for d in debts], dtype=np.float64
+    )
+    minimums = np.array([float(d.get("monthlyPayment") or 0) for d in debts], dtype=np.float64)
+    return np.maximum(balances, 0.0), np.maximum(annual_rates, 0.0), np.maximum(minimums, 0.0)
+
+
+def _priority_order(strategy: str, balances: np.ndarray, annual_rates: np.ndarray, weights: np.ndarray) -> np.ndarray:
+    # np.lexsort sorts by the last key first, so the tie-breaker comes first.
+    if strategy == "avalanche":
+        return np.lexsort((balances, -annual_rates))
+    if strategy == "snowball":
+        return np.lexsort((-annual_rates, balances))
+    return np.lexsort((-annual_rates, -weights))
+
+
+def simulate_payoff(
+    balances: np.ndarray,
+    annual_rates: np.ndarray,
+    minimums: np.ndarray,
+    extra_payments: np.ndarray,
+    orders: np.ndarray,
+    weights: np.ndarray,
+    rollover: np.ndarray,
+    max_months: int = MAX_SIMULATION_MONTHS,
+) -> Dict[str, np.ndarray]:
+    # Runs R scenarios over N debts in lock-step. Each row pays every minimum, splits the
+    # rest of its budget by `weights`, then pours what is left down `orders`. Everything is
+    # permuted into each row's priority order up front so the monthly loop never re-sorts.
+    rows = extra_payments.shape[0]
+    row_index = np.arange(rows)[:, None]
+    bal = balances[orders]
+    monthly_rates = (annual_rates / 1200.0)[orders]
+    mins = minimums[orders]
+    weights = np.take_along_axis(weights, orders, axis=1)
+    monthly_budget = np.where(rollover, minimums.sum() + extra_payments, 0.0)
+
+    total_interest = np.zeros(rows)
+    payoff_month = np.full(bal.shape, -1, dtype=np.int64)
+    payoff_month[bal <= _PAID_OFF_EPSILON] = 0
+    bal[bal <= _PAID_OFF_EPSILON] = 0.0
+
+    # Rows that are fully paid off are dropped from the working set once a year.
+    live = np.arange(rows)
+    for month in range(1, max_months + 1):
+        interest = bal * monthly_rates
+        total_interest[live] += interest.sum(axis=1)
+        bal += interest
+
+        paid = np.minimum(mins, bal)
+        bal -= paid
+        budget = np.maximum(monthly_budget - paid.sum(axis=1), 0.0)
+
+        active_weights = np.where(bal > 0, weights, 0.0)
+        weight_sum = active_weights.sum(axis=1, keepdims=True)
+        share = np.divide(active_weights * budget[:, None], weight_sum, out=np.zeros_like(bal), where=weight_sum > 0)
+        np.minimum(share, bal, out=share)
+        bal -= share
+        budget -= share.sum(axis=1)
+
+        owed_before = np.cumsum(bal, axis=1) - bal
+        bal -= np.clip(budget[:, None] - owed_before, 0.0, bal)
+
+        bal[bal <= _PAID_OFF_EPSILON] = 0.0
+        newly_paid = (bal == 0.0) & (payoff_month[live] < 0)
+        if newly_paid.any():
+            row_pos, debt_pos = np.nonzero(newly_paid)
+            payoff_month[live[row_pos], debt_pos] = month
+
+        if month % 12 == 0:
+            still_owing = bal.any(axis=1)
+            if not still_owing.any():
+                break
+            if not still_owing.all():
+                live = live[still_owing]
+                bal, monthly_rates, mins, weights = (
+                    bal[still_owing], monthly_rates[still_owing], mins[still_owing], weights[still_owing]
+                )
+                monthly_budget = monthly_budget[still_owing]
+        elif not bal.any():
+            break
+
+    months_to_freedom = np.where((payoff_month >= 0).all(axis=1), payoff_month.max(axis=1, initial=0), -1)
+    unordered_payoff_month = np.empty_like(payoff_month)
+    unordered_payoff_month[row_index, orders] = payoff_month
+    return {
+        "months_to_freedom": months_to_freedom,
+        "total_interest": total_interest,
+        "payoff_month": unordered_payoff_month,
+    }
+
+
+def build_payoff_plan(
+    debts: List[Dict],
+    extra_payments: Sequence[float],
+    custom_allocation: Optional[Dict[str, float]] = None,
+    start: Optional[date] = None,
+    max_months: int = MAX_SIMULATION_MONTHS,
+) -> Dict:
+    start = start or date.today()
+    balances, annual_rates, minimums = _debt_arrays(debts)
+    n_debts = balances.shape[0]
+    extras = np.maximum(np.asarray(list(extra_payments), dtype=np.float64), 0.0)
+    n_levels = extras.shape[0]
+
+    custom_weights = np.zeros(n_debts)
+    if custom_allocation:
+        custom_weights = np.array(
+            [max(float(custom_allocation.get(d.get("name"), 0) or 0), 0.0) for d in debts], dtype=np.float64
+        )
+    strategies = [s for s in STRATEGIES if s != "custom" or custom_weights.any()]
+
+    # Row 0 is the minimum-payments-only baseline, then one block of rows per strategy.
+    no_weights = np.zeros(n_debts)
+    orders = [_priority_order("avalanche", balances, annual_rates, no_weights)]
+    weights = [no_weights]
+    row_extras = [0.0]
+    rollover = [False]
+    for strategy in strategies:
+        strategy_weights = custom_weights if strategy == "custom" else no_weights
+        order = _priority_order(strategy, balances, annual_rates, strategy_weights)
+        for extra in extras:
+            orders.append(order)
+            weights.append(strategy_weights)
+            row_extras.append(extra)
+            rollover.append(True)
+
+    result = simulate_payoff(
+        balances, annual_rates, minimums,
+        np.array(row_extras), np.vstack(orders), np.vstack(weights), np.array(rollover),
+        max_months=max_months,
+    )
+
+    month_labels: Dict[Optional[int], Optional[str]] = {}
+
+    def _month_label(months: Optional[int]) -> Optional[str]:
+        if months not in month_labels:
+            month_labels[months] = _format_month(start, months)
+        return month_labels[months]
+
+    def _row_summary(row: int, baseline_interest: Optional[float]) -> Dict:
+        months = int(result["months_to_freedom"][row])
+        months = months if months >= 0 else None
+        interest = round(float(result["total_interest"][row]), 2)
+        payoff_order = []
+        target = None
+        for idx in orders[row]:
+            if balances[idx] <= 0:
+                continue
+            if target is None:
+                target = {"name": debts[idx].get("name") or "Debt", "amount": round(float(balances[idx]), 2)}
+            month = int(result["payoff_month"][row, idx])
+            month = month if month >= 0 else None
+            payoff_order.append({
+                "name": debts[idx].get("name") or "Debt",
+                "months": month,
+                "payoffDate": _month_label(month),
+            })
+        payoff_order.sort(key=lambda p: p["months"] if p["months"] is not None else max_months + 1)
+        return {
+            "extraPayment": round(float(row_extras[row]), 2),
+            "monthsToFreedom": months,
+            "debtFreeDate": _month_label(months),
+            "totalInterest": interest,
+            "interestSaved": round(baseline_interest - interest, 2) if baseline_interest is not None else None,
+            "target": target,
+            "payoffOrder": payoff_order,
+        }
+
+    baseline = _row_summary(0, None)
+    baseline_interest = baseline["totalInterest"] if baseline["monthsToFreedom"] is not None else None
+
+    projections = {}
+    for s_idx, strategy in enumerate(strategies):
+        first_row = 1 + s_idx * n_levels
+        projections[strategy] = [_row_summary(first_row + level, baseline_interest) for level in range(n_levels)]
+
+    return {
+        "debtCount": int((balances > 0).sum()),
+        "monthlyMinimums": round(float(minimums.sum()), 2),
+        "baseline": baseline,
+        "strategies": projections,
+    }
+
+
+def build_payoff_plan_for_summary(
+    financial_summary: dict,
+    extra_shares: Sequence[float] = DEFAULT_EXTRA_SHARES,
+    custom_allocation: Optional[Dict[str, float]] = None,
+    snapshot: Optional[FinancialSnapshot] = None,
+) -> Dict:
+    disposable_income = float((snapshot or FinancialSnapshot.of(financial_summary)).disposable_income)
+
+    plan = build_payoff_plan(
+        financial_summary.get("debts", []),
+        [disposable_income * share for share in extra_shares],
+        custom_allocation=custom_allocation,
+    )
+    plan["disposableIncome"] = round(disposable_income, 2)
+    plan["extraShares"] = list(extra_shares)
+    plan["reportProjections"] = {
+        strategy: projection_at_share(plan, strategy, REPORT_EXTRA_SHARE) for strategy in plan["strategies"]
+    }
+    return plan
+
+
+def projection_at_share(plan: Dict, strategy: str, share: float) -> Optional[Dict]:
+    projections = plan.get("strategies", {}).get(strategy)
+    shares = plan.get("extraShares", [])
+    if not projections or share not in shares:
+        return None
+    return projections[shares.index(share)]
+
+
+def recommended_strategy(plan: Dict, share: float = REPORT_EXTRA_SHARE) -> Optional[str]:
+    candidates = []
+    for strategy in plan.get("strategies", {}):
+        projection = projection_at_share(plan, strategy, share)
+        if projection and projection["monthsToFreedom"] is not None:
+            candidates.append((projection["totalInterest"], projection["monthsToFreedom"], strategy))
+    return min(candidates)[2] if candidates else None
@@ -2,16 +2,27 @@ import json
 import asyncio
 from app.db import queries as db_queries
 from app.ai import prompt_builder
+from app.ai import model_router
+from app.services import debt_simulator
 from app.models.feedback import OptimizationResponse, OptimizationInsight
+from app.models.debt import DebtPayoffRequest, DebtPayoffPlan
 from pydantic import BaseModel
-from openai import AsyncOpenAI
-from app.core.config import settings
 from loguru import logger
 from app.utils.retry import retry_openai
 from app.utils.metrics import track_openai_metrics
-from typing import Optional
+from app.utils.usage_ledger import attribute_usage
+from app.utils.financial_snapshot import FinancialSnapshot, without_snapshot
+from app.utils import background, user_events
+from typing import Dict, Optional, Set, Tuple
 
-aclient = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+
+TIP_ERROR_MESSAGE = "An error occurred while generating your tip. Please try again later."
+TIP_PENDING_MESSAGE = "Your personalised tip is still being prepared. Check back in a moment."
+
+# One generation per (user, tip) at a time; a poll that arrives mid-generation waits on the same task.
+_tip_generations: Dict[tuple, asyncio.Task] = {}
+# Tips whose request already answered with a placeholder; they are pushed to the user when ready.
+_late_tips: Set[tuple] = set()
 
 
 class TipResponse(BaseModel):
@@ -35,28 +46,17 @@ def _fallback_response(message: str) -> OptimizationResponse:
 
 @retry_openai(max_retries=3)
 @track_openai_metrics()
-async def _get_report_from_ai_and_save(
-    user_id: str,
-    report_type: str,
-    prompt_builder_func,
-    analysis_data: dict = None
-) -> bool:
+async def _get_report_from_ai_and_save(user_id: str, report_type: str) -> bool:
     try:
-        if report_type == 'budget' and analysis_data:
-            optimization_prompt = prompt_builder_func(analysis_data)
-        else:
-            financial_summary = await db_queries.get_user_financial_summary(user_id, skip_cache=True, time_frame='current_month')
-            if report_type == 'expense' and not financial_summary.get("expenses"):
-                return False
-            if report_type == 'debt' and not financial_summary.get("debts"):
-                return False
-            optimization_prompt = prompt_builder_func(financial_summary)
-
-        response = await aclient.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=optimization_prompt,
-            response_format=OptimizationResponse
-        )
+        financial_summary = await db_queries.get_user_financial_summary(user_id, skip_cache=True, time_frame='current_month')
+        optimization_prompt = build_report_prompt(report_type, financial_summary)
+        if optimization_prompt is None:
+            return False
+
+        with attribute_usage(user_id=user_id):
+            response = await model_router.parse_completion(
+                f"{report_type}_report", optimization_prompt, OptimizationResponse
+            )
 
         report = response.choices[0].message.parsed.model_dump()
         await db_queries.save_optimization_report(user_id, report_type, report)
@@ -69,81 +69,61 @@ async def _get_report_from_ai_and_save(
         return False
 
 
-def _calculate_weighted_savings_progress(saving_goals: list) -> float:
-    if not saving_goals:
-        return 0.0
-    
-    total_goal_amount = sum(float(sg.get("totalAmount") or 0) for sg in saving_goals)
-    if total_goal_amount == 0:
-        return 0.0
-        
-    weighted_sum = sum(
-        float(sg.get("completionRatio") or 0) * float(sg.get("totalAmount") or 0)
-        for sg in saving_goals
-    )
-    return weighted_sum / total_goal_amount
-
 def _map_to_50_30_20(financial_summary: dict) -> dict:
-    total_income = sum(float(i.get("amount") or 0) for i in financial_summary.get("incomes", []))
-    total_expenses = sum(float(e.get("amount") or 0) for e in financial_summary.get("expenses", []))
-
-    actual_essential = 0.0
-    actual_discretionary = 0.0
-    actual_savings = 0.0
-
-    # Primary source: Use BUDGETS with category field for accurate classification
-    for item in financial_summary.get("budgets", []):
-        amount = float(item.get('amount') or 0)
-        category = str(item.get('category', '')).strip().lower()
-
-        if 'essential' in category or 'needs' in category:
-            actual_essential += amount
-        elif 'discretionary' in category or 'wants' in category:
-            actual_discretionary += amount
-        elif 'saving' in category:
-            actual_savings += amount
-
-    # Fallback: If no budgets, use expenses with budgetCategory field
-    if not financial_summary.get("budgets"):
-        for item in financial_summary.get("expenses", []):
-            amount = float(item.get('amount') or 0)
-            category_type = str(item.get('budgetCategory', '')).strip().lower()
-
-            if 'essential' in category_type or category_type == 'needs':
-                actual_essential += amount
-            elif 'discretionary' in category_type or category_type == 'wants':
-                actual_discretionary += amount
-            elif 'saving' in category_type:
-                actual_savings += amount
-            else:
-                name = item.get('name', '').lower()
-                if any(keyword in name for keyword in ['rent', 'mortgage', 'utility', 'bill', 'grocery', 'insurance', 'loan', 'debt', 'payment']):
-                    actual_essential += amount
-                elif any(keyword in name for keyword in ['netflix', 'spotify', 'dining', 'entertainment', 'shopping', 'hobby', 'travel']):
-                    actual_discretionary += amount
-                else:
-                    actual_discretionary += amount
-
-    for item in financial_summary.get("debts", []):
-        monthly = float(item.get('monthlyPayment') or 0)
-        actual_essential += monthly
+    snapshot = FinancialSnapshot.of(financial_summary)
+    return {
+        "total_income": snapshot.total_income,
+        "total_expenses": snapshot.total_expenses,
+        "disposable_income": snapshot.net_income,
+        "actual_essential": snapshot.actual_essential,
+        "actual_discretionary": snapshot.actual_discretionary,
+        "actual_savings": snapshot.actual_savings,
+        "overall_savings_progress": snapshot.savings_progress
+    }
 
-    actual_savings += sum(float(s.get('monthlyTarget') or 0) for s in financial_summary.get('saving_goals', []))
+def _build_budget_analysis_data(financial_summary: dict) -> dict:
+    analysis_map = _map_to_50_30_20(financial_summary)
 
-    disposable_income = total_income - total_expenses
-    
-    savings_progress = _calculate_weighted_savings_progress(financial_summary.get("saving_goals", []))
+    total_income = analysis_map["total_income"]
+    if total_income > 0:
+        analysis_map["percent_essential"] = (analysis_map["actual_essential"] / total_income) * 100
+        analysis_map["percent_discretionary"] = (analysis_map["actual_discretionary"] / total_income) * 100
+        analysis_map["percent_savings"] = (analysis_map["actual_savings"] / total_income) * 100
+    else:
+        analysis_map["percent_essential"] = 0
+        analysis_map["percent_discretionary"] = 0
+        analysis_map["percent_savings"] = 0
 
     return {
-        "total_income": total_income,
-        "total_expenses": total_expenses,
-        "disposable_income": disposable_income,
-        "actual_essential": actual_essential,
-        "actual_discretionary": actual_discretionary,
-        "actual_savings": actual_savings,
-        "overall_savings_progress": savings_progress
+        "name": financial_summary.get('name', 'there'),
+        "financial_summary": without_snapshot(financial_summary),
+        **analysis_map
     }
 
+
+def build_report_prompt(report_type: str, financial_summary: dict) -> Optional[list]:
+    # None when the user has nothing for this report to analyse.
+    if report_type == 'budget':
+        return prompt_builder.build_budget_optimization_prompt(_build_budget_analysis_data(financial_summary))
+    if report_type == 'expense':
+        if not financial_summary.get("expenses"):
+            return None
+        return prompt_builder.build_expense_optimization_prompt(financial_summary)
+    if report_type == 'debt':
+        if not financial_summary.get("debts"):
+            return None
+        payoff_plan = debt_simulator.build_payoff_plan_for_summary(financial_summary)
+        return prompt_builder.build_debt_optimization_prompt(financial_summary, payoff_plan)
+    raise ValueError(f"Unknown report type '{report_type}'")
+
+
+TIP_PROMPT_BUILDERS = {
+    'historical': prompt_builder.build_historical_tip_prompt,
+    'inflation_future': prompt_builder.build_inflation_tip_prompt,
+    'savings': prompt_builder.build_savings_tip_prompt,
+    'loan': prompt_builder.build_loan_tip_prompt,
+}
+
 @retry_openai(max_retries=3)
 @track_openai_metrics()
 async def _get_single_calculator_tip(
@@ -169,35 +149,71 @@ async def _get_single_calculator_tip(
 
             prompt = builder_func(user_id, mock_data, financial_summary)
 
-        response = await aclient.beta.chat.completions.parse(
-            model="gpt-4o",
-            messages=prompt,
-            response_format=TipResponse
-        )
+        with attribute_usage(user_id=user_id, feature=f"calculator_tip:{mock_data_type}"):
+            response = await model_router.parse_completion("calculator_tip", prompt, TipResponse)
         tip_data = response.choices[0].message.parsed.model_dump()
         return tip_data.get("tip", "Could not generate a specialised tip for this calculator.")
 
     except Exception as e:
         logger.exception(f"AI Failed to generate {mock_data_type} tip for user {user_id}: {e}")
-        return "An error occurred while generating your tip. Please try again later."
+        return TIP_ERROR_MESSAGE
 
 
 async def generate_instant_tip_from_db(user_id: str, tip_type: str, db_data: dict) -> str:
-    if tip_type == 'historical':
-        return await _get_single_calculator_tip(user_id, prompt_builder.build_historical_tip_prompt, 'historical', custom_data=db_data)
-    elif tip_type == 'inflation_future':
-        return await _get_single_calculator_tip(user_id, prompt_builder.build_inflation_tip_prompt, 'inflation_future', custom_data=db_data)
-    elif tip_type == 'savings':
-        return await _get_single_calculator_tip(user_id, prompt_builder.build_savings_tip_prompt, 'savings', custom_data=db_data)
-    elif tip_type == 'loan':
-        return await _get_single_calculator_tip(user_id, prompt_builder.build_loan_tip_prompt, 'loan', custom_data=db_data)
+    builder_func = TIP_PROMPT_BUILDERS.get(tip_type)
+    if builder_func is not None:
+        return await _get_single_calculator_tip(user_id, builder_func, tip_type, custom_data=db_data)
 
     logger.warning(f"generate_instant_tip_from_db called with unsupported tip_type='{tip_type}' for user {user_id}")
     return "Tip type not supported."
 
+async def _generate_and_store_tip(user_id: str, tip_key: str, tip_type: str, db_data: dict) -> str:
+    tip = await generate_instant_tip_from_db(user_id, tip_type, db_data)
+    if tip != TIP_ERROR_MESSAGE:
+        await db_queries.save_calculator_tips(user_id, {tip_key: tip}, merge=True)
+    if (user_id, tip_key) in _late_tips:
+        _late_tips.discard((user_id, tip_key))
+        await user_events.publish(user_id, {"type": "calculator_tip", "data": {"key": tip_key, "tip": tip}})
+    return tip
+
+
+def _start_tip_generation(user_id: str, tip_key: str, tip_type: str, db_data: dict) -> asyncio.Task:
+    key = (user_id, tip_key)
+    task = _tip_generations.get(key)
+    if task is None:
+        task = background.spawn(_generate_and_store_tip(user_id, tip_key, tip_type, db_data), name=f"tip-{tip_key}-{user_id}")
+        _tip_generations[key] = task
+        task.add_done_callback(lambda _: _tip_generations.pop(key, None))
+    return task
+
+
+async def generate_tips_within_budget(user_id: str, tip_requests: Dict[str, tuple], timeout: float) -> Tuple[dict, list]:
+    # Late generations are not cancelled: they finish in the background, are saved for the next
+    # poll and pushed to any open chat socket of the user.
+    tasks = {
+        tip_key: _start_tip_generation(user_id, tip_key, tip_type, db_data)
+        for tip_key, (tip_type, db_data) in tip_requests.items()
+    }
+    if tasks and timeout > 0:
+        await asyncio.wait(tasks.values(), timeout=timeout)
+
+    ready, pending = {}, []
+    for tip_key, task in tasks.items():
+        if not task.done():
+            _late_tips.add((user_id, tip_key))
+            pending.append(tip_key)
+        elif task.cancelled() or task.exception() is not None:
+            ready[tip_key] = TIP_ERROR_MESSAGE
+        else:
+            ready[tip_key] = task.result()
+    if pending:
+        logger.info(f"Calculator tips for {user_id} missed the {timeout:.1f}s budget: {', '.join(pending)}")
+    return ready, pending
+
+
 async def get_expense_optimization_feedback(user_id: str) -> OptimizationResponse:
     logger.info(f"Generating fresh expense optimization report for {user_id}.")
-    success = await _get_report_from_ai_and_save(user_id, 'expense', prompt_builder.build_expense_optimization_prompt)
+    success = await _get_report_from_ai_and_save(user_id, 'expense')
 
     if success:
         report = await db_queries.get_latest_optimization_report(user_id, "expense")
@@ -210,30 +226,7 @@ async def get_expense_optimization_feedback(user_id: str) -> OptimizationRespons
 async def get_budget_optimization_feedback(user_id: str) -> OptimizationResponse:
     logger.info(f"Generating fresh budget optimization report for {user_id}.")
     try:
-        financial_summary = await db_queries.get_user_financial_summary(user_id, skip_cache=True, time_frame='current_month')
-        analysis_map = _map_to_50_30_20(financial_summary)
-
-        total_income = analysis_map["total_income"]
-        if total_income > 0:
-            analysis_map["percent_essential"] = (analysis_map["actual_essential"] / total_income) * 100
-            analysis_map["percent_discretionary"] = (analysis_map["actual_discretionary"] / total_income) * 100
-            analysis_map["percent_savings"] = (analysis_map["actual_savings"] / total_income) * 100
-        else:
-            analysis_map["percent_essential"] = 0
-            analysis_map["percent_discretionary"] = 0
-            analysis_map["percent_savings"] = 0
-
-        budget_analysis_data = {
-            "name": financial_summary.get('name', 'there'),
-            "financial_summary": financial_summary,
-            **analysis_map
-        }
-
-        success = await _get_report_from_ai_and_save(
-            user_id, 'budget',
-            prompt_builder.build_budget_optimization_prompt,
-            analysis_data=budget_analysis_data
-        )
+        success = await _get_report_from_ai_and_save(user_id, 'budget')
 
         if success:
             report = await db_queries.get_latest_optimization_report(user_id, "budget")
@@ -248,11 +241,20 @@ async def get_budget_optimization_feedback(user_id: str) -> OptimizationResponse
 
 async def get_debt_optimization_feedback(user_id: str) -> OptimizationResponse:
     logger.info(f"Generating fresh debt optimization report for {user_id}.")
-    success = await _get_report_from_ai_and_save(user_id, 'debt', prompt_builder.build_debt_optimization_prompt)
+    success = await _get_report_from_ai_and_save(user_id, 'debt')
 
     if success:
         report = await db_queries.get_latest_optimization_report(user_id, "debt")
         if report:
             return _dict_to_optimization_response(report)
 
-    return _fallback_response("Report could not be generated. Please ensure you have added debts.")
\ No newline at end of file
+    return _fallback_response("Report could not be generated. Please ensure you have added debts.")
+
+async def get_debt_payoff_plan(user_id: str, request: DebtPayoffRequest) -> DebtPayoffPlan:
+    financial_summary = await db_queries.get_user_financial_summary(user_id)
+    plan = debt_simulator.build_payoff_plan(
+        financial_summary.get("debts", []),
+        request.extra_payments,
+        custom_allocation=request.custom_allocation,
+    )
+    return DebtPayoffPlan(**plan)
@@ -0,0 +1,62 @@
+from typing import Dict, Optional
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.utils.loop_monitor import current_loop_lag_ms
+from app.utils.metrics import llm_calls_in_flight, register_metrics_source
+from app.utils.presence import local_connection_count
+from loguru import logger
+
+SHED_COUNTS: Dict[str, int] = {}
+
+
+def overload_reason() -> Optional[str]:
+    lag_ms = current_loop_lag_ms()
+    if settings.SHED_LOOP_LAG_MS > 0 and lag_ms >= settings.SHED_LOOP_LAG_MS:
+        return f"event loop lag {lag_ms:.0f}ms"
+    in_flight = llm_calls_in_flight()
+    if settings.SHED_MAX_LLM_IN_FLIGHT > 0 and in_flight >= settings.SHED_MAX_LLM_IN_FLIGHT:
+        return f"{in_flight} LLM calls in flight"
+    return None
+
+
+def websocket_rejection() -> Optional[str]:
+    if settings.WS_MAX_CONNECTIONS_PER_WORKER > 0 and local_connection_count() >= settings.WS_MAX_CONNECTIONS_PER_WORKER:
+        return f"worker holds {local_connection_count()} connections"
+    return overload_reason()
+
+
+def record_shed(kind: str, reason: str):
+    SHED_COUNTS[kind] = SHED_COUNTS.get(kind, 0) + 1
+    logger.warning(f"Shedding {kind} work: {reason}. Total shed: {sum(SHED_COUNTS.values())}")
+
+
+def busy_frame() -> dict:
+    retry_after = settings.SHED_RETRY_AFTER_SECONDS
+    return {
+        "type": "busy",
+        "data": f"The assistant is busy right now, please retry in {retry_after} s.",
+        "retry_after": retry_after,
+    }
+
+
+async def require_capacity():
+    reason = overload_reason()
+    if reason:
+        record_shed("http", reason)
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="The service is busy, please retry shortly.",
+            headers={"Retry-After": str(settings.SHED_RETRY_AFTER_SECONDS)},
+        )
+
+
+def get_admission_metrics() -> dict:
+    return {
+        "loop_lag_ms": round(current_loop_lag_ms(), 3),
+        "llm_calls_in_flight": llm_calls_in_flight(),
+        "overloaded": overload_reason() is not None,
+        "shed": dict(SHED_COUNTS),
+    }
+
+
+register_metrics_source("admission", get_admission_metrics)
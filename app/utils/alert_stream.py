@@ -0,0 +1,129 @@
+import asyncio
+from typing import AsyncIterator, Optional, Set
+import orjson
+from app.core.config import settings
+from app.db.client import redis_client
+from app.utils.metrics import register_metrics_source
+from loguru import logger
+
+# Every saved alert is appended to one capped Redis stream. Each worker tails it once and fans new
+# entries out to its connected consoles; stream ids double as SSE event ids, so a console that
+# reconnects with Last-Event-ID replays what it missed while the entries are still in the stream.
+STREAM_KEY = "admin_alerts:stream"
+_RESYNC = object()
+
+_subscribers: Set[asyncio.Queue] = set()
+_tail_task: Optional[asyncio.Task] = None
+_stats = {"appended": 0, "append_errors": 0, "delivered": 0, "overflows": 0, "read_errors": 0}
+
+
+def is_entry_id(value: str) -> bool:
+    ms, _, seq = value.partition("-")
+    return ms.isdigit() and seq.isdigit()
+
+
+def _id_key(entry_id: str) -> tuple:
+    ms, _, seq = entry_id.partition("-")
+    return int(ms), int(seq)
+
+
+async def append(alert: dict):
+    try:
+        await redis_client.xadd(
+            STREAM_KEY, {"alert": orjson.dumps(alert).decode()},
+            maxlen=settings.ADMIN_ALERT_STREAM_MAXLEN, approximate=True,
+        )
+        _stats["appended"] += 1
+    except Exception as e:
+        # The alert is already in Mongo; consoles will still see it in the feed.
+        _stats["append_errors"] += 1
+        logger.warning(f"Failed to append alert to {STREAM_KEY}: {e}")
+
+
+async def _replay(last_id: str) -> list:
+    entries = await redis_client.xrange(STREAM_KEY, min=f"({last_id}", count=settings.ADMIN_ALERT_REPLAY_MAX)
+    return [(entry_id, orjson.loads(fields["alert"])) for entry_id, fields in entries]
+
+
+def _fan_out(item: tuple):
+    for queue in list(_subscribers):
+        try:
+            queue.put_nowait(item)
+            _stats["delivered"] += 1
+        except asyncio.QueueFull:
+            # A console that can't keep up is cut off and resumes from the stream with Last-Event-ID.
+            _stats["overflows"] += 1
+            _subscribers.discard(queue)
+            while not queue.empty():
+                queue.get_nowait()
+            queue.put_nowait(_RESYNC)
+
+
+async def _tail():
+    last_id = None
+    while _subscribers:
+        try:
+            if last_id is None:
+                latest = await redis_client.xrevrange(STREAM_KEY, count=1)
+                last_id = latest[0][0] if latest else "0-0"
+            response = await redis_client.xread({STREAM_KEY: last_id}, block=1000, count=100)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _stats["read_errors"] += 1
+            logger.warning(f"Reading {STREAM_KEY} failed: {e}. Retrying in 2s.")
+            await asyncio.sleep(2)
+            continue
+        for _, entries in response or []:
+            for entry_id, fields in entries:
+                last_id = entry_id
+                _fan_out((entry_id, orjson.loads(fields["alert"])))
+
+
+def _ensure_tail():
+    global _tail_task
+    if _tail_task is None or _tail_task.done():
+        _tail_task = asyncio.create_task(_tail())
+
+
+async def follow(last_id: Optional[str], keepalive_seconds: float) -> AsyncIterator[Optional[tuple]]:
+    # Yields (entry_id, alert) pairs, or None after keepalive_seconds without one.
+    queue = asyncio.Queue(maxsize=settings.ADMIN_ALERT_SUBSCRIBER_BUFFER)
+    _subscribers.add(queue)
+    _ensure_tail()
+    try:
+        replayed = None
+        if last_id:
+            for item in await _replay(last_id):
+                replayed = _id_key(item[0])
+                yield item
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), keepalive_seconds)
+            except asyncio.TimeoutError:
+                yield None
+                continue
+            if item is _RESYNC:
+                return
+            # Entries appended while the replay ran arrive live as well.
+            if replayed is not None and _id_key(item[0]) <= replayed:
+                continue
+            yield item
+    finally:
+        _subscribers.discard(queue)
+
+
+async def stop_alert_stream():
+    global _tail_task
+    _subscribers.clear()
+    if _tail_task is not None:
+        _tail_task.cancel()
+        await asyncio.gather(_tail_task, return_exceptions=True)
+        _tail_task = None
+
+
+def get_alert_stream_metrics() -> dict:
+    return {"subscribers": len(_subscribers), "tailing": _tail_task is not None and not _tail_task.done(), **_stats}
+
+
+register_metrics_source("admin_alert_stream", get_alert_stream_metrics)
@@ -0,0 +1,42 @@
+import asyncio
+from typing import Coroutine, Set
+from loguru import logger
+
+# Strong references keep fire-and-forget tasks alive until they finish.
+_tasks: Set[asyncio.Task] = set()
+# Open-ended loops (pollers, watchers) that shutdown cancels instead of waiting for.
+_daemon_tasks: Set[asyncio.Task] = set()
+
+
+def _on_done(task: asyncio.Task):
+    _tasks.discard(task)
+    _daemon_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Background task {task.get_name()} failed: {task.exception()}")
+
+
+def spawn(coro: Coroutine, name: str = None, wait_on_shutdown: bool = True) -> asyncio.Task:
+    task = asyncio.create_task(coro, name=name)
+    _tasks.add(task)
+    if not wait_on_shutdown:
+        _daemon_tasks.add(task)
+    task.add_done_callback(_on_done)
+    return task
+
+
+def pending_count() -> int:
+    return len(_tasks)
+
+
+async def drain(timeout: float):
+    for task in _daemon_tasks:
+        task.cancel()
+    waiting = _tasks - _daemon_tasks
+    if not waiting:
+        return
+    logger.info(f"Waiting up to {timeout}s for {len(waiting)} background tasks.")
+    done, pending = await asyncio.wait(waiting, timeout=timeout)
+    for task in pending:
+        task.cancel()
+    if pending:
+        logger.warning(f"Cancelled {len(pending)} background tasks still running at shutdown.")
@@ -0,0 +1,99 @@
+import json
+from typing import Optional
+from fastapi import WebSocket, WebSocketDisconnect
+from app.utils.codec import packb, unpackb, msgpack
+from app.utils.metrics import register_metrics_source
+
+# /chat/ws speaks JSON text frames unless the client opts into v2, by offering the SUBPROTOCOL or
+# with ?protocol=msgpack. v2 frames are msgpack binary in both directions, history entries and replies
+# carry message ids, and a client that reconnects with ?lastMessageId= is sent only newer messages.
+# permessage-deflate is negotiated by the server for either protocol when the client offers it.
+SUBPROTOCOL = "reho.msgpack.v2"
+
+_stats = {
+    "json": {"connections": 0, "frames_out": 0, "bytes_out": 0},
+    "msgpack": {"connections": 0, "frames_out": 0, "bytes_out": 0},
+    "history": {"full": 0, "delta": 0, "delta_messages": 0, "messages_skipped": 0},
+}
+
+
+def negotiate(websocket: WebSocket) -> tuple:
+    # Returns (binary, subprotocol to accept with).
+    if msgpack is None:
+        return False, None
+    if SUBPROTOCOL in (websocket.scope.get("subprotocols") or []):
+        return True, SUBPROTOCOL
+    if websocket.query_params.get("protocol") == "msgpack":
+        return True, None
+    return False, None
+
+
+class ChatSocket:
+    # Wraps the socket so the chat code sends and receives dicts whatever the protocol.
+
+    def __init__(self, websocket: WebSocket, binary: bool):
+        self.websocket = websocket
+        self.binary = binary
+        self._stats = _stats["msgpack" if binary else "json"]
+        self._stats["connections"] += 1
+
+    async def send_json(self, frame: dict):
+        if self.binary:
+            payload = packb(frame)
+            await self.websocket.send_bytes(payload)
+            size = len(payload)
+        else:
+            # Same encoding as WebSocket.send_json, so v1 clients see identical frames.
+            text = json.dumps(frame, separators=(",", ":"), ensure_ascii=False)
+            await self.websocket.send_text(text)
+            size = len(text.encode())
+        self._stats["frames_out"] += 1
+        self._stats["bytes_out"] += size
+
+    async def receive(self):
+        # A str for text frames (parsed by the caller), the decoded object for msgpack frames.
+        message = await self.websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message.get("code", 1000), message.get("reason"))
+        data = message.get("bytes")
+        if data is None:
+            return message.get("text") or ""
+        if not self.binary:
+            return data.decode(errors="replace")
+        try:
+            return unpackb(data)
+        except Exception:
+            return ""
+
+    async def close(self, code: int = 1000):
+        await self.websocket.close(code=code)
+
+
+def history_frame(history: list, binary: bool, last_message_id: Optional[str] = None) -> dict:
+    if not binary:
+        return {"type": "initial_history", "data": [{"role": m["role"], "content": m["content"]} for m in history]}
+    if last_message_id:
+        ids = [m["id"] for m in history]
+        if last_message_id in ids:
+            position = ids.index(last_message_id) + 1
+            _stats["history"]["delta"] += 1
+            _stats["history"]["delta_messages"] += len(history) - position
+            _stats["history"]["messages_skipped"] += position
+            return {"type": "history_delta", "since": last_message_id, "data": history[position:]}
+    # Unknown or too old to be in the recent window: the client replaces what it has.
+    _stats["history"]["full"] += 1
+    return {"type": "initial_history", "data": history}
+
+
+def reply_frame(text: str, message_id: str, binary: bool) -> dict:
+    frame = {"type": "full_response", "data": text}
+    if binary:
+        frame["id"] = message_id
+    return frame
+
+
+def get_protocol_metrics() -> dict:
+    return {name: dict(values) for name, values in _stats.items()}
+
+
+register_metrics_source("chat_protocol", get_protocol_metrics)
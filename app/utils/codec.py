@@ -0,0 +1,124 @@
+from datetime import date, datetime
+from decimal import Decimal
+import orjson
+from bson import ObjectId, Decimal128
+from app.core.config import settings
+from loguru import logger
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Cache values start with a one-byte header: the low bits name the codec, the high bit marks zstd.
+_CODEC_ORJSON = 0x01
+_CODEC_MSGPACK = 0x02
+_FLAG_ZSTD = 0x80
+
+_CODEC_IDS = {"orjson": _CODEC_ORJSON, "msgpack": _CODEC_MSGPACK}
+
+_codec_id = None
+_zstd_compressor = None
+_zstd_decompressor = None
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, Decimal128):
+        return str(obj.to_decimal())
+    if isinstance(obj, Decimal):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, bytes):
+        return obj.hex()
+    raise TypeError(f"Object of type {type(obj).__name__} is not serializable")
+
+
+def dumps(obj) -> bytes:
+    return orjson.dumps(obj, default=_default)
+
+
+def to_jsonable(obj):
+    # One C-level encode/decode round trip instead of walking every dict and list in Python.
+    if obj is None:
+        return None
+    return orjson.loads(dumps(obj))
+
+
+def packb(obj) -> bytes:
+    return msgpack.packb(obj, default=_default, use_bin_type=True)
+
+
+def unpackb(data: bytes):
+    return msgpack.unpackb(data, raw=False)
+
+
+def _active_codec() -> int:
+    global _codec_id
+    if _codec_id is None:
+        codec = settings.CACHE_CODEC
+        if codec == "msgpack" and msgpack is None:
+            logger.warning("CACHE_CODEC is msgpack but msgpack is not installed; falling back to orjson.")
+            codec = "orjson"
+        _codec_id = _CODEC_IDS[codec]
+    return _codec_id
+
+
+def _compressor():
+    global _zstd_compressor
+    if _zstd_compressor is None:
+        _zstd_compressor = zstandard.ZstdCompressor(level=settings.CACHE_COMPRESSION_LEVEL)
+    return _zstd_compressor
+
+
+def _decompressor():
+    global _zstd_decompressor
+    if _zstd_decompressor is None:
+        _zstd_decompressor = zstandard.ZstdDecompressor()
+    return _zstd_decompressor
+
+
+def encode_cache_value(obj, compression_threshold: int = None) -> bytes:
+    codec = _active_codec()
+    if codec == _CODEC_MSGPACK:
+        body = packb(obj)
+    else:
+        body = dumps(obj)
+
+    threshold = settings.CACHE_COMPRESSION_THRESHOLD_BYTES if compression_threshold is None else compression_threshold
+    if zstandard is not None and threshold >= 0 and len(body) >= threshold:
+        return bytes((codec | _FLAG_ZSTD,)) + _compressor().compress(body)
+    return bytes((codec,)) + body
+
+
+def decode_cache_value(raw):
+    if raw is None:
+        return None
+    if isinstance(raw, str):
+        raw = raw.encode()
+    header = raw[0]
+    # Entries written before the codec existed are plain JSON text.
+    if header in (0x7B, 0x5B):
+        return orjson.loads(raw)
+
+    body = raw[1:]
+    if header & _FLAG_ZSTD:
+        if zstandard is None:
+            raise ValueError("Cache value is zstd-compressed but zstandard is not installed")
+        body = _decompressor().decompress(body)
+
+    codec = header & ~_FLAG_ZSTD
+    if codec == _CODEC_MSGPACK:
+        if msgpack is None:
+            raise ValueError("Cache value is msgpack-encoded but msgpack is not installed")
+        return unpackb(body)
+    if codec == _CODEC_ORJSON:
+        return orjson.loads(body)
+    raise ValueError(f"Unknown cache codec header: {header:#x}")
@@ -0,0 +1,28 @@
+import base64
+import binascii
+from datetime import datetime, timezone
+from bson import ObjectId
+
+# Opaque keyset cursors: the (timestamp, ObjectId) of the last row a page returned.
+
+
+def as_utc(value) -> datetime:
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value)
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def encode_cursor(timestamp: datetime, object_id) -> str:
+    raw = f"{as_utc(timestamp).isoformat()}|{object_id}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        timestamp, object_id = raw.split("|")
+        if not ObjectId.is_valid(object_id):
+            raise ValueError
+        return as_utc(timestamp), object_id
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
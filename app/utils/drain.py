@@ -0,0 +1,121 @@
+import asyncio
+import random
+import signal
+import time
+from typing import Optional, Set
+from app.core.config import settings
+from app.utils import background, readiness
+from app.utils.metrics import register_metrics_source
+from loguru import logger
+
+# SIGTERM first drains this worker, then hands the signal to uvicorn for the normal shutdown.
+_draining = False
+_handed_over = False
+_drain_task: Optional[asyncio.Task] = None
+_previous_handler = None
+_sessions: Set = set()
+_last_drain: dict = {}
+
+
+def is_draining() -> bool:
+    return _draining
+
+
+def register_session(session):
+    _sessions.add(session)
+
+
+def unregister_session(session):
+    _sessions.discard(session)
+
+
+def active_sessions() -> list:
+    return list(_sessions)
+
+
+def reconnect_frame() -> dict:
+    # Randomised so the clients of a restarting worker don't all land on the new ones at once.
+    retry_after = round(random.uniform(settings.DRAIN_RECONNECT_MIN_SECONDS, settings.DRAIN_RECONNECT_MAX_SECONDS), 1)
+    return {
+        "type": "reconnect",
+        "data": "The assistant is restarting, reconnecting shortly.",
+        "retry_after": retry_after,
+    }
+
+
+async def drain(timeout: float) -> dict:
+    global _draining
+    _draining = True
+    readiness.mark_not_ready("draining")
+    started = time.perf_counter()
+
+    sessions = list(_sessions)
+    logger.warning(f"Draining {len(sessions)} chat sessions, deadline {timeout:.1f}s.")
+    outcomes = await asyncio.gather(*(session.drain(timeout) for session in sessions), return_exceptions=True)
+
+    remaining = max(0.0, timeout - (time.perf_counter() - started))
+    pending_writes = background.pending_count()
+    await background.drain(timeout=remaining)
+
+    _last_drain.update(
+        sessions=len(sessions),
+        turns_finished=sum(1 for o in outcomes if o == "finished"),
+        turns_cancelled=sum(1 for o in outcomes if o == "cancelled"),
+        errors=sum(1 for o in outcomes if isinstance(o, Exception)),
+        background_tasks=pending_writes,
+        seconds=round(time.perf_counter() - started, 3),
+    )
+    logger.info(f"Drain finished: {_last_drain}")
+    return dict(_last_drain)
+
+
+def _hand_over():
+    global _handed_over
+    if _handed_over:
+        return
+    _handed_over = True
+    asyncio.get_running_loop().remove_signal_handler(signal.SIGTERM)
+    signal.signal(signal.SIGTERM, _previous_handler or signal.SIG_DFL)
+    if callable(_previous_handler):
+        _previous_handler(signal.SIGTERM, None)
+    else:
+        signal.raise_signal(signal.SIGTERM)
+
+
+async def _drain_then_exit():
+    try:
+        await drain(settings.DRAIN_TIMEOUT_SECONDS)
+    except Exception as e:
+        logger.error(f"Drain failed: {e}")
+    finally:
+        _hand_over()
+
+
+def _on_sigterm():
+    global _drain_task
+    if _drain_task is not None:
+        logger.warning("Second SIGTERM received; shutting down without waiting for the drain.")
+        _hand_over()
+        return
+    _drain_task = asyncio.get_running_loop().create_task(_drain_then_exit())
+
+
+def install_signal_handler():
+    global _previous_handler
+    if settings.DRAIN_TIMEOUT_SECONDS <= 0:
+        return
+    try:
+        previous = signal.getsignal(signal.SIGTERM)
+        asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, _on_sigterm)
+    except (NotImplementedError, RuntimeError, ValueError) as e:
+        # Not on the main thread (test clients) or not supported by the platform.
+        logger.debug(f"Graceful drain on SIGTERM is unavailable: {e}")
+        return
+    _previous_handler = previous
+
+
+def get_drain_metrics() -> dict:
+    return {"draining": _draining, "sessions": len(_sessions), "last_drain": dict(_last_drain)}
+
+
+register_metrics_source("drain", get_drain_metrics)
@@ -0,0 +1,177 @@
+from collections import Counter
+from typing import Optional
+
+# The figures every report, tip, prompt and dashboard reads from a financial summary, computed in
+# one pass when the summary is built and cached next to it under SNAPSHOT_KEY. Bump _VERSION when
+# the fields change; cached summaries with an older snapshot are recomputed on read.
+SNAPSHOT_KEY = "snapshot"
+_VERSION = 2
+
+_ESSENTIAL_NAME_KEYWORDS = ['rent', 'mortgage', 'utility', 'bill', 'grocery', 'insurance', 'loan', 'debt', 'payment']
+_SUBSCRIPTION_KEYWORDS = [
+    'subscription', 'netflix', 'spotify', 'amazon prime', 'disney',
+    'apple', 'youtube', 'hulu', 'tv', 'streaming', 'prime video'
+]
+_DISCRETIONARY_KEYWORDS = [
+    'entertainment', 'shopping', 'dining', 'eating out', 'hobby',
+    'leisure', 'clothing', 'travel', 'discretionary', 'wants'
+]
+
+
+def _amount(value) -> float:
+    # Decimal128 amounts arrive as strings after to_jsonable; missing ones as None.
+    try:
+        return float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _classify_budget(category: str) -> Optional[str]:
+    if 'essential' in category or 'needs' in category:
+        return "essential"
+    if 'discretionary' in category or 'wants' in category:
+        return "discretionary"
+    if 'saving' in category:
+        return "savings"
+    return None
+
+
+def _classify_expense(expense: dict) -> str:
+    category_type = str(expense.get('budgetCategory', '')).strip().lower()
+    if 'essential' in category_type or category_type == 'needs':
+        return "essential"
+    if 'discretionary' in category_type or category_type == 'wants':
+        return "discretionary"
+    if 'saving' in category_type:
+        return "savings"
+    name = str(expense.get('name') or '').lower()
+    if any(keyword in name for keyword in _ESSENTIAL_NAME_KEYWORDS):
+        return "essential"
+    return "discretionary"
+
+
+def _matches(expense: dict, keywords: list) -> bool:
+    name = str(expense.get('name', '')).lower()
+    category = str(expense.get('budgetCategory', '')).lower()
+    return any(kw in name or kw in category for kw in keywords)
+
+
+class FinancialSnapshot:
+    __slots__ = (
+        "total_income", "total_expenses", "total_debt_payments", "total_debt",
+        "net_income", "disposable_income", "debt_to_income",
+        "category_totals", "budget_category_totals", "actual_essential", "actual_discretionary", "actual_savings", "savings_progress",
+        "subscription_total", "discretionary_spend", "duplicate_expenses",
+        "smallest_debt", "highest_rate_debt", "active_debt_names",
+    )
+
+    @classmethod
+    def from_summary(cls, financial_summary: dict) -> "FinancialSnapshot":
+        incomes = financial_summary.get("incomes") or []
+        expenses = financial_summary.get("expenses") or []
+        budgets = financial_summary.get("budgets") or []
+        debts = financial_summary.get("debts") or []
+        saving_goals = financial_summary.get("saving_goals") or []
+
+        snapshot = cls.__new__(cls)
+        snapshot.total_income = sum(_amount(i.get("amount")) for i in incomes)
+        snapshot.total_debt_payments = sum(_amount(d.get("monthlyPayment")) for d in debts)
+        snapshot.total_debt = sum(_amount(d.get("amount")) for d in debts)
+
+        buckets = {"essential": 0.0, "discretionary": 0.0, "savings": 0.0}
+        category_totals = {}
+        budget_category_totals = {}
+        duplicates = {}
+        total_expenses = subscription_total = discretionary_spend = 0.0
+        for expense in expenses:
+            amount = _amount(expense.get("amount"))
+            total_expenses += amount
+            category = expense.get("budgetCategory") or expense.get("name") or "Others"
+            category_totals[category] = category_totals.get(category, 0.0) + amount
+            # The chat prompt groups by budgetCategory alone; str() keeps a null category cacheable as "None".
+            budget_category = str(expense.get("budgetCategory", "Others"))
+            budget_category_totals[budget_category] = budget_category_totals.get(budget_category, 0.0) + amount
+            name = str(expense.get("name", "")).strip().lower()
+            if name:
+                duplicates.setdefault(expense.get("budgetCategory", "Others"), Counter())[name] += 1
+            if _matches(expense, _SUBSCRIPTION_KEYWORDS):
+                subscription_total += amount
+            if _matches(expense, _DISCRETIONARY_KEYWORDS):
+                discretionary_spend += amount
+            # Expenses only decide the 50/30/20 split when the user has no budgets.
+            if not budgets:
+                buckets[_classify_expense(expense)] += amount
+
+        for budget in budgets:
+            bucket = _classify_budget(str(budget.get("category", "")).strip().lower())
+            if bucket:
+                buckets[bucket] += _amount(budget.get("amount"))
+
+        snapshot.total_expenses = total_expenses
+        snapshot.net_income = snapshot.total_income - total_expenses
+        snapshot.disposable_income = max(0, snapshot.net_income - snapshot.total_debt_payments)
+        snapshot.debt_to_income = snapshot.total_debt_payments / snapshot.total_income if snapshot.total_income > 0 else 0.0
+        snapshot.category_totals = category_totals
+        snapshot.budget_category_totals = budget_category_totals
+        snapshot.actual_essential = buckets["essential"] + snapshot.total_debt_payments
+        snapshot.actual_discretionary = buckets["discretionary"]
+        snapshot.actual_savings = buckets["savings"] + sum(_amount(g.get("monthlyTarget")) for g in saving_goals)
+
+        goal_total = sum(_amount(g.get("totalAmount")) for g in saving_goals)
+        snapshot.savings_progress = (
+            sum(_amount(g.get("completionRatio")) * _amount(g.get("totalAmount")) for g in saving_goals) / goal_total
+            if goal_total else 0.0
+        )
+
+        snapshot.subscription_total = subscription_total
+        snapshot.discretionary_spend = discretionary_spend
+        snapshot.duplicate_expenses = [
+            [category, name, count]
+            for category, counts in duplicates.items()
+            for name, count in counts.items() if count > 1
+        ]
+
+        active_debts = [d for d in debts if _amount(d.get("amount")) > 0]
+        snapshot.smallest_debt = None
+        snapshot.highest_rate_debt = None
+        if active_debts:
+            smallest = min(active_debts, key=lambda d: _amount(d.get("amount")))
+            highest = max(active_debts, key=lambda d: _amount(d.get("interestRate")))
+            snapshot.smallest_debt = {"name": smallest.get("name", "Smallest Debt"), "amount": _amount(smallest.get("amount"))}
+            snapshot.highest_rate_debt = {"name": highest.get("name", "Highest Rate Debt"), "amount": _amount(highest.get("amount"))}
+        snapshot.active_debt_names = [d.get("name", "debt") for d in active_debts]
+        return snapshot
+
+    @classmethod
+    def of(cls, financial_summary: dict) -> "FinancialSnapshot":
+        # Read the precomputed snapshot when the summary carries a current one.
+        stored = financial_summary.get(SNAPSHOT_KEY)
+        if isinstance(stored, list) and len(stored) == len(cls.__slots__) + 1 and stored[0] == _VERSION:
+            snapshot = cls.__new__(cls)
+            for name, value in zip(cls.__slots__, stored[1:]):
+                setattr(snapshot, name, value)
+            return snapshot
+        return cls.from_summary(financial_summary)
+
+    def to_cache(self) -> list:
+        return [_VERSION, *(getattr(self, name) for name in self.__slots__)]
+
+    @property
+    def debt_risk(self) -> str:
+        if self.total_income > 0 and self.total_debt_payments > 0 and self.debt_to_income > 0.40:
+            return "High Risk"
+        if self.total_debt_payments > 0:
+            return "Medium Risk"
+        return "Low Risk"
+
+
+def attach_snapshot(financial_summary: dict) -> dict:
+    financial_summary[SNAPSHOT_KEY] = FinancialSnapshot.from_summary(financial_summary).to_cache()
+    return financial_summary
+
+
+def without_snapshot(financial_summary: dict) -> dict:
+    # The raw summary as it is shown to the model; the snapshot's figures are quoted separately.
+    if SNAPSHOT_KEY not in financial_summary:
+        return financial_summary
+    return {k: v for k, v in financial_summary.items() if k != SNAPSHOT_KEY}
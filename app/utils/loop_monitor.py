@@ -0,0 +1,190 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import traceback
+import weakref
+from collections import deque
+from typing import Optional, Union
+from app.core.config import settings
+from app.utils.metrics import register_metrics_source
+from loguru import logger
+
+_state = {
+    "lag_ms": 0.0,
+    "max_lag_ms": 0.0,
+    "samples": 0,
+}
+
+_task: Optional[asyncio.Task] = None
+
+# Upper bounds (ms) of the watchdog's lag histogram; the last bucket is open-ended.
+_LAG_BUCKETS_MS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+_watchdog_state = {
+    "probes": 0,
+    "lag_histogram": [0] * (len(_LAG_BUCKETS_MS) + 1),
+    "slow_callbacks": 0,
+    "blocked_ms_total": 0.0,
+    "by_source": {},
+}
+_recent_stalls: deque = deque(maxlen=20)
+_watchdog: Optional["_LoopWatchdog"] = None
+
+# What each task is doing, for attributing stalls: an HTTP/WebSocket scope or a free-form label.
+_task_labels: "weakref.WeakKeyDictionary[asyncio.Task, Union[str, dict]]" = weakref.WeakKeyDictionary()
+
+
+async def _sample_loop_lag(interval: float):
+    while True:
+        expected = time.perf_counter() + interval
+        await asyncio.sleep(interval)
+        lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+        # Smoothed so a single slow callback does not flip load shedding on and off.
+        previous = _state["lag_ms"]
+        _state["lag_ms"] = lag_ms if _state["samples"] == 0 else previous * 0.7 + lag_ms * 0.3
+        _state["max_lag_ms"] = max(_state["max_lag_ms"], lag_ms)
+        _state["samples"] += 1
+
+
+def label_current_task(label: Union[str, dict]):
+    task = asyncio.current_task()
+    if task is not None:
+        _task_labels[task] = label
+
+
+def _describe(task: Optional[asyncio.Task]) -> str:
+    if task is None:
+        return "loop callback"
+    label = _task_labels.get(task)
+    if isinstance(label, dict):
+        # Resolved late: the router has stored the matched route in the scope by now.
+        route = label.get("route")
+        path = getattr(route, "path", None) or label.get("path", "?")
+        kind = "WS" if label.get("type") == "websocket" else label.get("method", "HTTP")
+        return f"{kind} {path}"
+    return label or task.get_name()
+
+
+class TaskLabelMiddleware:
+    # Innermost, so the task it labels is the one running the route.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] in ("http", "websocket"):
+            label_current_task(scope)
+        await self.app(scope, receive, send)
+
+
+class _LoopWatchdog(threading.Thread):
+    # Pings the loop from outside. A ping that is not answered within the threshold means a
+    # callback is blocking; the loop thread's stack is captured while it is still blocked.
+    # Blocks longer than threshold + interval are always caught; the duration is counted from the ping.
+
+    def __init__(self, loop: asyncio.AbstractEventLoop, threshold_ms: float, interval: float):
+        super().__init__(name="loop-watchdog", daemon=True)
+        self.loop = loop
+        self.loop_thread_id = threading.get_ident()
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.wait(self.interval):
+            answered = threading.Event()
+            sent = time.perf_counter()
+            try:
+                self.loop.call_soon_threadsafe(answered.set)
+            except RuntimeError:
+                return
+
+            stall = None
+            if not answered.wait(self.threshold):
+                stall = self._capture()
+                while not answered.wait(0.5):
+                    if self.stopping.is_set():
+                        return
+            self._record((time.perf_counter() - sent) * 1000, stall)
+
+    def _capture(self) -> dict:
+        frame = sys._current_frames().get(self.loop_thread_id)
+        task = getattr(asyncio.tasks, "_current_tasks", {}).get(self.loop)
+        frames = traceback.extract_stack(frame, limit=settings.SLOW_CALLBACK_STACK_LIMIT) if frame else []
+        # Start at the callback the loop was running rather than at the loop machinery.
+        for i in range(len(frames) - 1, -1, -1):
+            if frames[i].name == "_run" and frames[i].filename.endswith(os.path.join("asyncio", "events.py")):
+                frames = frames[i + 1:]
+                break
+        return {"source": _describe(task), "stack": "".join(traceback.format_list(frames))}
+
+    def _record(self, lag_ms: float, stall: Optional[dict]):
+        _watchdog_state["probes"] += 1
+        bucket = next((i for i, bound in enumerate(_LAG_BUCKETS_MS) if lag_ms <= bound), len(_LAG_BUCKETS_MS))
+        _watchdog_state["lag_histogram"][bucket] += 1
+        if stall is None:
+            return
+
+        _watchdog_state["slow_callbacks"] += 1
+        _watchdog_state["blocked_ms_total"] += lag_ms
+        by_source = _watchdog_state["by_source"]
+        by_source[stall["source"]] = by_source.get(stall["source"], 0) + 1
+        _recent_stalls.append({
+            "at": time.time(),
+            "blocked_ms": round(lag_ms, 1),
+            "source": stall["source"],
+            "stack": stall["stack"],
+        })
+        logger.warning(f"Event loop blocked for {lag_ms:.0f}ms by {stall['source']}:\n{stall['stack']}")
+
+
+def start_loop_monitor():
+    global _task, _watchdog
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_sample_loop_lag(settings.LOOP_LAG_SAMPLE_SECONDS))
+        logger.info(f"Event loop lag monitor started (every {settings.LOOP_LAG_SAMPLE_SECONDS}s).")
+    if settings.SLOW_CALLBACK_THRESHOLD_MS > 0 and _watchdog is None:
+        _watchdog = _LoopWatchdog(
+            asyncio.get_running_loop(), settings.SLOW_CALLBACK_THRESHOLD_MS, settings.LOOP_WATCHDOG_INTERVAL_SECONDS
+        )
+        _watchdog.start()
+        logger.info(f"Slow callback watchdog started (threshold {settings.SLOW_CALLBACK_THRESHOLD_MS}ms).")
+
+
+async def stop_loop_monitor():
+    global _task, _watchdog
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    if _watchdog is not None:
+        _watchdog.stopping.set()
+        _watchdog = None
+
+
+def current_loop_lag_ms() -> float:
+    return _state["lag_ms"]
+
+
+def get_loop_metrics() -> dict:
+    labels = [f"le_{bound}ms" for bound in _LAG_BUCKETS_MS] + [f"gt_{_LAG_BUCKETS_MS[-1]}ms"]
+    return {
+        "lag_ms": round(_state["lag_ms"], 3),
+        "max_lag_ms": round(_state["max_lag_ms"], 3),
+        "samples": _state["samples"],
+        "watchdog": {
+            "probes": _watchdog_state["probes"],
+            "lag_histogram": dict(zip(labels, _watchdog_state["lag_histogram"])),
+            "slow_callbacks": _watchdog_state["slow_callbacks"],
+            "blocked_ms_total": round(_watchdog_state["blocked_ms_total"], 1),
+            "slow_callbacks_by_source": dict(_watchdog_state["by_source"]),
+        },
+    }
+
+
+def get_recent_stalls() -> list:
+    return list(_recent_stalls)
+
+
+register_metrics_source("event_loop", get_loop_metrics)
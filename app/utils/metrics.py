@@ -1,10 +1,34 @@
 from functools import wraps
-from typing import Callable, Set
+from typing import Callable, Dict, Set
 import time
 from loguru import logger
 
 ACTIVE_USERS: Set[str] = set()
 
+GENERATION_CANCELLATIONS: Dict[str, int] = {}
+
+_llm_in_flight = 0
+
+_METRICS_SOURCES: Dict[str, Callable[[], dict]] = {}
+
+
+def register_metrics_source(name: str, collector: Callable[[], dict]):
+    _METRICS_SOURCES[name] = collector
+
+
+def get_metrics_snapshot() -> dict:
+    snapshot = {
+        "active_users": len(ACTIVE_USERS),
+        "generation_cancellations": dict(GENERATION_CANCELLATIONS),
+        "llm_calls_in_flight": _llm_in_flight,
+    }
+    for name, collector in _METRICS_SOURCES.items():
+        try:
+            snapshot[name] = collector()
+        except Exception as e:
+            logger.error(f"Metrics source '{name}' failed: {e}")
+    return snapshot
+
 async def track_request_metrics(request, call_next):
     start_time = time.time()
     method = request.method
@@ -26,8 +50,10 @@ def track_openai_metrics():
     def decorator(func):
         @wraps(func)
         async def wrapper(*args, **kwargs):
+            global _llm_in_flight
             endpoint = func.__name__
             start_time = time.time()
+            _llm_in_flight += 1
 
             try:
                 result = await func(*args, **kwargs)
@@ -37,6 +63,7 @@ def track_openai_metrics():
                 logger.error(f"OpenAI API call failed: {endpoint} - Error: {str(e)}")
                 raise
             finally:
+                _llm_in_flight -= 1
                 duration = time.time() - start_time
                 logger.info(f"OpenAI API call duration: {duration:.3f}s - {endpoint}")
 
@@ -44,6 +71,10 @@ def track_openai_metrics():
     return decorator
 
 
+def llm_calls_in_flight() -> int:
+    return _llm_in_flight
+
+
 def add_active_user(user_id: str):
     ACTIVE_USERS.add(user_id)
     logger.info(f"User {user_id} became active. Total active users: {len(ACTIVE_USERS)}")
@@ -51,4 +82,40 @@ def add_active_user(user_id: str):
 
 def remove_active_user(user_id: str):
     ACTIVE_USERS.discard(user_id)
-    logger.info(f"User {user_id} became inactive. Total active users: {len(ACTIVE_USERS)}")
\ No newline at end of file
+    logger.info(f"User {user_id} became inactive. Total active users: {len(ACTIVE_USERS)}")
+
+
+def record_generation_cancelled(reason: str):
+    GENERATION_CANCELLATIONS[reason] = GENERATION_CANCELLATIONS.get(reason, 0) + 1
+    total = sum(GENERATION_CANCELLATIONS.values())
+    logger.info(f"Generation cancelled ({reason}). Total cancelled generations: {total}")
+
+
+# Upper bounds (ms) of the connect-to-first-frame histogram; the last bucket is open-ended.
+_FIRST_FRAME_BUCKETS_MS = (50, 100, 250, 500, 1000, 2500)
+_first_frame = {"count": 0, "total_ms": 0.0, "max_ms": 0.0, "by_kind": {}, "histogram": [0] * (len(_FIRST_FRAME_BUCKETS_MS) + 1)}
+
+
+def record_chat_first_frame(kind: str, connected_at: float):
+    elapsed_ms = (time.perf_counter() - connected_at) * 1000
+    _first_frame["count"] += 1
+    _first_frame["total_ms"] += elapsed_ms
+    _first_frame["max_ms"] = max(_first_frame["max_ms"], elapsed_ms)
+    _first_frame["by_kind"][kind] = _first_frame["by_kind"].get(kind, 0) + 1
+    bucket = next((i for i, bound in enumerate(_FIRST_FRAME_BUCKETS_MS) if elapsed_ms <= bound), len(_FIRST_FRAME_BUCKETS_MS))
+    _first_frame["histogram"][bucket] += 1
+
+
+def get_first_frame_metrics() -> dict:
+    labels = [f"le_{bound}ms" for bound in _FIRST_FRAME_BUCKETS_MS] + [f"gt_{_FIRST_FRAME_BUCKETS_MS[-1]}ms"]
+    count = _first_frame["count"]
+    return {
+        "count": count,
+        "avg_ms": round(_first_frame["total_ms"] / count, 3) if count else 0.0,
+        "max_ms": round(_first_frame["max_ms"], 3),
+        "by_kind": dict(_first_frame["by_kind"]),
+        "histogram": dict(zip(labels, _first_frame["histogram"])),
+    }
+
+
+register_metrics_source("chat_first_frame", get_first_frame_metrics)
@@ -0,0 +1,128 @@
+import threading
+import time
+from pymongo import monitoring
+from redis.asyncio import BlockingConnectionPool
+from app.core.config import settings
+from app.utils.metrics import register_metrics_source
+from loguru import logger
+
+
+class PoolWaitStats:
+    def __init__(self, name: str, warn_after_ms: float):
+        self.name = name
+        self.warn_after_ms = warn_after_ms
+        self._lock = threading.Lock()
+        self._checkouts = 0
+        self._total_wait_ms = 0.0
+        self._max_wait_ms = 0.0
+        self._slow_checkouts = 0
+        self._failed_checkouts = 0
+        self._in_use = 0
+        self._open = 0
+
+    def record_checkout(self, wait_ms: float):
+        with self._lock:
+            self._checkouts += 1
+            self._in_use += 1
+            self._total_wait_ms += wait_ms
+            self._max_wait_ms = max(self._max_wait_ms, wait_ms)
+            slow = wait_ms >= self.warn_after_ms
+            if slow:
+                self._slow_checkouts += 1
+        if slow:
+            logger.warning(f"{self.name} pool wait {wait_ms:.1f}ms (in use: {self._in_use}) - pool may be starved")
+
+    def record_checkout_failed(self, wait_ms: float, reason: str):
+        with self._lock:
+            self._failed_checkouts += 1
+        logger.error(f"{self.name} pool checkout failed after {wait_ms:.1f}ms - reason: {reason}")
+
+    def record_checkin(self):
+        with self._lock:
+            self._in_use = max(0, self._in_use - 1)
+
+    def record_opened(self):
+        with self._lock:
+            self._open += 1
+
+    def record_closed(self):
+        with self._lock:
+            self._open = max(0, self._open - 1)
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {
+                "checkouts": self._checkouts,
+                "avg_wait_ms": round(self._total_wait_ms / self._checkouts, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(self._max_wait_ms, 3),
+                "slow_checkouts": self._slow_checkouts,
+                "failed_checkouts": self._failed_checkouts,
+                "in_use": self._in_use,
+                "open": self._open,
+            }
+
+
+mongo_pool_stats = PoolWaitStats("MongoDB", warn_after_ms=settings.POOL_WAIT_WARN_MS)
+redis_pool_stats = PoolWaitStats("Redis", warn_after_ms=settings.POOL_WAIT_WARN_MS)
+
+
+class MongoPoolListener(monitoring.ConnectionPoolListener):
+    def pool_created(self, event):
+        pass
+
+    def pool_ready(self, event):
+        pass
+
+    def pool_cleared(self, event):
+        logger.warning(f"MongoDB pool cleared for {event.address}")
+
+    def pool_closed(self, event):
+        pass
+
+    def connection_created(self, event):
+        mongo_pool_stats.record_opened()
+
+    def connection_ready(self, event):
+        pass
+
+    def connection_closed(self, event):
+        mongo_pool_stats.record_closed()
+
+    def connection_check_out_started(self, event):
+        pass
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_stats.record_checkout_failed((event.duration or 0) * 1000, event.reason)
+
+    def connection_checked_out(self, event):
+        mongo_pool_stats.record_checkout((event.duration or 0) * 1000)
+
+    def connection_checked_in(self, event):
+        mongo_pool_stats.record_checkin()
+
+
+class TimedBlockingConnectionPool(BlockingConnectionPool):
+    async def get_connection(self, *args, **kwargs):
+        start_time = time.monotonic()
+        try:
+            connection = await super().get_connection(*args, **kwargs)
+        except Exception as e:
+            redis_pool_stats.record_checkout_failed((time.monotonic() - start_time) * 1000, str(e))
+            raise
+        redis_pool_stats.record_checkout((time.monotonic() - start_time) * 1000)
+        return connection
+
+    async def release(self, connection):
+        await super().release(connection)
+        redis_pool_stats.record_checkin()
+
+    def make_connection(self):
+        redis_pool_stats.record_opened()
+        return super().make_connection()
+
+
+def get_pool_metrics() -> dict:
+    return {"mongo": mongo_pool_stats.snapshot(), "redis": redis_pool_stats.snapshot()}
+
+
+register_metrics_source("connection_pools", get_pool_metrics)
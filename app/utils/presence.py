@@ -0,0 +1,159 @@
+import asyncio
+import time
+import uuid
+from typing import Dict, Optional
+from app.core.config import settings
+from app.db.client import redis_client
+from app.utils.metrics import register_metrics_source
+from loguru import logger
+
+# Each WebSocket is a member of its user's sorted set, scored by when its heartbeat lapses.
+# Sockets on a worker that died simply stop being refreshed and age out after PRESENCE_TTL_SECONDS.
+_USER_KEY = "presence:user:{user_id}"
+_USERS_KEY = "presence:users"
+_CONNECTIONS_KEY = "presence:connections"
+
+_ADMIT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+local limit = tonumber(ARGV[5])
+if limit > 0 and redis.call('ZCARD', KEYS[1]) >= limit then
+    return 0
+end
+redis.call('ZADD', KEYS[1], ARGV[2], ARGV[3])
+redis.call('PEXPIREAT', KEYS[1], math.floor(tonumber(ARGV[2]) * 1000))
+redis.call('ZADD', KEYS[2], ARGV[2], ARGV[4])
+redis.call('ZADD', KEYS[3], ARGV[2], ARGV[3])
+return 1
+"""
+
+_RELEASE_SCRIPT = """
+redis.call('ZREM', KEYS[1], ARGV[2])
+redis.call('ZREM', KEYS[3], ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[1])
+if redis.call('ZCARD', KEYS[1]) == 0 then
+    redis.call('ZREM', KEYS[2], ARGV[3])
+end
+return 1
+"""
+
+# Sockets held by this worker: connection id -> user id.
+_local_connections: Dict[str, str] = {}
+
+_stats = {
+    "admitted": 0,
+    "rejected_user_limit": 0,
+    "redis_errors": 0,
+}
+
+_heartbeat_task: Optional[asyncio.Task] = None
+
+
+def _user_key(user_id: str) -> str:
+    return _USER_KEY.format(user_id=user_id)
+
+
+async def register_connection(user_id: str) -> Optional[str]:
+    connection_id = uuid.uuid4().hex
+    now = time.time()
+    try:
+        admitted = await redis_client.eval(
+            _ADMIT_SCRIPT, 3, _user_key(user_id), _USERS_KEY, _CONNECTIONS_KEY,
+            now, now + settings.PRESENCE_TTL_SECONDS, connection_id, user_id, settings.WS_MAX_CONNECTIONS_PER_USER,
+        )
+    except Exception as e:
+        # Presence is best effort: without Redis only the per-worker cap applies.
+        _stats["redis_errors"] += 1
+        logger.warning(f"Presence registration failed for {user_id}, admitting without a per-user cap: {e}")
+        admitted = 1
+
+    if not int(admitted):
+        _stats["rejected_user_limit"] += 1
+        logger.warning(f"User {user_id} already has {settings.WS_MAX_CONNECTIONS_PER_USER} open chat connections.")
+        return None
+
+    _local_connections[connection_id] = user_id
+    _stats["admitted"] += 1
+    return connection_id
+
+
+async def release_connection(connection_id: str):
+    user_id = _local_connections.pop(connection_id, None)
+    if user_id is None:
+        return
+    try:
+        await redis_client.eval(
+            _RELEASE_SCRIPT, 3, _user_key(user_id), _USERS_KEY, _CONNECTIONS_KEY,
+            time.time(), connection_id, user_id,
+        )
+    except Exception as e:
+        _stats["redis_errors"] += 1
+        logger.warning(f"Presence release failed for {user_id}; it will expire on its own: {e}")
+
+
+async def _refresh_presence():
+    if not _local_connections:
+        return
+    expires_at = time.time() + settings.PRESENCE_TTL_SECONDS
+    pipe = redis_client.pipeline(transaction=False)
+    for connection_id, user_id in list(_local_connections.items()):
+        pipe.zadd(_user_key(user_id), {connection_id: expires_at})
+        pipe.expireat(_user_key(user_id), int(expires_at) + 1)
+        pipe.zadd(_USERS_KEY, {user_id: expires_at}, gt=True)
+        pipe.zadd(_CONNECTIONS_KEY, {connection_id: expires_at})
+    await pipe.execute()
+
+
+async def _heartbeat_forever():
+    while True:
+        await asyncio.sleep(settings.PRESENCE_HEARTBEAT_SECONDS)
+        try:
+            await _refresh_presence()
+        except Exception as e:
+            _stats["redis_errors"] += 1
+            logger.warning(f"Presence heartbeat failed for {len(_local_connections)} connections: {e}")
+
+
+def start_presence_heartbeat():
+    global _heartbeat_task
+    if _heartbeat_task is None or _heartbeat_task.done():
+        _heartbeat_task = asyncio.create_task(_heartbeat_forever())
+
+
+async def stop_presence_heartbeat():
+    global _heartbeat_task
+    if _heartbeat_task is not None:
+        _heartbeat_task.cancel()
+        await asyncio.gather(_heartbeat_task, return_exceptions=True)
+        _heartbeat_task = None
+    for connection_id in list(_local_connections):
+        await release_connection(connection_id)
+
+
+def local_connection_count() -> int:
+    return len(_local_connections)
+
+
+def has_local_connection(user_id: str) -> bool:
+    return user_id in _local_connections.values()
+
+
+async def get_presence_summary() -> dict:
+    now = time.time()
+    pipe = redis_client.pipeline(transaction=False)
+    pipe.zremrangebyscore(_USERS_KEY, "-inf", now)
+    pipe.zremrangebyscore(_CONNECTIONS_KEY, "-inf", now)
+    pipe.zcard(_USERS_KEY)
+    pipe.zcard(_CONNECTIONS_KEY)
+    _, _, users, connections = await pipe.execute()
+    return {"online_users": users, "open_connections": connections}
+
+
+def get_local_presence_metrics() -> dict:
+    return {
+        "worker_connections": len(_local_connections),
+        "worker_users": len(set(_local_connections.values())),
+        **_stats,
+    }
+
+
+register_metrics_source("presence", get_local_presence_metrics)
@@ -0,0 +1,290 @@
+import asyncio
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from collections import Counter
+from typing import Callable, Dict, Optional
+from fastapi import HTTPException, status
+from app.core.config import settings
+from app.utils.security import is_admin_token
+from loguru import logger
+
+# Nothing here runs unless PROFILING_ENABLED is set: the middleware is not installed, the sampler
+# thread only exists while a profile is being taken and tracemalloc stays off until started.
+
+_sampler_lock = threading.Lock()
+_memory_holders: Dict[str, Callable[[], object]] = {}
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+_AWAIT_MARKER = "[awaiting]"
+
+
+def _running_tasks() -> dict:
+    # The loop's own record of which task is executing; read-only access from the sampler thread.
+    return getattr(asyncio.tasks, "_current_tasks", {})
+
+
+def _frame_label(code) -> str:
+    filename = code.co_filename
+    for prefix in sys.path:
+        if prefix and filename.startswith(prefix):
+            filename = filename[len(prefix):].lstrip(os.sep)
+            break
+    return f"{code.co_name} ({filename}:{code.co_firstlineno})"
+
+
+def _thread_stack(frame) -> list:
+    stack = []
+    while frame is not None:
+        stack.append(frame.f_code)
+        frame = frame.f_back
+    stack.reverse()
+    # Drop the event loop's own frames so every stack starts at the task that was running.
+    for i in range(len(stack) - 1, -1, -1):
+        if stack[i].co_name == "_run" and stack[i].co_filename.endswith(os.path.join("asyncio", "events.py")):
+            return stack[i + 1:]
+    return stack
+
+
+def _awaiting_stack(task: asyncio.Task) -> list:
+    stack = []
+    coro = task.get_coro()
+    while coro is not None and hasattr(coro, "cr_code"):
+        stack.append(coro.cr_code)
+        coro = coro.cr_await
+    return stack
+
+
+class StackSampler:
+    # Samples stacks from a separate thread and folds them into "frame;frame;frame count" lines,
+    # the input format of flamegraph.pl, speedscope and most flame-graph viewers.
+
+    def __init__(self, interval_ms: float, thread_id: int, task: asyncio.Task = None,
+                 loop: asyncio.AbstractEventLoop = None, all_threads: bool = False):
+        self.interval = interval_ms / 1000
+        self.thread_id = thread_id
+        self.task = task
+        self.loop = loop
+        self.all_threads = all_threads
+        self.stacks = Counter()
+        self.samples = 0
+        self.started = 0.0
+        self.duration = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self) -> bool:
+        # One profile per worker at a time; a second one would skew both.
+        if not _sampler_lock.acquire(blocking=False):
+            return False
+        self.started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self) -> "StackSampler":
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.perf_counter() - self.started
+        _sampler_lock.release()
+        return self
+
+    def _run(self):
+        sampler_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            self.samples += 1
+            if self.task is not None:
+                self._sample_task(frames.get(self.thread_id))
+                continue
+            for thread_id, frame in frames.items():
+                if thread_id == sampler_id or (not self.all_threads and thread_id != self.thread_id):
+                    continue
+                self._record(_thread_stack(frame), thread_id)
+
+    def _sample_task(self, frame):
+        if self.task.done():
+            return
+        if _running_tasks().get(self.loop) is self.task and frame is not None:
+            self._record(_thread_stack(frame))
+        else:
+            # Off the CPU: attribute the sample to whatever the request is waiting on.
+            self._record(_awaiting_stack(self.task), suffix=_AWAIT_MARKER)
+
+    def _record(self, stack: list, thread_id: int = None, suffix: str = None):
+        labels = [_frame_label(code) for code in stack]
+        if thread_id is not None and self.all_threads:
+            labels.insert(0, f"thread-{thread_id}")
+        if suffix:
+            labels.append(suffix)
+        if labels:
+            self.stacks[";".join(labels)] += 1
+
+    def folded(self) -> str:
+        return "\n".join(f"{stack} {count}" for stack, count in self.stacks.most_common()) + "\n"
+
+    def headers(self) -> dict:
+        return {
+            "X-Profile-Pid": str(os.getpid()),
+            "X-Profile-Samples": str(self.samples),
+            "X-Profile-Seconds": f"{self.duration:.3f}",
+        }
+
+
+def _loop_thread_id() -> int:
+    return threading.get_ident()
+
+
+def require_profiling_enabled():
+    if not settings.PROFILING_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Profiling is disabled.")
+
+
+async def profile_worker(seconds: float, interval_ms: Optional[float], all_threads: bool) -> StackSampler:
+    seconds = min(seconds, settings.PROFILING_MAX_SECONDS)
+    interval_ms = interval_ms or settings.PROFILING_INTERVAL_MS
+    sampler = StackSampler(interval_ms, _loop_thread_id(), all_threads=all_threads)
+    if not sampler.start():
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="A profile is already running on this worker.")
+    logger.warning(f"Sampling worker {os.getpid()} for {seconds}s every {interval_ms}ms.")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        sampler.stop()
+    return sampler
+
+
+def _wants_profile(scope) -> bool:
+    headers = dict(scope.get("headers") or [])
+    flagged = (
+        headers.get(b"x-profile", b"").lower() in (b"1", b"true")
+        or b"profile=1" in (scope.get("query_string") or b"").split(b"&")
+    )
+    if not flagged:
+        return False
+    authorization = headers.get(b"authorization", b"").decode("latin-1")
+    scheme, _, token = authorization.partition(" ")
+    # Non-admins get the normal response, as if the flag wasn't there.
+    return scheme.lower() == "bearer" and is_admin_token(token)
+
+
+class RequestProfilerMiddleware:
+    # Installed innermost so the route runs in the same task as this middleware and samples can be
+    # attributed to it. The response body is replaced by the folded profile.
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not _wants_profile(scope):
+            await self.app(scope, receive, send)
+            return
+
+        original = {}
+
+        async def capture(message):
+            if message["type"] == "http.response.start":
+                original["status"] = message["status"]
+
+        sampler = StackSampler(settings.PROFILING_INTERVAL_MS, _loop_thread_id(),
+                               task=asyncio.current_task(), loop=asyncio.get_running_loop())
+        if not sampler.start():
+            logger.info(f"Skipping profile of {scope['path']}: another profile is running on this worker.")
+            await self.app(scope, receive, send)
+            return
+        try:
+            await self.app(scope, receive, capture)
+        finally:
+            sampler.stop()
+
+        logger.info(f"Profiled {scope['method']} {scope['path']}: {sampler.samples} samples in {sampler.duration:.3f}s.")
+        body = sampler.folded().encode()
+        headers = [(k.lower().encode(), v.encode()) for k, v in sampler.headers().items()]
+        headers += [
+            (b"x-profile-status", str(original.get("status", 500)).encode()),
+            (b"content-type", b"text/plain; charset=utf-8"),
+            (b"content-length", str(len(body)).encode()),
+        ]
+        await send({"type": "http.response.start", "status": 200, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
+
+
+def register_memory_holder(name: str, getter: Callable[[], object]):
+    _memory_holders[name] = getter
+
+
+def deep_sizeof(obj, seen: set = None) -> int:
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    nbytes = getattr(obj, "nbytes", None)
+    if isinstance(nbytes, int):
+        return size + nbytes
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    return size
+
+
+def _holder_sizes() -> dict:
+    sizes = {}
+    for name, getter in _memory_holders.items():
+        try:
+            held = getter()
+            sizes[name] = {"objects": len(held) if hasattr(held, "__len__") else None, "bytes": deep_sizeof(held)}
+        except Exception as e:
+            sizes[name] = {"error": str(e)}
+    return sizes
+
+
+def start_memory_tracing(frames: int) -> dict:
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+        _last_snapshot = None
+        logger.warning(f"tracemalloc started on worker {os.getpid()} with {frames} frames.")
+    return {"pid": os.getpid(), "tracing": True, "frames": tracemalloc.get_traceback_limit()}
+
+
+def stop_memory_tracing() -> dict:
+    global _last_snapshot
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+        _last_snapshot = None
+        logger.warning(f"tracemalloc stopped on worker {os.getpid()}.")
+    return {"pid": os.getpid(), "tracing": False}
+
+
+def _stat_entry(stat) -> dict:
+    return {
+        "location": [f"{frame.filename}:{frame.lineno}" for frame in stat.traceback],
+        "bytes": stat.size,
+        "count": stat.count,
+    }
+
+
+def memory_report(top: int) -> dict:
+    global _last_snapshot
+    report = {"pid": os.getpid(), "tracing": tracemalloc.is_tracing(), "holders": _holder_sizes()}
+    if not tracemalloc.is_tracing():
+        return report
+
+    current, peak = tracemalloc.get_traced_memory()
+    snapshot = tracemalloc.take_snapshot().filter_traces([
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ])
+    report.update(traced_bytes=current, peak_bytes=peak, top=[
+        _stat_entry(stat) for stat in snapshot.statistics("traceback")[:top]
+    ])
+    if _last_snapshot is not None:
+        report["growth_since_last"] = [
+            {**_stat_entry(stat), "bytes_diff": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in snapshot.compare_to(_last_snapshot, "traceback")[:top]
+        ]
+    _last_snapshot = snapshot
+    return report
@@ -0,0 +1,121 @@
+import math
+import time
+import uuid
+from typing import Dict
+from fastapi import Depends, HTTPException, status
+from app.core.config import settings
+from app.db.client import redis_client
+from app.utils.metrics import register_metrics_source
+from app.utils.security import get_user_id_from_token
+from loguru import logger
+
+# Requests per rolling window, per user. Overridable per name through RATE_LIMITS.
+DEFAULT_LIMITS: Dict[str, dict] = {
+    "optimize_expenses": {"limit": 5, "window_seconds": 60},
+    "optimize_budget": {"limit": 5, "window_seconds": 60},
+    "optimize_debt": {"limit": 5, "window_seconds": 60},
+    "calculator_tips": {"limit": 20, "window_seconds": 60},
+    "debt_payoff_plan": {"limit": 30, "window_seconds": 60},
+    "chat_message": {"limit": 20, "window_seconds": 60},
+}
+
+_KEY = "ratelimit:{name}:{user_id}"
+
+# One sorted set per (name, user) holding the timestamps of accepted requests inside the window.
+# Trim, count, admit and compute the wait in a single round trip.
+_SLIDING_WINDOW_SCRIPT = """
+local now = tonumber(ARGV[1])
+local window = tonumber(ARGV[2])
+local limit = tonumber(ARGV[3])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+if count < limit then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {1, limit - count - 1, 0}
+end
+local oldest = redis.call('ZRANGE', KEYS[1], 0, 0, 'WITHSCORES')
+return {0, 0, tonumber(oldest[2]) + window - now}
+"""
+
+_limits: Dict[str, dict] = {}
+_stats: Dict[str, dict] = {}
+
+
+def _build_limits() -> Dict[str, dict]:
+    for name in settings.RATE_LIMITS:
+        if name not in DEFAULT_LIMITS:
+            logger.warning(f"RATE_LIMITS has an override for unknown limit '{name}'; ignoring it.")
+    return {name: {**default, **settings.RATE_LIMITS.get(name, {})} for name, default in DEFAULT_LIMITS.items()}
+
+
+def get_limit(name: str) -> dict:
+    if not _limits:
+        _limits.update(_build_limits())
+    return _limits[name]
+
+
+def _stats_for(name: str) -> dict:
+    if name not in _stats:
+        _stats[name] = {"allowed": 0, "limited": 0, "redis_errors": 0}
+    return _stats[name]
+
+
+async def check(name: str, user_id: str) -> int:
+    # Seconds until the next request would be accepted; 0 means this one is accepted.
+    rule = get_limit(name)
+    stats = _stats_for(name)
+    if not settings.RATE_LIMIT_ENABLED or rule["limit"] <= 0:
+        return 0
+
+    now_ms = int(time.time() * 1000)
+    try:
+        allowed, _, retry_after_ms = await redis_client.eval(
+            _SLIDING_WINDOW_SCRIPT, 1, _KEY.format(name=name, user_id=user_id),
+            now_ms, int(rule["window_seconds"] * 1000), rule["limit"], f"{now_ms}-{uuid.uuid4().hex[:8]}",
+        )
+    except Exception as e:
+        # Fail open: a Redis outage must not lock every user out.
+        stats["redis_errors"] += 1
+        logger.warning(f"Rate limit check '{name}' failed for {user_id}, allowing the request: {e}")
+        return 0
+
+    if int(allowed):
+        stats["allowed"] += 1
+        return 0
+    stats["limited"] += 1
+    logger.info(f"Rate limited {user_id} on '{name}' ({rule['limit']} per {rule['window_seconds']}s).")
+    return max(1, math.ceil(int(retry_after_ms) / 1000))
+
+
+def rate_limit(name: str):
+    get_limit(name)
+
+    async def dependency(user_id: str = Depends(get_user_id_from_token)):
+        retry_after = await check(name, user_id)
+        if retry_after:
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests, please slow down.",
+                headers={"Retry-After": str(retry_after)},
+            )
+
+    return dependency
+
+
+def rate_limited_frame(retry_after: int) -> dict:
+    return {
+        "type": "rate_limited",
+        "data": f"You're sending messages too quickly, please wait {retry_after} s.",
+        "retry_after": retry_after,
+    }
+
+
+def get_rate_limit_metrics() -> dict:
+    return {
+        name: {**rule, **_stats_for(name)}
+        for name, rule in (_limits or _build_limits()).items()
+    }
+
+
+register_metrics_source("rate_limits", get_rate_limit_metrics)
@@ -0,0 +1,40 @@
+import time
+from typing import Optional
+
+_state = {
+    "ready": False,
+    "reason": "starting",
+    "startup_seconds": None,
+    "last_check": None,
+    "last_check_at": 0.0,
+}
+
+
+def mark_ready(startup_seconds: float):
+    _state.update(ready=True, reason=None, startup_seconds=round(startup_seconds, 3))
+
+
+def mark_not_ready(reason: str):
+    _state.update(ready=False, reason=reason)
+
+
+def is_ready() -> bool:
+    return _state["ready"]
+
+
+def cached_check(max_age_seconds: float) -> Optional[dict]:
+    if _state["last_check"] is not None and time.monotonic() - _state["last_check_at"] < max_age_seconds:
+        return _state["last_check"]
+    return None
+
+
+def store_check(result: dict):
+    _state.update(last_check=result, last_check_at=time.monotonic())
+
+
+def get_state() -> dict:
+    return {
+        "ready": _state["ready"],
+        "reason": _state["reason"],
+        "startup_seconds": _state["startup_seconds"],
+    }
@@ -2,7 +2,6 @@ import asyncio
 from functools import wraps
 import logging
 from typing import Callable
-from openai import APIError, RateLimitError, APIConnectionError
 
 logger = logging.getLogger(__name__)
 
@@ -10,6 +9,8 @@ def retry_openai(max_retries: int = 3, initial_delay: float = 1):
     def decorator(func: Callable):
         @wraps(func)
         async def wrapper(*args, **kwargs):
+            from openai import APIError, RateLimitError, APIConnectionError
+
             delay = initial_delay
             last_exception = None
             
@@ -1,5 +1,6 @@
+import hmac
 import jwt
-from fastapi import Depends, HTTPException, status
+from fastapi import Depends, Header, HTTPException, status
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from app.core.config import settings
 
@@ -54,4 +55,25 @@ def require_admin_user(payload: dict = Depends(verify_token)) -> dict:
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Access denied: Administrator privileges required."
         )
-    return payload
\ No newline at end of file
+    return payload
+
+
+def is_admin_token(token: str) -> bool:
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        return False
+    return str(payload.get("role", "")).upper() == "ADMIN"
+
+
+def verify_scheduler_key(x_scheduler_key: str = Header(None)) -> None:
+    if not settings.SCHEDULER_API_KEY:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Scheduled job endpoints are disabled: SCHEDULER_API_KEY is not set."
+        )
+    if not x_scheduler_key or not hmac.compare_digest(x_scheduler_key, settings.SCHEDULER_API_KEY):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Invalid scheduler key"
+        )
\ No newline at end of file
@@ -0,0 +1,270 @@
+import asyncio
+import os
+import time
+import uuid
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+import orjson
+from app.core.config import settings
+from app.db.client import redis_client, redis_cache
+from app.utils.codec import encode_cache_value, decode_cache_value
+from app.utils.metrics import register_metrics_source
+from app.utils.profiling import register_memory_holder
+from loguru import logger
+
+# A per-worker LRU of encoded values in front of Redis. Writes and invalidations are broadcast so
+# every worker drops its copy; if the broadcast is missed, L1_TTL bounds how stale a worker can be.
+_CHANNEL = "cache_invalidation"
+# Identifies this worker's own broadcasts, which it has already applied.
+_ORIGIN = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+_MISSING = object()
+
+_caches: Dict[str, "TieredCache"] = {}
+_listener_task: Optional[asyncio.Task] = None
+_listener_stats = {"received": 0, "applied": 0, "publish_errors": 0, "reconnects": 0}
+
+
+class TieredCache:
+    def __init__(self, namespace: str, ttl_seconds: float, l1_ttl_seconds: float = None,
+                 l1_max_entries: int = None, l1_max_bytes: int = None):
+        self.namespace = namespace
+        self.ttl = ttl_seconds
+        self.l1_ttl = settings.CACHE_L1_TTL_SECONDS if l1_ttl_seconds is None else l1_ttl_seconds
+        self.l1_max_entries = settings.CACHE_L1_MAX_ENTRIES if l1_max_entries is None else l1_max_entries
+        self.l1_max_bytes = settings.CACHE_L1_MAX_BYTES if l1_max_bytes is None else l1_max_bytes
+        # key -> (expires_at, encoded value). Values stay encoded so callers never share a mutable object.
+        self._l1: "OrderedDict[str, tuple]" = OrderedDict()
+        self._l1_bytes = 0
+        self._loading: Dict[str, asyncio.Future] = {}
+        # Bumped by every invalidation; a load that started before one is not cached.
+        self._generation = 0
+        self._l1_stats = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0, "invalidations": 0}
+        self._l2_stats = {"hits": 0, "misses": 0, "errors": 0, "writes": 0, "bytes_written": 0}
+        _caches[namespace] = self
+
+    def _redis_key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    @property
+    def _l1_enabled(self) -> bool:
+        return self.l1_ttl > 0 and self.l1_max_entries > 0
+
+    def _l1_get(self, key: str):
+        entry = self._l1.get(key)
+        if entry is None:
+            self._l1_stats["misses"] += 1
+            return _MISSING
+        if entry[0] <= time.monotonic():
+            self._l1_drop(key)
+            self._l1_stats["expired"] += 1
+            self._l1_stats["misses"] += 1
+            return _MISSING
+        self._l1.move_to_end(key)
+        self._l1_stats["hits"] += 1
+        return entry[1]
+
+    def _l1_put(self, key: str, raw: bytes):
+        if not self._l1_enabled or len(raw) > self.l1_max_bytes:
+            return
+        self._l1_drop(key)
+        self._l1[key] = (time.monotonic() + self.l1_ttl, raw)
+        self._l1_bytes += len(raw)
+        while len(self._l1) > self.l1_max_entries or self._l1_bytes > self.l1_max_bytes:
+            _, (_, evicted) = self._l1.popitem(last=False)
+            self._l1_bytes -= len(evicted)
+            self._l1_stats["evictions"] += 1
+
+    def _l1_drop(self, key: str) -> bool:
+        entry = self._l1.pop(key, None)
+        if entry is None:
+            return False
+        self._l1_bytes -= len(entry[1])
+        return True
+
+    def drop_local(self, keys: Iterable[str]):
+        self._generation += 1
+        for key in keys:
+            if self._l1_drop(key):
+                self._l1_stats["invalidations"] += 1
+
+    async def _l2_get(self, key: str):
+        try:
+            raw = await redis_cache.get(self._redis_key(key))
+        except Exception as e:
+            self._l2_stats["errors"] += 1
+            logger.warning(f"Cache read {self._redis_key(key)} failed: {e}")
+            return _MISSING
+        if raw is None:
+            self._l2_stats["misses"] += 1
+            return _MISSING
+        self._l2_stats["hits"] += 1
+        return raw
+
+    async def _l2_put(self, key: str, raw: bytes):
+        try:
+            await redis_cache.set(self._redis_key(key), raw, ex=int(self.ttl))
+            self._l2_stats["writes"] += 1
+            self._l2_stats["bytes_written"] += len(raw)
+        except Exception as e:
+            self._l2_stats["errors"] += 1
+            logger.warning(f"Cache write {self._redis_key(key)} failed: {e}")
+
+    async def _lookup(self, key: str):
+        raw = self._l1_get(key)
+        if raw is _MISSING:
+            raw = await self._l2_get(key)
+            if raw is _MISSING:
+                return _MISSING
+            self._l1_put(key, raw)
+        return decode_cache_value(raw)
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable]):
+        # None is cached like any other value, so users without a report don't go to Mongo every time.
+        value = await self._lookup(key)
+        if value is not _MISSING:
+            return value
+
+        pending = self._loading.get(key)
+        if pending is not None:
+            try:
+                return decode_cache_value(await asyncio.shield(pending))
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The caller that was loading it went away; load it ourselves.
+                return await self.get_or_load(key, loader)
+
+        future = asyncio.get_running_loop().create_future()
+        self._loading[key] = future
+        generation = self._generation
+        try:
+            raw = encode_cache_value(await loader())
+            if generation == self._generation:
+                self._l1_put(key, raw)
+                await self._l2_put(key, raw)
+            future.set_result(raw)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Retrieved here so a load nobody else waited on doesn't log "exception never retrieved".
+            future.exception()
+            raise
+        finally:
+            self._loading.pop(key, None)
+        return decode_cache_value(raw)
+
+    async def set(self, key: str, value):
+        raw = encode_cache_value(value)
+        self.drop_local([key])
+        self._l1_put(key, raw)
+        await self._l2_put(key, raw)
+        await _broadcast(self.namespace, [key])
+
+    async def invalidate(self, *keys: str):
+        if not keys:
+            return
+        self.drop_local(keys)
+        try:
+            await redis_cache.delete(*(self._redis_key(key) for key in keys))
+        except Exception as e:
+            self._l2_stats["errors"] += 1
+            logger.warning(f"Cache invalidation of {len(keys)} {self.namespace} keys failed: {e}")
+        await _broadcast(self.namespace, list(keys))
+
+    def l1_entries(self) -> dict:
+        return self._l1
+
+    def stats(self) -> dict:
+        def ratio(tier: dict) -> float:
+            lookups = tier["hits"] + tier["misses"]
+            return round(tier["hits"] / lookups, 4) if lookups else 0.0
+
+        writes = self._l2_stats["writes"]
+        return {
+            "l1": {
+                **self._l1_stats,
+                "hit_ratio": ratio(self._l1_stats),
+                "entries": len(self._l1),
+                "bytes": self._l1_bytes,
+                "max_entries": self.l1_max_entries,
+                "max_bytes": self.l1_max_bytes,
+            },
+            "l2": {
+                **self._l2_stats,
+                "hit_ratio": ratio(self._l2_stats),
+                # Redis memory can't be split per namespace; the average entry size is the closest proxy.
+                "avg_value_bytes": round(self._l2_stats["bytes_written"] / writes) if writes else 0,
+            },
+        }
+
+
+async def _broadcast(namespace: str, keys: list):
+    try:
+        await redis_client.publish(_CHANNEL, orjson.dumps({"ns": namespace, "keys": keys, "origin": _ORIGIN}).decode())
+    except Exception as e:
+        _listener_stats["publish_errors"] += 1
+        logger.warning(f"Failed to broadcast invalidation of {len(keys)} {namespace} keys: {e}")
+
+
+def _apply(message: dict):
+    _listener_stats["received"] += 1
+    if message.get("origin") == _ORIGIN:
+        return
+    cache = _caches.get(message.get("ns"))
+    if cache is not None:
+        cache.drop_local(message.get("keys") or [])
+        _listener_stats["applied"] += 1
+
+
+def _drop_all_local():
+    for cache in _caches.values():
+        cache.drop_local(list(cache.l1_entries()))
+
+
+async def _listen_forever():
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.subscribe(_CHANNEL)
+            # Anything broadcast while unsubscribed was missed, so start from an empty L1.
+            _drop_all_local()
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message["type"] != "message":
+                    continue
+                _apply(orjson.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            _listener_stats["reconnects"] += 1
+            logger.warning(f"Cache invalidation listener lost its Redis subscription: {e}. Reconnecting in 2s.")
+            await asyncio.sleep(2)
+        finally:
+            await pubsub.aclose()
+
+
+def start_invalidation_listener():
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(_listen_forever())
+
+
+async def stop_invalidation_listener():
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        await asyncio.gather(_listener_task, return_exceptions=True)
+        _listener_task = None
+
+
+def get_cache_metrics() -> dict:
+    return {
+        "listener": {"running": _listener_task is not None and not _listener_task.done(), **_listener_stats},
+        **{namespace: cache.stats() for namespace, cache in _caches.items()},
+    }
+
+
+register_metrics_source("tiered_cache", get_cache_metrics)
+register_memory_holder("tiered_cache_l1", lambda: {ns: cache.l1_entries() for ns, cache in _caches.items()})
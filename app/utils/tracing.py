@@ -0,0 +1,163 @@
+import inspect
+import json
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from pathlib import Path
+import sentry_sdk
+from sentry_sdk.transport import Transport
+from sentry_sdk.worker import BackgroundWorker
+from app.core.config import settings
+from loguru import logger
+
+
+class FileTraceTransport(Transport):
+    # Writes each finished transaction as one JSON line: the root plus its spans in start order,
+    # with offsets relative to the root so the critical path can be read straight off the file.
+    def __init__(self, options=None):
+        super().__init__(options)
+        self._path = Path(settings.TRACING_FILE_PATH)
+        self._path.parent.mkdir(parents=True, exist_ok=True)
+        # File writes happen on Sentry's worker thread, never on the event loop.
+        self._worker = BackgroundWorker()
+
+    def capture_envelope(self, envelope):
+        events = [
+            item.payload.json for item in envelope.items
+            if item.headers.get("type") == "transaction" and item.payload.json is not None
+        ]
+        if events:
+            self._worker.submit(lambda: self._write(events))
+
+    def _write(self, events):
+        with self._path.open("a", encoding="utf-8") as trace_file:
+            for event in events:
+                trace_file.write(json.dumps(_summarise_transaction(event), default=str) + "\n")
+
+    def flush(self, timeout, callback=None):
+        self._worker.flush(timeout, callback)
+
+    def kill(self):
+        self._worker.kill()
+
+
+def _seconds(value) -> float:
+    # Events carry ISO-8601 strings once serialised, datetimes before.
+    if isinstance(value, str):
+        value = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return float(value or 0)
+
+
+def _ms(seconds: float) -> float:
+    return round(seconds * 1000, 3)
+
+
+def _summarise_transaction(event: dict) -> dict:
+    started = _seconds(event.get("start_timestamp"))
+    trace = (event.get("contexts") or {}).get("trace") or {}
+
+    spans = sorted(event.get("spans") or [], key=lambda s: _seconds(s.get("start_timestamp")))
+    return {
+        "trace_id": trace.get("trace_id"),
+        "transaction": event.get("transaction"),
+        "op": trace.get("op"),
+        "status": trace.get("status"),
+        "started_at": started,
+        "duration_ms": _ms(_seconds(event.get("timestamp")) - started),
+        "tags": event.get("tags") or {},
+        "spans": [
+            {
+                "span_id": span.get("span_id"),
+                "parent_span_id": span.get("parent_span_id"),
+                "op": span.get("op"),
+                "description": span.get("description"),
+                "offset_ms": _ms(_seconds(span.get("start_timestamp")) - started),
+                "duration_ms": _ms(_seconds(span.get("timestamp")) - _seconds(span.get("start_timestamp"))),
+                "status": span.get("status"),
+                "data": {k: v for k, v in (span.get("data") or {}).items() if not k.startswith("thread.")},
+            }
+            for span in spans
+        ],
+    }
+
+
+def _traces_sampler(sampling_context: dict) -> float:
+    # A WebSocket transaction would last as long as the socket; chat turns get their own instead.
+    if (sampling_context.get("transaction_context") or {}).get("op") == "websocket.server":
+        return 0.0
+    return settings.TRACING_SAMPLE_RATE
+
+
+def init_tracing():
+    exporter = settings.TRACING_EXPORTER
+    if exporter == "none":
+        return
+
+    from sentry_sdk.integrations.fastapi import FastApiIntegration
+    from sentry_sdk.integrations.starlette import StarletteIntegration
+    from sentry_sdk.integrations.pymongo import PyMongoIntegration
+    from sentry_sdk.integrations.redis import RedisIntegration
+    from sentry_sdk.integrations.openai import OpenAIIntegration
+
+    options = {
+        "traces_sampler": _traces_sampler,
+        "send_default_pii": False,
+        "environment": settings.TRACING_ENVIRONMENT,
+        "integrations": [
+            StarletteIntegration(transaction_style="endpoint"),
+            FastApiIntegration(transaction_style="endpoint"),
+            PyMongoIntegration(),
+            RedisIntegration(),
+        ],
+        # OpenAI calls are wrapped by llm_span so structured-output calls are covered too.
+        "disabled_integrations": [OpenAIIntegration()],
+    }
+    if exporter == "file":
+        options["transport"] = FileTraceTransport()
+    else:
+        options["dsn"] = settings.SENTRY_DSN
+
+    sentry_sdk.init(**options)
+    target = settings.TRACING_FILE_PATH if exporter == "file" else "Sentry DSN"
+    logger.info(f"Tracing enabled ({exporter} exporter -> {target}, sample rate {settings.TRACING_SAMPLE_RATE}).")
+
+
+def traced(op: str):
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            with sentry_sdk.start_span(op=op, name=func.__name__):
+                return func(*args, **kwargs)
+
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            with sentry_sdk.start_span(op=op, name=func.__name__):
+                return await func(*args, **kwargs)
+
+        return async_wrapper if inspect.iscoroutinefunction(func) else wrapper
+    return decorator
+
+
+def chat_turn_transaction(conversation_id: str):
+    transaction = sentry_sdk.start_transaction(op="chat.turn", name="/chat/ws turn")
+    transaction.set_tag("conversation_id", conversation_id)
+    return transaction
+
+
+@contextmanager
+def llm_span(name: str, model: str):
+    with sentry_sdk.start_span(op="gen_ai.chat", name=name) as span:
+        span.set_data("gen_ai.request.model", model)
+        yield span
+
+
+def record_llm_usage(span, response):
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return
+    span.set_data("gen_ai.response.model", getattr(response, "model", None))
+    span.set_data("gen_ai.usage.input_tokens", usage.prompt_tokens)
+    span.set_data("gen_ai.usage.output_tokens", usage.completion_tokens)
+    span.set_data("gen_ai.usage.total_tokens", usage.total_tokens)
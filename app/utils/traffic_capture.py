@@ -0,0 +1,308 @@
+import asyncio
+import hashlib
+import hmac
+import random
+import re
+import time
+from collections import deque
+from pathlib import Path
+from typing import Optional
+from urllib.parse import parse_qsl
+import jwt
+import orjson
+from app.core.config import settings
+from app.utils.codec import unpackb
+from app.utils.metrics import register_metrics_source
+from loguru import logger
+
+# Sampled REST calls and chat sessions, one JSON line each, for tools/replay.py. Nothing personal is
+# written: ids become keyed pseudonyms (stable across workers, so a user's calls still line up),
+# free text keeps only its length, and tokens are reduced to the pseudonymous user and role.
+_KEY = hmac.new(settings.JWT_SECRET.encode(), b"traffic-capture", hashlib.sha256).digest()
+_OBJECT_ID = re.compile(r"\b[0-9a-fA-F]{24}\b")
+_EMAIL = re.compile(r"[\w.+-]+@[\w-]+\.[\w.-]+")
+_TEXT_KEYS = {
+    "message", "content", "name", "email", "phone", "title", "description", "note", "notes",
+    "address", "comment", "feedback", "prompt", "text",
+}
+_TOKEN_KEYS = {"token", "access_token"}
+_SKIPPED_PATHS = {"/health", "/ready"}
+# Server frames that end a chat turn.
+_TERMINAL_FRAMES = {"status", "error", "rate_limited", "busy", "reconnect"}
+_FILLER = "lorem ipsum dolor sit amet "
+_MAX_BODY_BYTES = 64 * 1024
+
+_buffer: deque = deque()
+_task: Optional[asyncio.Task] = None
+_stats = {"sampled_http": 0, "sampled_ws": 0, "written": 0, "dropped": 0, "write_errors": 0}
+
+
+def pseudonym(value: str) -> str:
+    # ObjectId-shaped, so routes that validate ids still accept it on replay.
+    return hmac.new(_KEY, str(value).lower().encode(), hashlib.sha256).hexdigest()[:24]
+
+
+def _filler(length: int) -> str:
+    return (_FILLER * (length // len(_FILLER) + 1))[:length]
+
+
+def _scrub_text(text: str) -> str:
+    text = _OBJECT_ID.sub(lambda m: pseudonym(m.group()), text)
+    return _EMAIL.sub("user@example.invalid", text)
+
+
+def _is_id_key(key: Optional[str]) -> bool:
+    return bool(key) and (key == "id" or key.endswith("Id") or key.lower().endswith("_id"))
+
+
+def scrub(value, key: str = None):
+    if isinstance(value, dict):
+        return {k: scrub(v, k) for k, v in value.items()}
+    if isinstance(value, list):
+        return [scrub(v, key) for v in value]
+    if not isinstance(value, str):
+        return value
+    if key and key.lower() in _TEXT_KEYS:
+        return _filler(len(value))
+    if _is_id_key(key):
+        return pseudonym(value)
+    return _scrub_text(value)
+
+
+def _scrub_query(query_string: bytes) -> list:
+    pairs = []
+    for key, value in parse_qsl(query_string.decode("latin-1"), keep_blank_values=True):
+        if key not in _TOKEN_KEYS:
+            pairs.append([key, scrub(value, key)])
+    return pairs
+
+
+def _scrub_path(scope) -> str:
+    path = _scrub_text(scope["path"])
+    for name, value in (scope.get("path_params") or {}).items():
+        # ObjectIds were replaced above; this catches conversation ids and other free-form ids.
+        if _is_id_key(name) and isinstance(value, str) and value and not _OBJECT_ID.fullmatch(value):
+            path = path.replace(value, pseudonym(value))
+    return path
+
+
+def _identity(scope) -> Optional[dict]:
+    headers = dict(scope.get("headers") or [])
+    scheme, _, token = headers.get(b"authorization", b"").decode("latin-1").partition(" ")
+    if scheme.lower() != "bearer":
+        token = dict(parse_qsl((scope.get("query_string") or b"").decode("latin-1"))).get("token", "")
+    if not token:
+        return None
+    try:
+        payload = jwt.decode(token, settings.JWT_SECRET, algorithms=[settings.JWT_ALGORITHM])
+    except jwt.InvalidTokenError:
+        return {"invalid": True}
+    user_id = payload.get("user_id") or payload.get("id")
+    return {"user": pseudonym(user_id) if user_id else None, "role": payload.get("role")}
+
+
+def _parse_frame(text: str):
+    try:
+        return orjson.loads(text)
+    except orjson.JSONDecodeError:
+        return None
+
+
+def _ws_payload(message: dict) -> tuple:
+    # (decoded frame or None, size); binary frames are the msgpack chat protocol.
+    if message.get("bytes") is not None:
+        try:
+            return unpackb(message["bytes"]), len(message["bytes"])
+        except Exception:
+            return None, len(message["bytes"])
+    text = message.get("text") or ""
+    return _parse_frame(text) if text else None, len(text)
+
+
+def _ms(since: float) -> float:
+    return round((time.perf_counter() - since) * 1000, 3)
+
+
+def _record(entry: dict):
+    if len(_buffer) >= settings.TRAFFIC_CAPTURE_MAX_BUFFER:
+        _stats["dropped"] += 1
+        return
+    _buffer.append(entry)
+
+
+class TrafficCaptureMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] not in ("http", "websocket")
+            or scope["path"] in _SKIPPED_PATHS
+            or random.random() >= settings.TRAFFIC_CAPTURE_SAMPLE_RATE
+        ):
+            await self.app(scope, receive, send)
+            return
+        if scope["type"] == "http":
+            await self._capture_http(scope, receive, send)
+        else:
+            await self._capture_websocket(scope, receive, send)
+
+    def _base(self, scope, kind: str) -> dict:
+        headers = dict(scope.get("headers") or [])
+        return {
+            "kind": kind,
+            "ts": round(time.time(), 6),
+            "method": scope.get("method", "GET"),
+            "auth": _identity(scope),
+            "scheduler": b"x-scheduler-key" in headers,
+            "query": _scrub_query(scope.get("query_string") or b""),
+        }
+
+    def _finish(self, entry: dict, scope):
+        entry["path"] = _scrub_path(scope)
+        entry["route"] = getattr(scope.get("route"), "path", None)
+        _record(entry)
+
+    async def _capture_http(self, scope, receive, send):
+        entry = self._base(scope, "http")
+        body = bytearray()
+        response = {"status": None, "bytes": 0, "stream": False}
+        started = time.perf_counter()
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "http.request" and len(body) < _MAX_BODY_BYTES:
+                body.extend(message.get("body", b""))
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "http.response.start":
+                response["status"] = message["status"]
+                content_type = dict(message.get("headers") or []).get(b"content-type", b"")
+                response["stream"] = content_type.startswith(b"text/event-stream")
+            elif message["type"] == "http.response.body":
+                response["bytes"] += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            parsed = _parse_frame(bytes(body)) if body else None
+            entry.update(
+                body=scrub(parsed) if parsed is not None else None,
+                requestBytes=len(body),
+                status=response["status"] or 500,
+                responseBytes=response["bytes"],
+                stream=response["stream"],
+                durationMs=_ms(started),
+            )
+            self._finish(entry, scope)
+            _stats["sampled_http"] += 1
+
+    async def _capture_websocket(self, scope, receive, send):
+        entry = self._base(scope, "ws")
+        frames = []
+        session = {"acceptMs": None, "firstFrameMs": None, "framesOut": 0, "closeCode": None, "subprotocol": None}
+        pending = {}
+        started = time.perf_counter()
+
+        async def capture_receive():
+            message = await receive()
+            if message["type"] == "websocket.receive":
+                parsed, size = _ws_payload(message)
+                frame = {
+                    "at": _ms(started),
+                    "frame": scrub(parsed, "message") if parsed is not None else {"text": _filler(size)},
+                    "replyMs": None,
+                    "doneMs": None,
+                    "outcome": None,
+                }
+                frames.append(frame)
+                pending["frame"], pending["at"] = frame, time.perf_counter()
+            elif message["type"] == "websocket.disconnect":
+                session["closeCode"] = session["closeCode"] or message.get("code")
+            return message
+
+        async def capture_send(message):
+            if message["type"] == "websocket.accept":
+                session["acceptMs"] = _ms(started)
+                session["subprotocol"] = message.get("subprotocol")
+            elif message["type"] == "websocket.send":
+                session["framesOut"] += 1
+                if session["firstFrameMs"] is None:
+                    session["firstFrameMs"] = _ms(started)
+                frame = pending.get("frame")
+                if frame is not None:
+                    sent, _ = _ws_payload(message)
+                    kind = sent.get("type") if isinstance(sent, dict) else None
+                    if frame["replyMs"] is None:
+                        frame["replyMs"] = _ms(pending["at"])
+                    if kind in _TERMINAL_FRAMES:
+                        frame["doneMs"] = _ms(pending["at"])
+                        frame["outcome"] = sent.get("data") if kind == "status" else kind
+                        pending.clear()
+            elif message["type"] == "websocket.close":
+                session["closeCode"] = message.get("code", 1000)
+            await send(message)
+
+        try:
+            await self.app(scope, capture_receive, capture_send)
+        finally:
+            entry.update(session, frames=frames, durationMs=_ms(started))
+            self._finish(entry, scope)
+            _stats["sampled_ws"] += 1
+
+
+def _write(lines: list):
+    path = Path(settings.TRAFFIC_CAPTURE_PATH)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    with path.open("ab") as capture_file:
+        capture_file.write(b"".join(lines))
+
+
+async def flush():
+    if not _buffer:
+        return
+    lines = []
+    while _buffer:
+        lines.append(orjson.dumps(_buffer.popleft()) + b"\n")
+    try:
+        # File writes stay off the event loop.
+        await asyncio.to_thread(_write, lines)
+        _stats["written"] += len(lines)
+    except Exception as e:
+        _stats["write_errors"] += 1
+        logger.warning(f"Writing {len(lines)} captured requests to {settings.TRAFFIC_CAPTURE_PATH} failed: {e}")
+
+
+async def _flush_forever():
+    while True:
+        await asyncio.sleep(1.0)
+        await flush()
+
+
+def start_traffic_capture():
+    global _task
+    if not settings.TRAFFIC_CAPTURE_ENABLED:
+        return
+    if _task is None or _task.done():
+        logger.warning(
+            f"Capturing {settings.TRAFFIC_CAPTURE_SAMPLE_RATE:.1%} of traffic to {settings.TRAFFIC_CAPTURE_PATH}."
+        )
+        _task = asyncio.create_task(_flush_forever())
+
+
+async def stop_traffic_capture():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    await flush()
+
+
+def get_capture_metrics() -> dict:
+    return {"enabled": settings.TRAFFIC_CAPTURE_ENABLED, "buffered": len(_buffer), **_stats}
+
+
+register_metrics_source("traffic_capture", get_capture_metrics)
@@ -0,0 +1,215 @@
+import asyncio
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Dict, Optional
+from app.core.config import settings
+from app.db.client import redis_client
+from app.db import queries as db_queries
+from app.utils.metrics import register_metrics_source
+from loguru import logger
+
+# Token usage per (day, user, feature, model). Calls are summed in memory, flushed to Redis hashes
+# every LLM_USAGE_FLUSH_SECONDS and rolled up into Mongo by whichever worker holds the rollup lock.
+# The batch API bills half the real-time price.
+_BATCH_DISCOUNT = 0.5
+_NO_USER = "-"
+_HASH_PREFIX = "llm_usage:"
+_DIRTY_KEY = "llm_usage:dirty"
+_ROLLUP_LOCK = "llm_usage:rollup_lock"
+_ROLLUP_CHUNK = 500
+
+# Read and clear a set of hashes in one step, so increments landing during a rollup are never lost.
+_TAKE_SCRIPT = """
+local out = {}
+for i, key in ipairs(KEYS) do
+    out[i] = redis.call('HGETALL', key)
+    redis.call('DEL', key)
+end
+return out
+"""
+
+_attribution: ContextVar[dict] = ContextVar("llm_usage_attribution", default={})
+_pending: Dict[tuple, Dict[str, float]] = {}
+_totals: Dict[str, Dict[str, float]] = {}
+_stats = {"flushes": 0, "flush_errors": 0, "rollups": 0, "rollup_errors": 0, "rolled_up_rows": 0}
+_task: Optional[asyncio.Task] = None
+
+
+@contextmanager
+def attribute_usage(user_id: str = None, feature: str = None):
+    # Calls made inside the block (and in tasks it creates) are billed to this user and feature.
+    current = dict(_attribution.get())
+    if user_id is not None:
+        current["user_id"] = user_id
+    if feature is not None:
+        current["feature"] = feature
+    token = _attribution.set(current)
+    try:
+        yield
+    finally:
+        _attribution.reset(token)
+
+
+def _cost_micros(model: str, prompt: int, cached: int, completion: int) -> float:
+    # LLM_PRICING is USD per million tokens, so tokens x price is micro-dollars.
+    price = settings.LLM_PRICING.get(model)
+    if not price:
+        return 0.0
+    cached_price = price.get("cached_input", price.get("input", 0.0))
+    return (prompt - cached) * price.get("input", 0.0) + cached * cached_price + completion * price.get("output", 0.0)
+
+
+def _add(bucket: Dict[str, float], counters: Dict[str, float]):
+    for name, value in counters.items():
+        bucket[name] = bucket.get(name, 0) + value
+
+
+def _usage_value(obj, name):
+    if obj is None:
+        return None
+    return obj.get(name) if isinstance(obj, dict) else getattr(obj, name, None)
+
+
+def record_usage(task: str, model: str, usage=None, latency_ms: float = 0.0, error: bool = False,
+                 user_id: str = None, feature: str = None, batch: bool = False):
+    # usage is the provider's usage object or the equivalent dict from a batch result line.
+    attribution = _attribution.get()
+    user_id = user_id or attribution.get("user_id") or _NO_USER
+    feature = feature or attribution.get("feature") or task
+
+    prompt = _usage_value(usage, "prompt_tokens") or 0
+    completion = _usage_value(usage, "completion_tokens") or 0
+    cached = _usage_value(_usage_value(usage, "prompt_tokens_details"), "cached_tokens") or 0
+    cost = _cost_micros(model, prompt, cached, completion) * (_BATCH_DISCOUNT if batch else 1.0)
+
+    counters = {
+        "calls": 1,
+        "errors": 1 if error else 0,
+        "promptTokens": prompt,
+        "cachedTokens": cached,
+        "completionTokens": completion,
+        "totalTokens": _usage_value(usage, "total_tokens") or prompt + completion,
+        "latencyMs": round(latency_ms),
+        "costMicros": round(cost),
+    }
+    day = datetime.now(timezone.utc).strftime("%Y-%m-%d")
+    _add(_pending.setdefault((day, user_id, feature, model), {}), counters)
+    _add(_totals.setdefault(feature, {}), counters)
+
+
+def _hash_key(day: str, user_id: str, feature: str, model: str) -> str:
+    return f"{_HASH_PREFIX}{day}|{user_id}|{feature}|{model}"
+
+
+async def flush():
+    global _pending
+    if not _pending:
+        return
+    pending, _pending = _pending, {}
+    # MULTI so a rollup never sees the increments without the dirty marker, or the other way round.
+    pipe = redis_client.pipeline(transaction=True)
+    for key, counters in pending.items():
+        hash_key = _hash_key(*key)
+        for name, value in counters.items():
+            if value:
+                pipe.hincrby(hash_key, name, int(value))
+        pipe.sadd(_DIRTY_KEY, hash_key)
+    try:
+        await pipe.execute()
+        _stats["flushes"] += 1
+    except Exception as e:
+        _stats["flush_errors"] += 1
+        logger.warning(f"Flushing token usage for {len(pending)} keys failed, keeping it for the next flush: {e}")
+        for key, counters in pending.items():
+            _add(_pending.setdefault(key, {}), counters)
+
+
+def _parse_row(hash_key: str, flat: list) -> Optional[dict]:
+    if not flat:
+        return None
+    day, user_id, feature, model = hash_key[len(_HASH_PREFIX):].split("|", 3)
+    counters = {flat[i]: int(flat[i + 1]) for i in range(0, len(flat), 2)}
+    return {"day": day, "userId": None if user_id == _NO_USER else user_id, "feature": feature, "model": model, "counters": counters}
+
+
+async def _restore(rows: list):
+    pipe = redis_client.pipeline(transaction=True)
+    for row in rows:
+        hash_key = _hash_key(row["day"], row["userId"] or _NO_USER, row["feature"], row["model"])
+        for name, value in row["counters"].items():
+            pipe.hincrby(hash_key, name, value)
+        pipe.sadd(_DIRTY_KEY, hash_key)
+    await pipe.execute()
+
+
+async def rollup() -> int:
+    token = uuid.uuid4().hex
+    if not await redis_client.set(_ROLLUP_LOCK, token, nx=True, ex=max(60, int(settings.LLM_USAGE_ROLLUP_SECONDS))):
+        return 0
+    rolled = 0
+    try:
+        while True:
+            keys = await redis_client.spop(_DIRTY_KEY, _ROLLUP_CHUNK)
+            if not keys:
+                break
+            try:
+                values = await redis_client.eval(_TAKE_SCRIPT, len(keys), *keys)
+            except Exception:
+                await redis_client.sadd(_DIRTY_KEY, *keys)
+                raise
+            rows = [row for row in (_parse_row(k, v) for k, v in zip(keys, values)) if row]
+            try:
+                await db_queries.save_usage_rollup(rows)
+            except Exception:
+                # Put the counts back so the next rollup retries them.
+                await _restore(rows)
+                raise
+            rolled += len(rows)
+    finally:
+        if await redis_client.get(_ROLLUP_LOCK) == token:
+            await redis_client.delete(_ROLLUP_LOCK)
+    _stats["rollups"] += 1
+    _stats["rolled_up_rows"] += rolled
+    return rolled
+
+
+async def _run_forever():
+    last_rollup = time.monotonic()
+    while True:
+        await asyncio.sleep(settings.LLM_USAGE_FLUSH_SECONDS)
+        await flush()
+        if time.monotonic() - last_rollup >= settings.LLM_USAGE_ROLLUP_SECONDS:
+            last_rollup = time.monotonic()
+            try:
+                rolled = await rollup()
+                if rolled:
+                    logger.info(f"Rolled up {rolled} token usage rows into Mongo.")
+            except Exception as e:
+                _stats["rollup_errors"] += 1
+                logger.warning(f"Token usage rollup failed: {e}")
+
+
+def start_usage_ledger():
+    global _task
+    if _task is None or _task.done():
+        _task = asyncio.create_task(_run_forever())
+
+
+async def stop_usage_ledger():
+    global _task
+    if _task is not None:
+        _task.cancel()
+        await asyncio.gather(_task, return_exceptions=True)
+        _task = None
+    # Whatever this worker counted since the last flush goes to Redis; another worker rolls it up.
+    await flush()
+
+
+def get_usage_metrics() -> dict:
+    return {"pending_keys": len(_pending), **_stats, "since_start": {f: dict(c) for f, c in _totals.items()}}
+
+
+register_metrics_source("llm_usage", get_usage_metrics)
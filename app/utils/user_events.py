@@ -0,0 +1,75 @@
+import asyncio
+from typing import Awaitable, Callable, Dict, Optional, Set
+import orjson
+from app.db.client import redis_client
+from loguru import logger
+
+# Events for a user are published once and every worker forwards them to that user's local sockets.
+_CHANNEL_PREFIX = "user_events:"
+
+_subscribers: Dict[str, Set[Callable[[dict], Awaitable]]] = {}
+_listener_task: Optional[asyncio.Task] = None
+
+
+def subscribe(user_id: str, callback: Callable[[dict], Awaitable]) -> Callable[[], None]:
+    _subscribers.setdefault(user_id, set()).add(callback)
+
+    def unsubscribe():
+        callbacks = _subscribers.get(user_id)
+        if callbacks is not None:
+            callbacks.discard(callback)
+            if not callbacks:
+                _subscribers.pop(user_id, None)
+
+    return unsubscribe
+
+
+async def publish(user_id: str, event: dict):
+    try:
+        await redis_client.publish(f"{_CHANNEL_PREFIX}{user_id}", orjson.dumps(event).decode())
+    except Exception as e:
+        logger.warning(f"Failed to publish {event.get('type')} event for {user_id}: {e}")
+
+
+async def _dispatch(user_id: str, event: dict):
+    for callback in list(_subscribers.get(user_id, ())):
+        try:
+            await callback(event)
+        except Exception as e:
+            logger.debug(f"Dropping {event.get('type')} event for {user_id}: {e}")
+
+
+async def _listen_forever():
+    while True:
+        pubsub = redis_client.pubsub()
+        try:
+            await pubsub.psubscribe(f"{_CHANNEL_PREFIX}*")
+            while True:
+                # A short poll instead of listen() so idle periods never hit the socket timeout.
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is None or message["type"] != "pmessage":
+                    continue
+                user_id = message["channel"][len(_CHANNEL_PREFIX):]
+                if user_id in _subscribers:
+                    await _dispatch(user_id, orjson.loads(message["data"]))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning(f"User event listener lost its Redis subscription: {e}. Reconnecting in 2s.")
+            await asyncio.sleep(2)
+        finally:
+            await pubsub.aclose()
+
+
+def start_user_events():
+    global _listener_task
+    if _listener_task is None or _listener_task.done():
+        _listener_task = asyncio.create_task(_listen_forever())
+
+
+async def stop_user_events():
+    global _listener_task
+    if _listener_task is not None:
+        _listener_task.cancel()
+        await asyncio.gather(_listener_task, return_exceptions=True)
+        _listener_task = None
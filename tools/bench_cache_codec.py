@@ -0,0 +1,113 @@
+"""
+Compares the legacy summary cache path (recursive _serialize_mongo_doc + json text)
+against app.utils.codec for each codec, reporting CPU per request and stored bytes.
+
+    python -m tools.bench_cache_codec --debts 50 --expenses 400
+    python -m tools.bench_cache_codec --redis-url redis://localhost:6379/0   # adds MEMORY USAGE
+"""
+import argparse
+import json
+import os
+import random
+import time
+from datetime import date, datetime, timedelta, timezone
+
+from bson import ObjectId
+
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "sk-benchmark-placeholder-key")
+os.environ.setdefault("JWT_SECRET", "benchmark-placeholder-secret")
+os.environ.setdefault("API_BASE_URL", "http://localhost:8000")
+
+from app.core.config import settings  # noqa: E402
+from app.utils import codec  # noqa: E402
+
+
+def legacy_serialize(obj):
+    if obj is None:
+        return None
+    if isinstance(obj, list):
+        return [legacy_serialize(item) for item in obj]
+    if isinstance(obj, dict):
+        return {k: legacy_serialize(v) for k, v in obj.items()}
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    return obj
+
+
+def make_summary(n_incomes: int, n_expenses: int, n_debts: int, n_goals: int) -> dict:
+    rng = random.Random(7)
+    now = datetime.now(timezone.utc)
+    categories = ["Food", "Transport", "Shopping", "Utility Bills", "Entertainment", "Others"]
+
+    def _doc(**fields):
+        return {"_id": ObjectId(), "userId": ObjectId(), "createdAt": now - timedelta(days=rng.randint(0, 365)), **fields}
+
+    return {
+        "name": "Benchmark User",
+        "incomes": [_doc(name=f"Income {i}", amount=round(rng.uniform(100, 5000), 2), frequency="monthly") for i in range(n_incomes)],
+        "expenses": [_doc(name=f"Expense {i}", amount=round(rng.uniform(5, 800), 2), frequency="monthly", budgetCategory=rng.choice(categories)) for i in range(n_expenses)],
+        "budgets": [_doc(name=c, amount=round(rng.uniform(100, 1500), 2), category=c) for c in categories],
+        "debts": [_doc(name=f"Debt {i}", amount=round(rng.uniform(500, 20000), 2), monthlyPayment=round(rng.uniform(20, 600), 2), interestRate=round(rng.uniform(0, 40), 2), completionRatio=rng.random()) for i in range(n_debts)],
+        "saving_goals": [_doc(name=f"Goal {i}", totalAmount=5000.0, monthlyTarget=200.0, savedAmount=1000.0, completionRatio=0.2, completeDate=now + timedelta(days=400)) for i in range(n_goals)],
+        "subscription_status": "active",
+    }
+
+
+def _cpu_per_op(fn, iterations: int) -> float:
+    start = time.process_time()
+    for _ in range(iterations):
+        fn()
+    return (time.process_time() - start) / iterations * 1e6
+
+
+def run(args):
+    summary = make_summary(args.incomes, args.expenses, args.debts, args.goals)
+    rows = []
+
+    def legacy_write():
+        return json.dumps(legacy_serialize(summary))
+
+    legacy_blob = legacy_write()
+    rows.append(("legacy json", _cpu_per_op(legacy_write, args.iterations), _cpu_per_op(lambda: json.loads(legacy_blob), args.iterations), len(legacy_blob.encode()), legacy_blob.encode()))
+
+    for codec_name in ("orjson", "msgpack"):
+        for threshold in (-1, settings.CACHE_COMPRESSION_THRESHOLD_BYTES):
+            settings.CACHE_CODEC = codec_name
+            settings.CACHE_COMPRESSION_THRESHOLD_BYTES = threshold
+            codec._codec_id = None
+
+            def new_write():
+                return codec.encode_cache_value(codec.to_jsonable(summary))
+
+            blob = new_write()
+            label = f"{codec_name}{' + zstd' if threshold >= 0 and blob[0] & 0x80 else ''}"
+            rows.append((label, _cpu_per_op(new_write, args.iterations), _cpu_per_op(lambda: codec.decode_cache_value(blob), args.iterations), len(blob), blob))
+
+    redis_sizes = {}
+    if args.redis_url:
+        import redis
+        conn = redis.Redis.from_url(args.redis_url)
+        for label, *_rest, blob in rows:
+            key = f"bench:cache_codec:{label}"
+            conn.set(key, blob, ex=60)
+            redis_sizes[label] = conn.memory_usage(key)
+            conn.delete(key)
+
+    print(f"summary: {args.incomes} incomes, {args.expenses} expenses, {args.debts} debts, {args.goals} goals; {args.iterations} iterations")
+    print(f"{'codec':<18}{'write CPU (us)':>16}{'read CPU (us)':>16}{'stored bytes':>14}{'redis bytes':>13}")
+    for label, write_us, read_us, size, _blob in rows:
+        print(f"{label:<18}{write_us:>16.1f}{read_us:>16.1f}{size:>14}{str(redis_sizes.get(label, '-')):>13}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--incomes", type=int, default=5)
+    parser.add_argument("--expenses", type=int, default=120)
+    parser.add_argument("--debts", type=int, default=10)
+    parser.add_argument("--goals", type=int, default=5)
+    parser.add_argument("--iterations", type=int, default=500)
+    parser.add_argument("--redis-url", default=None)
+    run(parser.parse_args())
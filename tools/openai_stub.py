@@ -0,0 +1,194 @@
+"""
+Local stand-in for the provider's Chat Completions, Files and Batches endpoints, for running batch
+jobs and replays (tools/replay.py) offline.
+
+    uvicorn tools.openai_stub:app --port 8099
+    OPENAI_BASE_URL=http://127.0.0.1:8099/v1 uvicorn app.main:app
+
+Uploaded batch files are kept in memory. A batch completes STUB_BATCH_SECONDS after creation.
+Each request is answered with a placeholder that matches its response_format JSON schema.
+Requests whose custom_id contains STUB_FAIL_MARKER end up in the error file.
+Chat completions are answered after a fixed STUB_COMPLETION_MS, so replays are repeatable.
+"""
+import asyncio
+import os
+import time
+import uuid
+
+import orjson
+from fastapi import FastAPI, File, Form, HTTPException, Request, UploadFile
+from fastapi.responses import Response
+
+BATCH_SECONDS = float(os.environ.get("STUB_BATCH_SECONDS", "2"))
+FAIL_MARKER = os.environ.get("STUB_FAIL_MARKER", "")
+COMPLETION_MS = float(os.environ.get("STUB_COMPLETION_MS", "200"))
+
+app = FastAPI(title="OpenAI batch stand-in")
+
+_files: dict = {}
+_batches: dict = {}
+
+
+def _new_id(prefix: str) -> str:
+    return f"{prefix}-{uuid.uuid4().hex[:24]}"
+
+
+def _store_file(content: bytes, filename: str, purpose: str) -> dict:
+    meta = {
+        "id": _new_id("file"),
+        "object": "file",
+        "bytes": len(content),
+        "created_at": int(time.time()),
+        "filename": filename,
+        "purpose": purpose,
+        "status": "processed",
+    }
+    _files[meta["id"]] = {"meta": meta, "content": content}
+    return meta
+
+
+def _placeholder(schema: dict, defs: dict):
+    if "$ref" in schema:
+        return _placeholder(defs[schema["$ref"].split("/")[-1]], defs)
+    if "anyOf" in schema:
+        return _placeholder(schema["anyOf"][0], defs)
+    kind = schema.get("type")
+    if kind == "object":
+        return {name: _placeholder(prop, defs) for name, prop in schema.get("properties", {}).items()}
+    if kind == "array":
+        return [_placeholder(schema.get("items", {}), defs)]
+    if kind in ("number", "integer"):
+        return 0
+    if kind == "boolean":
+        return False
+    if kind == "null":
+        return None
+    if "enum" in schema:
+        return schema["enum"][0]
+    return "Stub answer generated offline."
+
+
+def _answer(request: dict) -> dict:
+    body = request["body"]
+    response_format = body.get("response_format") or {}
+    if response_format.get("type") == "json_schema":
+        schema = response_format["json_schema"]["schema"]
+        content = orjson.dumps(_placeholder(schema, schema.get("$defs", {}))).decode()
+    elif response_format.get("type") == "json_object":
+        content = "{}"
+    else:
+        content = "Stub answer generated offline."
+    prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 4
+    return {
+        "id": _new_id("chatcmpl"),
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": body.get("model"),
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": content, "refusal": None},
+        }],
+        "usage": {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(content) // 4,
+            "total_tokens": prompt_tokens + len(content) // 4,
+        },
+    }
+
+
+def _complete(batch: dict):
+    outputs, errors = [], []
+    for line in _files[batch["input_file_id"]]["content"].splitlines():
+        if not line.strip():
+            continue
+        request = orjson.loads(line)
+        result = {"id": _new_id("batch_req"), "custom_id": request["custom_id"]}
+        if FAIL_MARKER and FAIL_MARKER in request["custom_id"]:
+            errors.append({**result, "response": None, "error": {"code": "stub_error", "message": "Failed on purpose."}})
+        else:
+            outputs.append({**result, "response": {"status_code": 200, "request_id": _new_id("req"), "body": _answer(request)}, "error": None})
+
+    def write(rows: list, name: str):
+        content = b"".join(orjson.dumps(row) + b"\n" for row in rows)
+        return _store_file(content, name, "batch_output")["id"] if rows else None
+
+    batch["output_file_id"] = write(outputs, f"{batch['id']}_output.jsonl")
+    batch["error_file_id"] = write(errors, f"{batch['id']}_error.jsonl")
+    batch["request_counts"] = {"total": len(outputs) + len(errors), "completed": len(outputs), "failed": len(errors)}
+    batch["status"] = "completed"
+    batch["completed_at"] = int(time.time())
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(request: Request):
+    body = await request.json()
+    if COMPLETION_MS > 0:
+        await asyncio.sleep(COMPLETION_MS / 1000)
+    return _answer({"body": body})
+
+
+@app.post("/v1/files")
+async def create_file(file: UploadFile = File(...), purpose: str = Form(...)):
+    return _store_file(await file.read(), file.filename, purpose)
+
+
+@app.get("/v1/files/{file_id}")
+async def retrieve_file(file_id: str):
+    if file_id not in _files:
+        raise HTTPException(status_code=404, detail="No such file")
+    return _files[file_id]["meta"]
+
+
+@app.get("/v1/files/{file_id}/content")
+async def file_content(file_id: str):
+    if file_id not in _files:
+        raise HTTPException(status_code=404, detail="No such file")
+    return Response(_files[file_id]["content"], media_type="application/octet-stream")
+
+
+@app.post("/v1/batches")
+async def create_batch(request: Request):
+    params = await request.json()
+    if params.get("input_file_id") not in _files:
+        raise HTTPException(status_code=400, detail="Unknown input_file_id")
+    total = sum(1 for line in _files[params["input_file_id"]]["content"].splitlines() if line.strip())
+    batch = {
+        "id": _new_id("batch"),
+        "object": "batch",
+        "endpoint": params["endpoint"],
+        "input_file_id": params["input_file_id"],
+        "completion_window": params["completion_window"],
+        "status": "validating",
+        "created_at": int(time.time()),
+        "metadata": params.get("metadata"),
+        "output_file_id": None,
+        "error_file_id": None,
+        "request_counts": {"total": total, "completed": 0, "failed": 0},
+    }
+    _batches[batch["id"]] = batch
+    return batch
+
+
+@app.get("/v1/batches/{batch_id}")
+async def retrieve_batch(batch_id: str):
+    batch = _batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="No such batch")
+    if batch["status"] in ("validating", "in_progress"):
+        if time.time() - batch["created_at"] >= BATCH_SECONDS:
+            _complete(batch)
+        else:
+            batch["status"] = "in_progress"
+    return batch
+
+
+@app.post("/v1/batches/{batch_id}/cancel")
+async def cancel_batch(batch_id: str):
+    batch = _batches.get(batch_id)
+    if batch is None:
+        raise HTTPException(status_code=404, detail="No such batch")
+    if batch["status"] not in ("completed", "failed", "expired"):
+        batch["status"] = "cancelled"
+        batch["cancelled_at"] = int(time.time())
+    return batch
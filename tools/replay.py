@@ -0,0 +1,473 @@
+"""
+Replays traffic captured with TRAFFIC_CAPTURE_ENABLED against a local instance and compares the
+latency distributions of two builds.
+
+    # 1. Start the build under test on in-memory Mongo and Redis and a stub OpenAI, seeded with
+    #    synthetic finances for every user in the capture (needs: pip install mongomock-motor "fakeredis[lua]").
+    python -m tools.replay serve --capture logs/traffic.jsonl --port 8000
+
+    # 2. Drive it at the captured pace (--speed 2 for twice as fast, --speed 0 for back to back).
+    python -m tools.replay run logs/traffic.jsonl --base-url http://127.0.0.1:8000 --out before.json
+
+    # 3. Repeat 1 and 2 on the other build, then fail (exit 1) if p95 of any route got >10% slower
+    #    or any route failed more often.
+    python -m tools.replay compare before.json after.json --percentile 95 --max-regression 0.10
+
+Users, conversations and free text in the capture are already pseudonymised, so replay mints its
+own tokens for the pseudonymous users with the instance's JWT_SECRET. Both runs must use the same
+capture, speed and STUB_COMPLETION_MS for the comparison to mean anything.
+"""
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+from urllib.parse import urlencode
+
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("OPENAI_API_KEY", "sk-replay-placeholder-key")
+os.environ.setdefault("JWT_SECRET", "replay-placeholder-secret")
+os.environ.setdefault("API_BASE_URL", "http://localhost:8000")
+os.environ.setdefault("SCHEDULER_API_KEY", "replay-scheduler-key")
+
+import httpx  # noqa: E402
+import jwt  # noqa: E402
+import websockets  # noqa: E402
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Server frames that end a chat turn; mirrors app.utils.traffic_capture.
+TERMINAL_FRAMES = {"status", "error", "rate_limited", "busy", "reconnect"}
+# The binary chat protocol; mirrors app.utils.chat_protocol.
+MSGPACK_SUBPROTOCOL = "reho.msgpack.v2"
+
+
+def load_capture(path: str, include_streams: bool) -> list:
+    entries = []
+    with open(path, "rb") as capture_file:
+        for line in capture_file:
+            if not line.strip():
+                continue
+            entry = json.loads(line)
+            # SSE feeds stay open until the client leaves, so their duration says nothing.
+            if entry.get("stream") and not include_streams:
+                continue
+            entries.append(entry)
+    entries.sort(key=lambda e: e["ts"])
+    return entries
+
+
+def captured_users(entries: list) -> dict:
+    users = {}
+    for entry in entries:
+        auth = entry.get("auth") or {}
+        if auth.get("user"):
+            users[auth["user"]] = auth.get("role")
+    return users
+
+
+# --- serve -----------------------------------------------------------------------------------
+
+def _seed_documents(user_id: str, rng: random.Random) -> dict:
+    from bson import ObjectId
+
+    now = datetime.now(timezone.utc)
+    month_start = datetime(now.year, now.month, 1, tzinfo=timezone.utc)
+    owner = {"userId": ObjectId(user_id), "isDeleted": False}
+    categories = ["Essential", "Wants", "Savings", "Food", "Transport"]
+    budgets = [
+        {**owner, "_id": ObjectId(), "name": c, "category": c, "amount": round(rng.uniform(100, 1500), 2),
+         "type": "personal", "createdAt": month_start + timedelta(days=1)}
+        for c in categories
+    ]
+    return {
+        "users": [{"_id": ObjectId(user_id), "name": "Replay User"}],
+        "incomes": [
+            {**owner, "name": f"Income {i}", "amount": round(rng.uniform(800, 4000), 2), "frequency": "monthly",
+             "receiveDate": month_start + timedelta(days=2)}
+            for i in range(rng.randint(1, 3))
+        ],
+        "budgets": budgets,
+        "expenses": [
+            {**owner, "name": rng.choice(["Rent", "Netflix", "Groceries", "Dining out", "Gym", "Fuel"]),
+             "amount": round(rng.uniform(5, 900), 2), "frequency": "monthly",
+             "endDate": month_start + timedelta(days=20), "budgetId": rng.choice(budgets)["_id"]}
+            for _ in range(rng.randint(3, 25))
+        ],
+        "debts": [
+            {**owner, "name": f"Debt {i}", "amount": round(rng.uniform(500, 20000), 2),
+             "monthlyPayment": round(rng.uniform(30, 600), 2), "capitalRepayment": round(rng.uniform(20, 400), 2),
+             "interestRepayment": round(rng.uniform(5, 150), 2), "interestRate": round(rng.uniform(0, 30), 2),
+             "completionRatio": round(rng.random(), 2)}
+            for i in range(rng.randint(0, 5))
+        ],
+        "savinggoals": [
+            {**owner, "name": f"Goal {i}", "totalAmount": 5000.0, "monthlyTarget": 200.0, "savedMoney": 1000.0,
+             "isCompleted": False, "completeDate": now + timedelta(days=400)}
+            for i in range(rng.randint(0, 2))
+        ],
+        "subscriptions": [{"userId": ObjectId(user_id), "status": "active"}],
+    }
+
+
+async def _seed(database, users: dict):
+    for user_id in sorted(users):
+        # Seeded by the pseudonym, so every build replays against the same finances.
+        for collection, documents in _seed_documents(user_id, random.Random(user_id)).items():
+            if documents:
+                await database[collection].insert_many(documents)
+    print(f"Seeded {len(users)} users.", file=sys.stderr)
+
+
+def _support_union_with():
+    # mongomock has no $unionWith, which get_calculator_state (/calculator/tips, /calculator/state)
+    # relies on. Run each branch on its own collection and append its documents, as Mongo does.
+    from mongomock import aggregate
+    from mongomock.collection import Collection
+
+    def aggregate_with_union(self, pipeline, session=None, **unused_kwargs):
+        documents, pending = list(self.find()), []
+        for stage in pipeline:
+            if "$unionWith" not in stage:
+                pending.append(stage)
+                continue
+            documents = list(aggregate.process_pipeline(documents, self.database, pending, session))
+            pending = []
+            spec = stage["$unionWith"]
+            if isinstance(spec, str):
+                spec = {"coll": spec}
+            documents.extend(self.database[spec["coll"]].aggregate(spec.get("pipeline") or []))
+        return aggregate.process_pipeline(documents, self.database, pending, session)
+
+    Collection.aggregate = aggregate_with_union
+
+
+def serve(args):
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    try:
+        import fakeredis
+        from mongomock_motor import AsyncMongoMockClient
+    except ImportError:
+        sys.exit('serve needs the in-memory test doubles: pip install mongomock-motor "fakeredis[lua]"')
+    import uvicorn
+    from app.core.config import settings
+
+    _support_union_with()
+    from app.db import client as db_client
+
+    mongo = AsyncMongoMockClient()
+    database = mongo[settings.MONGO_DB_NAME]
+    redis_server = fakeredis.FakeServer()
+    # Filled before the app starts, so init_clients() leaves the real clients unopened.
+    db_client._clients.update(
+        client=mongo,
+        db=database,
+        analytics_db=database,
+        redis_client=fakeredis.aioredis.FakeRedis(server=redis_server, decode_responses=True),
+        redis_cache=fakeredis.aioredis.FakeRedis(server=redis_server),
+    )
+
+    from app.main import app
+    from tools import openai_stub
+
+    async def main():
+        if args.capture:
+            await _seed(database, captured_users(load_capture(args.capture, include_streams=True)))
+        api = uvicorn.Server(uvicorn.Config(app, host=args.host, port=args.port, log_level="warning"))
+        stub = uvicorn.Server(uvicorn.Config(openai_stub.app, host="127.0.0.1", port=args.stub_port, log_level="warning"))
+        print(f"Serving on http://{args.host}:{args.port} (stub OpenAI on {args.stub_port}).", file=sys.stderr)
+        await asyncio.gather(api.serve(), stub.serve())
+
+    asyncio.run(main())
+
+
+# --- run -------------------------------------------------------------------------------------
+
+class Recorder:
+    def __init__(self):
+        self.samples = {}
+        self.errors = {}
+        self.requests = {}
+        self.status_mismatches = 0
+
+    def request(self, key: str):
+        self.requests[key] = self.requests.get(key, 0) + 1
+
+    def add(self, key: str, ms: float):
+        self.samples.setdefault(key, []).append(round(ms, 3))
+
+    def error(self, key: str):
+        self.errors[key] = self.errors.get(key, 0) + 1
+
+
+def _token(auth: dict, secret: str, tokens: dict):
+    if not auth:
+        return None
+    if auth.get("invalid"):
+        return "invalid-token"
+    key = (auth.get("user"), auth.get("role"))
+    if key not in tokens:
+        tokens[key] = jwt.encode({"user_id": auth.get("user"), "id": auth.get("user"), "role": auth.get("role")}, secret, algorithm="HS256")
+    return tokens[key]
+
+
+def _route_key(entry: dict, suffix: str = "") -> str:
+    kind = "WS" if entry["kind"] == "ws" else entry["method"]
+    return f"{kind} {entry.get('route') or entry['path']}{suffix}"
+
+
+async def _replay_http(client: httpx.AsyncClient, entry: dict, token, scheduler_key: str, recorder: Recorder):
+    headers = {}
+    if token:
+        headers["Authorization"] = f"Bearer {token}"
+    if entry.get("scheduler"):
+        headers["X-Scheduler-Key"] = scheduler_key
+    key = _route_key(entry)
+    recorder.request(key)
+    started = time.perf_counter()
+    try:
+        response = await client.request(
+            entry["method"], entry["path"], params=entry.get("query") or None,
+            json=entry.get("body"), headers=headers,
+        )
+        await response.aread()
+    except httpx.HTTPError:
+        recorder.error(key)
+        return
+    # A failing route can answer faster than a working one; its timings are not latency samples.
+    if response.status_code >= 500:
+        recorder.error(key)
+    else:
+        recorder.add(key, (time.perf_counter() - started) * 1000)
+    if response.status_code != entry.get("status"):
+        recorder.status_mismatches += 1
+
+
+def _uses_msgpack(entry: dict) -> bool:
+    return entry.get("subprotocol") == MSGPACK_SUBPROTOCOL or ["protocol", "msgpack"] in (entry.get("query") or [])
+
+
+async def _receive_until_done(ws, timeout: float):
+    while True:
+        message = await asyncio.wait_for(ws.recv(), timeout)
+        frame = msgpack.unpackb(message, raw=False) if isinstance(message, bytes) else json.loads(message)
+        if isinstance(frame, dict) and frame.get("type") in TERMINAL_FRAMES:
+            return
+
+
+async def _replay_ws(ws_base: str, entry: dict, token, speed: float, timeout: float, recorder: Recorder):
+    binary = _uses_msgpack(entry)
+    if binary and msgpack is None:
+        # Without msgpack the session is replayed on the JSON protocol; its key says so.
+        binary = False
+        entry = {**entry, "route": f"{entry.get('route') or entry['path']} (as json)"}
+    query = [tuple(pair) for pair in entry.get("query") or [] if binary or pair != ["protocol", "msgpack"]]
+    if token:
+        query.append(("token", token))
+    url = f"{ws_base}{entry['path']}" + (f"?{urlencode(query)}" if query else "")
+    subprotocols = [MSGPACK_SUBPROTOCOL] if binary and entry.get("subprotocol") else None
+    encode = msgpack.packb if binary else json.dumps
+    key = _route_key(entry)
+    recorder.request(key)
+    started = time.perf_counter()
+    try:
+        async with websockets.connect(url, open_timeout=timeout, max_size=None, subprotocols=subprotocols) as ws:
+            if entry.get("firstFrameMs") is not None:
+                await asyncio.wait_for(ws.recv(), timeout)
+                recorder.add(f"{key} first frame", (time.perf_counter() - started) * 1000)
+            for frame in entry.get("frames") or []:
+                if speed > 0:
+                    delay = frame["at"] / 1000 / speed - (time.perf_counter() - started)
+                    if delay > 0:
+                        await asyncio.sleep(delay)
+                sent = time.perf_counter()
+                await ws.send(encode(frame["frame"]))
+                # Only wait where the original turn ran to an end; a cancel with nothing running gets no reply.
+                if frame.get("doneMs") is not None:
+                    await _receive_until_done(ws, timeout)
+                    recorder.add(f"{key} turn", (time.perf_counter() - sent) * 1000)
+    except (OSError, ValueError, asyncio.TimeoutError, websockets.WebSocketException):
+        # ValueError covers frames that do not decode; one bad session must not end the run.
+        recorder.error(key)
+
+
+def _percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    rank = max(1, math.ceil(pct / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+def summarise(samples: dict, errors: dict, requests: dict) -> dict:
+    summary = {}
+    for key in sorted(set(samples) | set(errors) | set(requests)):
+        values = samples.get(key, [])
+        summary[key] = {
+            "count": len(values),
+            "requests": requests.get(key, 0),
+            "errors": errors.get(key, 0),
+            **({f"p{p}": _percentile(values, p) for p in (50, 90, 95, 99)} if values else {}),
+            "max": max(values) if values else None,
+        }
+    return summary
+
+
+async def _run(args) -> dict:
+    entries = load_capture(args.capture, args.include_streams)
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        sys.exit("The capture has no entries to replay.")
+
+    recorder = Recorder()
+    tokens = {}
+    secret = args.jwt_secret or os.environ["JWT_SECRET"]
+    ws_base = "ws" + args.base_url[len("http"):] if args.base_url.startswith("http") else args.base_url
+    limit = asyncio.Semaphore(args.concurrency)
+    first_ts = entries[0]["ts"]
+    started = time.perf_counter()
+
+    async def replay(entry):
+        async with limit:
+            token = _token(entry.get("auth"), secret, tokens)
+            if entry["kind"] == "ws":
+                await _replay_ws(ws_base, entry, token, args.speed, args.timeout, recorder)
+            else:
+                await _replay_http(client, entry, token, args.scheduler_key, recorder)
+
+    async with httpx.AsyncClient(base_url=args.base_url, timeout=args.timeout) as client:
+        tasks = []
+        for entry in entries:
+            if args.speed > 0:
+                delay = (entry["ts"] - first_ts) / args.speed - (time.perf_counter() - started)
+                if delay > 0:
+                    await asyncio.sleep(delay)
+            tasks.append(asyncio.create_task(replay(entry)))
+        await asyncio.gather(*tasks)
+
+    return {
+        "meta": {
+            "capture": args.capture,
+            "entries": len(entries),
+            "speed": args.speed,
+            "baseUrl": args.base_url,
+            "wallSeconds": round(time.perf_counter() - started, 3),
+            "statusMismatches": recorder.status_mismatches,
+        },
+        "summary": summarise(recorder.samples, recorder.errors, recorder.requests),
+        "samples": recorder.samples,
+    }
+
+
+def run(args):
+    result = asyncio.run(_run(args))
+    with open(args.out, "w", encoding="utf-8") as out:
+        json.dump(result, out, indent=2)
+    for key, stats in result["summary"].items():
+        print(f"{key:60} n={stats['count']:<6} p50={stats.get('p50')} p95={stats.get('p95')} errors={stats['errors']}")
+    print(f"Wrote {args.out} ({result['meta']['statusMismatches']} responses differed in status from the capture).")
+
+
+# --- compare ---------------------------------------------------------------------------------
+
+def _error_rates(summary: dict) -> dict:
+    rates = {}
+    for key, stats in summary.items():
+        requests = stats.get("requests") or stats["count"] + stats["errors"]
+        if requests:
+            rates[key] = (stats["errors"] / requests, stats["errors"], requests)
+    return rates
+
+
+def compare(args) -> int:
+    with open(args.baseline, encoding="utf-8") as f:
+        baseline_result = json.load(f)
+    with open(args.candidate, encoding="utf-8") as f:
+        candidate_result = json.load(f)
+    baseline, candidate = baseline_result["samples"], candidate_result["samples"]
+
+    baseline["ALL"] = [v for values in baseline.values() for v in values]
+    candidate["ALL"] = [v for values in candidate.values() for v in values]
+    label = f"p{args.percentile:g}"
+    regressions = []
+    print(f"{'route':60} {'n':>6} {'before ' + label:>12} {'after ' + label:>12} {'change':>8}")
+    for key in sorted(set(baseline) & set(candidate)):
+        before, after = baseline[key], candidate[key]
+        if min(len(before), len(after)) < args.min_samples:
+            continue
+        old, new = _percentile(before, args.percentile), _percentile(after, args.percentile)
+        change = (new - old) / old if old else 0.0
+        # Small absolute moves on fast routes are noise, however large the ratio.
+        regressed = change > args.max_regression and new - old > args.min_delta_ms
+        if regressed:
+            regressions.append(key)
+        print(f"{key:60} {len(after):>6} {old:>12.1f} {new:>12.1f} {change:>+8.1%}{'  REGRESSED' if regressed else ''}")
+
+    before_rates, after_rates = _error_rates(baseline_result["summary"]), _error_rates(candidate_result["summary"])
+    failing = []
+    for key in sorted(after_rates):
+        old_rate = before_rates.get(key, (0.0, 0, 0))[0]
+        new_rate, errors, requests = after_rates[key]
+        if new_rate > old_rate + args.max_error_increase:
+            failing.append(key)
+            print(f"{key:60} error rate {old_rate:.1%} -> {new_rate:.1%} ({errors}/{requests})  FAILING")
+
+    if regressions or failing:
+        print(
+            f"{len(regressions)} route(s) regressed beyond {args.max_regression:.0%} at {label}, "
+            f"{len(failing)} route(s) failed more often."
+        )
+        return 1
+    print(f"No route regressed beyond {args.max_regression:.0%} at {label} or failed more often.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    serve_parser = commands.add_parser("serve", help="run this build on in-memory Mongo/Redis and a stub OpenAI")
+    serve_parser.add_argument("--capture", help="seed finances for every user in this capture")
+    serve_parser.add_argument("--host", default="127.0.0.1")
+    serve_parser.add_argument("--port", type=int, default=8000)
+    serve_parser.add_argument("--stub-port", type=int, default=8099)
+
+    run_parser = commands.add_parser("run", help="replay a capture and record latencies")
+    run_parser.add_argument("capture")
+    run_parser.add_argument("--base-url", default="http://127.0.0.1:8000")
+    run_parser.add_argument("--out", default="replay.json")
+    run_parser.add_argument("--speed", type=float, default=1.0, help="1 keeps the captured pace; 0 sends back to back")
+    run_parser.add_argument("--concurrency", type=int, default=200)
+    run_parser.add_argument("--timeout", type=float, default=30.0)
+    run_parser.add_argument("--limit", type=int, default=0)
+    run_parser.add_argument("--include-streams", action="store_true")
+    run_parser.add_argument("--jwt-secret", default="")
+    run_parser.add_argument("--scheduler-key", default=os.environ["SCHEDULER_API_KEY"])
+
+    compare_parser = commands.add_parser("compare", help="compare two replay results; exit 1 on regression")
+    compare_parser.add_argument("baseline")
+    compare_parser.add_argument("candidate")
+    compare_parser.add_argument("--percentile", type=float, default=95)
+    compare_parser.add_argument("--max-regression", type=float, default=0.10)
+    compare_parser.add_argument("--min-delta-ms", type=float, default=5.0)
+    compare_parser.add_argument("--min-samples", type=int, default=20)
+    compare_parser.add_argument("--max-error-increase", type=float, default=0.0,
+                                help="allowed rise in a route's error rate, e.g. 0.01 for one point")
+
+    args = parser.parse_args()
+    if args.command == "serve":
+        serve(args)
+    elif args.command == "run":
+        run(args)
+    else:
+        sys.exit(compare(args))
+
+
+if __name__ == "__main__":
+    main()